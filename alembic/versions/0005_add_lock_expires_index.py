@@ -0,0 +1,27 @@
+"""Index application_locks.expires_at
+
+Revision ID: 0005_add_lock_expires_index
+Revises: 0004_add_application_locks
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_add_lock_expires_index'
+down_revision = '0004_add_application_locks'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Index expires_at for expired-lock cleanup."""
+
+    op.create_index('ix_application_locks_expires_at', 'application_locks', ['expires_at'])
+
+
+def downgrade():
+    """Drop the expires_at index."""
+
+    op.drop_index('ix_application_locks_expires_at', 'application_locks')
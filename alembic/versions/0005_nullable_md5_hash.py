@@ -0,0 +1,25 @@
+"""allow NULL md5_hash for partially hashed files
+
+Revision ID: 0005_nullable_md5_hash
+Revises: 0004_add_fk_indexes
+Create Date: 2026-10-16 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0005_nullable_md5_hash'
+down_revision = '0004_add_fk_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('files') as batch_op:
+        batch_op.alter_column('md5_hash', existing_type=sa.String(length=64), nullable=True)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('files') as batch_op:
+        batch_op.alter_column('md5_hash', existing_type=sa.String(length=64), nullable=False)
@@ -0,0 +1,46 @@
+"""add files.photo_hash_int (phash as signed 64-bit integer)
+
+Revision ID: 0006_add_photo_hash_int
+Revises: 0005_nullable_md5_hash
+Create Date: 2026-10-16 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0006_add_photo_hash_int'
+down_revision = '0005_nullable_md5_hash'
+branch_labels = None
+depends_on = None
+
+
+def _to_int64(phash_hex):
+    try:
+        value = int(phash_hex, 16) & 0xFFFFFFFFFFFFFFFF
+    except (TypeError, ValueError):
+        return None
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def upgrade() -> None:
+    op.add_column('files', sa.Column('photo_hash_int', sa.BigInteger, nullable=True))
+
+    # Backfill in Python: hex-to-integer conversion is not portable SQL
+    # (MySQL has CONV(), SQLite and PostgreSQL don't).
+    bind = op.get_bind()
+    files = sa.table('files', sa.column('id', sa.Integer), sa.column('photo_hash', sa.String),
+                     sa.column('photo_hash_int', sa.BigInteger))
+    rows = bind.execute(sa.select(files.c.id, files.c.photo_hash).where(files.c.photo_hash.isnot(None))).fetchall()
+    params = [{'fid': fid, 'value': _to_int64(ph)} for fid, ph in rows]
+    params = [p for p in params if p['value'] is not None]
+    if params:
+        bind.execute(
+            files.update().where(files.c.id == sa.bindparam('fid')).values(photo_hash_int=sa.bindparam('value')),
+            params,
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('files') as batch_op:
+        batch_op.drop_column('photo_hash_int')
@@ -0,0 +1,33 @@
+"""add geocode_cache table (persistent reverse-geocoding results)
+
+Revision ID: 0007_add_geocode_cache
+Revises: 0006_add_photo_hash_int
+Create Date: 2026-10-16 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0007_add_geocode_cache'
+down_revision = '0006_add_photo_hash_int'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # init_db's create_all may already have created it
+    if sa.inspect(op.get_bind()).has_table('geocode_cache'):
+        return
+    op.create_table(
+        'geocode_cache',
+        sa.Column('lat_q', sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column('lon_q', sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column('city', sa.String(100), nullable=False),
+        sa.Column('country', sa.String(100), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('geocode_cache')
@@ -0,0 +1,29 @@
+"""add exif_data.raw_exif_hash and files.exif_applied_hash
+
+Revision ID: 0008_add_exif_hashes
+Revises: 0007_add_geocode_cache
+Create Date: 2026-10-16 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0008_add_exif_hashes'
+down_revision = '0007_add_geocode_cache'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Both start out NULL: existing dumps are hashed the next time they are
+    # saved or applied.
+    op.add_column('exif_data', sa.Column('raw_exif_hash', sa.String(16), nullable=True))
+    op.add_column('files', sa.Column('exif_applied_hash', sa.String(16), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('files') as batch_op:
+        batch_op.drop_column('exif_applied_hash')
+    with op.batch_alter_table('exif_data') as batch_op:
+        batch_op.drop_column('raw_exif_hash')
@@ -0,0 +1,25 @@
+"""add files.mtime_ns
+
+Revision ID: 0009_add_file_mtime
+Revises: 0008_add_exif_hashes
+Create Date: 2026-10-16 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0009_add_file_mtime'
+down_revision = '0008_add_exif_hashes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # NULL for existing rows: they are hashed once more by the next scan.
+    op.add_column('files', sa.Column('mtime_ns', sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('files') as batch_op:
+        batch_op.drop_column('mtime_ns')
@@ -0,0 +1,30 @@
+"""add schema_fingerprint table (init_db column auto-update bookkeeping)
+
+Revision ID: 0010_add_schema_fingerprint
+Revises: 0009_add_file_mtime
+Create Date: 2026-10-16 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0010_add_schema_fingerprint'
+down_revision = '0009_add_file_mtime'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # init_db may already have created it (see lib/database._schema_fingerprint)
+    if sa.inspect(op.get_bind()).has_table('schema_fingerprint'):
+        return
+    op.create_table(
+        'schema_fingerprint',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('value', sa.String(64), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('schema_fingerprint')
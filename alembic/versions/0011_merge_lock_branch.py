@@ -0,0 +1,22 @@
+"""merge the application_locks branch into the files chain
+
+Revision ID: 0011_merge_lock_branch
+Revises: 0005_add_lock_expires_index, 0010_add_schema_fingerprint
+Create Date: 2026-10-16 00:00:00.000000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '0011_merge_lock_branch'
+down_revision = ('0005_add_lock_expires_index', '0010_add_schema_fingerprint')
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # merge point only: both parents leave the schema complete
+    pass
+
+
+def downgrade() -> None:
+    pass
@@ -23,7 +23,8 @@ from collections import defaultdict
 from dupdetector.lib.database import get_engine, get_sessionmaker, init_db
 from dupdetector.lib.duplicate_folders import (
     load_duplicate_folders_from_config,
-    get_duplicate_folder_for_file,
+    get_duplicate_folder_for_file_resolved,
+    resolve_duplicate_folders,
     validate_duplicate_folders_config
 )
 from dupdetector.lib.db_lock import acquire_lock, DryRunLockChecker, LockAcquisitionError
@@ -72,11 +73,9 @@ def find_duplicates_by_md5(repo: Repository) -> dict[str, list[File]]:
         Dictionary mapping MD5 hash to list of File objects with that hash
         Only returns groups with 2+ files (actual duplicates)
     """
-    # Query all files, group by MD5
-    all_files = repo.list_files()
-
+    # Stream all files, group by MD5
     md5_groups = defaultdict(list)
-    for f in all_files:
+    for f in repo.iter_files():
         if f.md5_hash:
             md5_groups[f.md5_hash].append(f)
 
@@ -129,6 +128,17 @@ def deduplicate_files(
                 print(f"  - {error}")
             return 1
 
+    # Resolve and drive-check every duplicate folder once; the per-file lookup
+    # below is then a single dict access
+    try:
+        resolved_duplicate_folders = resolve_duplicate_folders(
+            duplicate_folders,
+            legacy_duplicate_folder=config.get("duplicate_folder")
+        )
+    except ValueError as e:
+        print(f"ERROR: Invalid duplicate folder configuration: {e}")
+        return 1
+
     # Create duplicate folders if they don't exist
     if not dry_run:
         for drive, dup_folder in duplicate_folders.items():
@@ -253,11 +263,7 @@ def deduplicate_files(
 
             # Get the appropriate duplicate folder for this file's drive
             try:
-                duplicate_dir = get_duplicate_folder_for_file(
-                    source_path,
-                    duplicate_folders,
-                    legacy_duplicate_folder=config.get("duplicate_folder")
-                )
+                duplicate_dir = get_duplicate_folder_for_file_resolved(source_path, resolved_duplicate_folders)
             except ValueError as e:
                 print(f"    ERROR: {e}")
                 continue
@@ -30,7 +30,7 @@ def main() -> int:
     parser.add_argument("--max-size", type=int)
     parser.add_argument("--limit", type=int, help="Limit the number of files to process")
     parser.add_argument("--workers", type=int, help="Number of worker threads to use for hashing (passed to scan)")
-    parser.add_argument("--verbose", action="store_true", help="Enable verbose config loading output")
+    parser.add_argument("--verbose", action="store_true", help="Enable verbose config loading output and per-file scan lines")
     args = parser.parse_args()
 
     # --- Startup preflight: load effective config and validate runtime deps ---
@@ -458,6 +458,7 @@ def main() -> int:
             workers=effective_workers,
             folder_idx=folder_idx,
             total_folders=total_folders,
+            verbose=args.verbose,
         )
 
         # scan() will perform the persistence via the provided session/repo via repo.create_file
@@ -469,9 +470,12 @@ def main() -> int:
 
     # Summarize counts from DB using repository helpers
     try:
-        files = repo.list_files()
-        total = len(files)
-        duplicates = sum(1 for f in files if getattr(f, "is_duplicate", False))
+        total = 0
+        duplicates = 0
+        for f in repo.iter_files():
+            total += 1
+            if getattr(f, "is_duplicate", False):
+                duplicates += 1
         added = total - duplicates
     except Exception:
         total = None
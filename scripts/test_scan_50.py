@@ -12,6 +12,7 @@ from dupdetector.services.repository import Repository
 from dupdetector.cli import _iter_files
 from dupdetector.lib.hashing import md5_file, phash_stub
 
+import concurrent.futures
 import subprocess
 
 ROOT = Path(__file__).resolve().parents[1]
@@ -82,13 +83,11 @@ repo = Repository(session)
 
 # Build candidate list (respect extensions and size limits) and take first 50
 candidates = []
-for p in _iter_files(folder, True):
+for p, st in _iter_files(folder, True):
+    p = Path(p)
     if exts is not None and p.suffix.lower().lstrip('.') not in exts:
         continue
-    try:
-        size = p.stat().st_size
-    except Exception:
-        continue
+    size = st.st_size
     if min_size is not None and size < int(min_size):
         continue
     if max_size is not None and size > int(max_size):
@@ -99,11 +98,16 @@ for p in _iter_files(folder, True):
 
 print(f'Will process {len(candidates)} files from {folder}')
 
+# hash all candidates up front, in parallel; a future keeps its file's
+# exception for the report below
+with concurrent.futures.ThreadPoolExecutor() as ex:
+    md5_futures = {str(p): ex.submit(md5_file, str(p)) for p, _ in candidates}
+
 processed = 0
 for i, (p, size) in enumerate(candidates, start=1):
     path_str = str(p)
     try:
-        md5 = md5_file(path_str)
+        md5 = md5_futures[path_str].result()
     except Exception as exc:
         print('skip md5 fail', path_str, exc)
         continue
@@ -1,109 +1,545 @@
 import argparse
 from pathlib import Path
-from typing import Optional, Iterable, Set, Any
+from typing import TYPE_CHECKING, Optional, Iterable, Iterator, Any
 import json
-import concurrent.futures
-import traceback
+import os
+import sys
+import queue
+import threading
+import contextlib
+import functools
+import itertools
 import time
 
-from dupdetector.lib.hashing import md5_file, phash_stub
+from dupdetector.lib.hashing import (
+    HASH_ALGOS, PHASH_ALGOS, get_hash_constructor, hash_and_probe, phash_and_probe, phash_available, prefix_md5,
+)
 from dupdetector.lib.filetype import detect_media_type
-from dupdetector.services.repository import Repository
-
-
-def _iter_files(folder: Path, recursive: bool) -> Iterable[Path]:
-    """Iterate over files in folder. Yields only valid files, skipping directories and errors."""
-    if recursive:
-        for p in folder.rglob("*"):
-            try:
-                if p.is_file():
-                    yield p
-            except (OSError, PermissionError):
-                # Skip files we can't access
-                continue
-    else:
-        for p in folder.iterdir():
-            try:
-                if p.is_file():
-                    yield p
-            except (OSError, PermissionError):
-                # Skip files we can't access
-                continue
+from dupdetector.lib.jsonutil import loads
+
+# concurrent.futures, traceback, the exiftool wrapper (subprocess) and the
+# repository (SQLAlchemy) are imported where they are used, so subcommands and
+# DB-less scans don't pay for them at startup.
+if TYPE_CHECKING:
+    from dupdetector.lib.exiftool import ExifTool
+    from dupdetector.services.repository import Repository
+
+
+def _iter_files(
+    folder: Path, recursive: bool, exts: Optional[frozenset[str]] = None, skip_symlinks: bool = False
+) -> Iterator[tuple[str, os.stat_result]]:
+    """Iterate over files in folder, yielding `(path, stat_result)` pairs.
+
+    Uses `os.scandir` so directory entries come with their file type from the
+    directory listing (no extra stat to tell files from directories) and each
+    file is stat'ed exactly once. If `exts` (lowercase, with leading dot) is
+    given, files are filtered on their name before they are stat'ed.
+    Symlinked directories are not descended into. Regular files are stat'ed
+    without following links (Windows serves this from the directory listing);
+    only symlinked files pay for resolving their target, which may live on a
+    slow network mount, and `skip_symlinks` drops them without touching the
+    target at all. Unreadable directories are skipped silently; files that
+    cannot be stat'ed are reported and skipped.
+    """
+    stack = [os.fspath(folder)]
+    while stack:
+        current = stack.pop()
+        try:
+            it = os.scandir(current)
+        except OSError:
+            # Skip directories we can't access
+            continue
+        with it:
+            for entry in it:
+                try:
+                    if recursive and entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                        continue
+                    if exts is not None:
+                        name = entry.name
+                        dot = name.rfind(".")
+                        # same suffix rule as os.path.splitext (leading-dot names have none)
+                        if dot <= 0 or name[dot:].lower() not in exts:
+                            continue
+                    # is_symlink() comes from the dirent type, no syscall
+                    follow = entry.is_symlink()
+                    if follow and skip_symlinks:
+                        continue
+                    if not entry.is_file(follow_symlinks=follow):
+                        continue
+                except OSError:
+                    continue
+                try:
+                    st = entry.stat(follow_symlinks=follow)
+                except OSError as exc:
+                    print(f"skipping {entry.path}: cannot stat file: {exc}")
+                    continue
+                yield entry.path, st
 
 
-def _exts_from_arg(exts_arg: Optional[str]) -> Optional[Set[str]]:
+def _exts_from_arg(exts_arg: Optional[str]) -> Optional[frozenset[str]]:
     if not exts_arg:
         return None
     parts = [e.strip().lower() for e in exts_arg.split(",") if e.strip()]
-    normalized = set()
-    for p in parts:
-        if not p.startswith("."):
-            p = "." + p
-        normalized.add(p)
-    return normalized
+    return frozenset(p if p.startswith(".") else "." + p for p in parts)
 
 
+@functools.lru_cache(maxsize=64)
+def _parse_config_file(path: str, mtime_ns: int, size: int) -> tuple[Any, int]:
+    """Read and parse a JSON config file; returns `(data, line_count)`.
+
+    Cached on `(path, mtime_ns, size)` so batch runs that call `scan` once per
+    folder don't re-read the same config, while edited files are re-parsed.
+    Failures raise and are therefore never cached.
+    """
+    with open(path, "rb") as fh:
+        raw = fh.read()
+    # line count only feeds the verbose log message
+    line_count = raw.count(b"\n") + (1 if raw and not raw.endswith(b"\n") else 0)
+    return loads(raw), line_count
+
 
 def _load_config(path: str, verbose: bool = True) -> dict[str, Any]:
     p = Path(path)
     # Load and parse config file with optional verbose output
     try:
-        if not p.exists():
+        try:
+            st = p.stat()
+        except FileNotFoundError:
             if verbose:
                 print(f"_load_config: path does not exist: {p}")
             return {}
         if verbose:
             print(f"Loading config from: {p}")
-        # Read file as text
         try:
-            with p.open("r", encoding="utf-8") as fh:
-                lines = fh.read().splitlines()
-        except Exception as e:
+            data, line_count = _parse_config_file(str(p), st.st_mtime_ns, st.st_size)
+        except (OSError, UnicodeDecodeError) as e:
             if verbose:
                 print(f"ERROR: failed to read config file {p}: {e}")
+                import traceback
                 traceback.print_exc()
             return {}
-
-        # Parse JSON
-        try:
-            data = json.loads("\n".join(lines))
-            if verbose:
-                print(f"Config loaded successfully ({len(lines)} lines)")
-            return data
         except Exception as e:
             if verbose:
                 print(f"ERROR: failed to parse JSON from {p}: {e}")
+                import traceback
                 traceback.print_exc()
             return {}
+        if verbose:
+            print(f"Config loaded successfully ({line_count} lines)")
+        # Callers get their own top-level dict; nested values are shared with
+        # the cache and must be treated as read-only.
+        return dict(data) if isinstance(data, dict) else data
     except Exception as e:
         if verbose:
             print(f"ERROR: unexpected error when loading {p}: {e}")
+            import traceback
             traceback.print_exc()
         return {}
 
 
-def _validate_and_normalize_config(cfg: dict) -> dict:
-    out: dict = {}
-    # recursive
-    out["recursive"] = bool(cfg.get("recursive", False))
+def _as_bool(value: Any) -> bool:
+    return bool(value) if value is not None else False
+
+
+def _as_extension_list(value: Any) -> Optional[list[str]]:
     # extensions: accept list or comma string
-    exts = cfg.get("extensions")
-    if isinstance(exts, list):
-        out["extensions"] = [str(e).lower().lstrip(".") for e in exts if e]
-    elif isinstance(exts, str):
-        out["extensions"] = [e.strip().lower().lstrip(".") for e in exts.split(",") if e.strip()]
-    else:
-        out["extensions"] = None
-    # sizes
+    if isinstance(value, list):
+        return [str(e).lower().lstrip(".") for e in value if e]
+    if isinstance(value, str):
+        return [e.strip().lower().lstrip(".") for e in value.split(",") if e.strip()]
+    return None
+
+
+def _as_optional_int(value: Any) -> Optional[int]:
+    if value is None:
+        return None
     try:
-        out["min_size"] = int(cfg.get("min_size")) if cfg.get("min_size") is not None else None
+        return int(value)
     except Exception:
-        out["min_size"] = None
+        return None
+
+
+# "full": MD5 every candidate. "partial": only MD5 files that share their size
+# and first-4KB hash with another candidate; the rest are stored with md5=None.
+# "size_only": MD5 every file that shares its size with another candidate and
+# don't open the rest at all (md5, phash and media_type stay None).
+HASH_MODES = ("full", "partial", "size_only")
+
+
+def _as_hash_mode(value: Any) -> str:
+    mode = str(value).strip().lower() if value is not None else ""
+    return mode if mode in HASH_MODES else "full"
+
+
+# Order in which candidates are hashed: "walk" (directory order, default) or
+# "inode" (approximate on-disk order, helps HDDs).
+IO_ORDERINGS = ("walk", "inode")
+
+
+def _as_io_ordering(value: Any) -> str:
+    ordering = str(value).strip().lower() if value is not None else ""
+    return ordering if ordering in IO_ORDERINGS else "walk"
+
+
+# Hashing executor: "thread" (default) or "process" (ProcessPoolExecutor).
+EXECUTORS = ("thread", "process")
+# Hashing threads when --workers is not given; the process executor defaults
+# to one worker per CPU instead.
+DEFAULT_WORKERS = 4
+
+
+def _as_executor(value: Any) -> str:
+    kind = str(value).strip().lower() if value is not None else ""
+    return kind if kind in EXECUTORS else "thread"
+
+
+def _as_hash_algo(value: Any) -> str:
+    algo = str(value).strip().lower() if value is not None else ""
+    return algo if algo in HASH_ALGOS else "md5"
+
+
+def _as_phash_algo(value: Any) -> str:
+    algo = str(value).strip().lower() if value is not None else ""
+    return algo if algo in PHASH_ALGOS else "average"
+
+
+# Scan config schema: key -> coercer. Built once at import so validation is a
+# single pass over a fixed table instead of per-key branching on every call.
+_SCAN_CONFIG_SCHEMA: tuple[tuple[str, Any], ...] = (
+    ("recursive", _as_bool),
+    ("extensions", _as_extension_list),
+    ("min_size", _as_optional_int),
+    ("max_size", _as_optional_int),
+    ("hash_mode", _as_hash_mode),
+    ("hash_algo", _as_hash_algo),
+    ("phash_algo", _as_phash_algo),
+    ("executor", _as_executor),
+    ("io_ordering", _as_io_ordering),
+    ("skip_symlinks", _as_bool),
+)
+
+
+def _validate_and_normalize_config(cfg: dict) -> dict:
+    get = cfg.get
+    return {key: coerce(get(key)) for key, coerce in _SCAN_CONFIG_SCHEMA}
+
+
+# Candidates below this size go to the small-file hashing pool (see scan()).
+SMALL_FILE_THRESHOLD = 1 << 20
+
+# Small files handed to a hashing thread per task. One Future (and one
+# completion wakeup in the main thread) per chunk instead of per file.
+HASH_CHUNK_FILES = 16
+
+# While streaming, at most `workers * HASH_INFLIGHT_PER_WORKER` hashing tasks
+# (chunks, see HASH_CHUNK_FILES) are in flight; the walk is consumed only as
+# fast as they complete.
+HASH_INFLIGHT_PER_WORKER = 8
+
+
+def _hash_worker(item, with_md5: bool = True, algo: str = "md5", read_file: bool = True,
+                 phash_algo: str = "average") -> dict:
+    """Hash one `(path, size, inode, mtime_ns)` candidate; errors are returned, not raised.
+
+    The content hash uses `algo` and is reported under the "md5" key whatever
+    the algorithm; the perceptual hash uses `phash_algo`. With
+    `with_md5=False` only the perceptual hash is computed (the candidate was
+    ruled out as a byte-level duplicate by `_select_full_hash`). With
+    `read_file=False` the file is not opened at all and only the path fields
+    are filled in (hash_mode="size_only").
+    """
+    p, size, mtime_ns = item[0], item[1], item[3]
+    path_str = str(p)
+    if not read_file:
+        return {"path": path_str, "size": size, "md5": None, "phash": None, "media_type": None, "error": None,
+                "resolved": os.path.realpath(path_str), "name": os.path.basename(path_str), "mtime_ns": mtime_ns}
+    try:
+        if with_md5:
+            # Single read per file: content hash, phash and the header used
+            # for type detection all come from the same open file
+            md5, ph, header = hash_and_probe(path_str, size, algo, phash_algo=phash_algo)
+        else:
+            md5 = None
+            ph, header = phash_and_probe(path_str, phash_algo=phash_algo)
+    except Exception as exc:
+        return {"path": path_str, "size": size, "md5": None, "phash": None, "media_type": None, "error": str(exc)}
+    # Detect actual file type using magic bytes
     try:
-        out["max_size"] = int(cfg.get("max_size")) if cfg.get("max_size") is not None else None
+        media_type = detect_media_type(header)
     except Exception:
-        out["max_size"] = None
-    return out
+        media_type = None
+    # Resolve here, on the worker, so the serialized DB-writer path doesn't pay the realpath syscalls
+    return {"path": path_str, "size": size, "md5": md5, "phash": ph, "media_type": media_type, "error": None,
+            "resolved": os.path.realpath(path_str), "name": os.path.basename(path_str), "mtime_ns": mtime_ns}
+
+
+def _hash_chunk(chunk: list, algo: str = "md5", phash_algo: str = "average") -> list[dict]:
+    """Run `_hash_worker` over a list of `(item, with_md5, read_file)` triples on one worker."""
+    return [_hash_worker(item, with_md5, algo, read_file, phash_algo) for item, with_md5, read_file in chunk]
+
+
+def _prefix_hash_worker(item) -> Optional[str]:
+    try:
+        return prefix_md5(str(item[0]))
+    except Exception:
+        # Unreadable here means unreadable for the full hash too; let the full
+        # hash report the error.
+        return None
+
+
+def _size_collisions(candidates: list, stored_sizes: frozenset = frozenset()) -> list[int]:
+    """Return indices of candidates whose size is shared by another candidate.
+
+    `stored_sizes` are sizes of stored files skipped by the walk; a candidate
+    with one of those sizes collides even when it is alone in its bucket.
+    """
+    by_size: dict[int, list[int]] = {}
+    for idx, (_, size, *_) in enumerate(candidates):
+        by_size.setdefault(size, []).append(idx)
+    return [
+        idx
+        for size, bucket in by_size.items()
+        if len(bucket) > 1 or size in stored_sizes
+        for idx in bucket
+    ]
+
+
+def _select_full_hash(candidates: list, workers: int, stored_sizes: frozenset = frozenset()) -> set[int]:
+    """Return indices of candidates that could have a byte-identical twin.
+
+    Candidates are bucketed by size; only multi-member buckets are prefix
+    hashed, and only candidates sharing (size, prefix hash) with another
+    candidate are selected. Candidates sharing their size with a skipped
+    stored file (`stored_sizes`) are selected outright, since there is no
+    stored prefix hash to compare against.
+    """
+    selected: set[int] = {idx for idx, (_, size, *_) in enumerate(candidates) if size in stored_sizes}
+    colliding = [idx for idx in _size_collisions(candidates) if idx not in selected]
+    if not colliding:
+        return selected
+
+    import concurrent.futures
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers * 2) as ex:
+        prefixes = list(ex.map(_prefix_hash_worker, (candidates[idx] for idx in colliding)))
+
+    by_prefix: dict[tuple[int, str], list[int]] = {}
+    for idx, prefix in zip(colliding, prefixes):
+        if prefix is None:
+            selected.add(idx)
+            continue
+        by_prefix.setdefault((candidates[idx][1], prefix), []).append(idx)
+    selected.update(idx for bucket in by_prefix.values() if len(bucket) > 1 for idx in bucket)
+    return selected
+
+
+def _bounded_completions(submit, items: Iterable, max_pending: int) -> Iterator[Any]:
+    """Submit `items` lazily via `submit(item) -> Future`, yielding results as they complete.
+
+    At most `max_pending` futures are outstanding, so a lazy `items` iterator
+    (e.g. a directory walk) is consumed only as fast as workers free up.
+    """
+    import concurrent.futures
+
+    pending: set = set()
+    for item in items:
+        pending.add(submit(item))
+        if len(pending) >= max_pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for fut in done:
+                yield fut.result()
+    for fut in concurrent.futures.as_completed(pending):
+        yield fut.result()
+
+
+def _chunk_runs(indexed: Iterable[tuple[int, tuple]], max_len: int) -> Iterator[list[tuple[int, tuple]]]:
+    """Group `(idx, (path, size, inode, mtime_ns))` pairs into runs of consecutive items.
+
+    A run holds at most `max_len` small files, and a large file (at or above
+    SMALL_FILE_THRESHOLD) always forms a run of its own. Each run therefore
+    belongs to exactly one pool, and concatenating the runs keeps the input
+    order.
+    """
+    run: list = []
+    for pair in indexed:
+        if pair[1][1] >= SMALL_FILE_THRESHOLD:
+            if run:
+                yield run
+                run = []
+            yield [pair]
+            continue
+        run.append(pair)
+        if len(run) >= max_len:
+            yield run
+            run = []
+    if run:
+        yield run
+
+
+class _DbWriter(threading.Thread):
+    """Background thread persisting hashed scan results through a Repository.
+
+    Results are handed over through a bounded queue (backpressure when the DB
+    falls behind) and written with `Repository.bulk_create_files` in batches
+    of whatever has accumulated, up to `batch_size`. The first failure stops
+    the writer; it is printed and kept in `error`.
+    """
+
+    def __init__(self, repo: "Repository", exiftool: Optional["ExifTool"], exiftool_timeout: int,
+                 batch_size: int = 500, maxsize: int = 1000):
+        super().__init__(name="scan-db-writer", daemon=True)
+        self.repo = repo
+        self.exiftool = exiftool
+        self.exiftool_timeout = exiftool_timeout
+        self.batch_size = batch_size
+        self.queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self.error: Optional[BaseException] = None
+        from dupdetector.lib.jsonutil import dumps_compact
+        self._dumps = dumps_compact
+
+    def put(self, res: Optional[dict]) -> bool:
+        """Queue a hash result (None = no more results). Returns False if the writer has stopped."""
+        while self.is_alive():
+            try:
+                self.queue.put(res, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def close(self) -> None:
+        self.put(None)
+        self.join()
+
+    def run(self) -> None:
+        done = False
+        while not done:
+            batch = [self.queue.get()]
+            if batch[0] is None:
+                return
+            while len(batch) < self.batch_size:
+                try:
+                    res = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if res is None:
+                    done = True
+                    break
+                batch.append(res)
+            try:
+                exifs = self._exif_batch([res["path"] for res in batch])
+                self.repo.bulk_create_files([self._record(res, exif) for res, exif in zip(batch, exifs)])
+            except Exception as exc:
+                print(f"FATAL: error persisting batch of {len(batch)} files starting at {batch[0]['path']}: {exc}")
+                self.error = exc
+                return
+
+    def _exif_batch(self, paths: list[str]) -> list[Optional[dict]]:
+        """Decoded EXIF for each path, from one exiftool request per batch."""
+        if self.exiftool is None:
+            return [None] * len(paths)
+        try:
+            return self.exiftool.get_parsed_batch(paths)
+        except Exception as exc:
+            from dupdetector.lib.exiftool import ExifToolTimeout
+
+            if len(paths) == 1:
+                if isinstance(exc, ExifToolTimeout):
+                    print(f"exiftool timed out for {paths[0]} after {self.exiftool_timeout}s: {exc}")
+                else:
+                    print(f"exiftool invocation failed for {paths[0]}: {exc}")
+                return [None]
+            print(f"exiftool batch of {len(paths)} files failed ({exc}); retrying one file at a time")
+        return [self._exif_batch([p])[0] for p in paths]
+
+    def _record(self, res: dict, exif: Optional[dict]) -> dict:
+        resolved = res["resolved"]
+        name = res["name"]
+        return {
+            "path": resolved,
+            "original_path": resolved,
+            "name": name,
+            "original_name": name,
+            "size": res["size"],
+            "mtime_ns": res["mtime_ns"],
+            "md5_hash": res["md5"],
+            "photo_hash": res["phash"],
+            "media_type": res["media_type"],
+            # Stored compactly; the decoded dict is handed over as well so the
+            # repository doesn't parse the JSON a second time.
+            "raw_exif": self._dumps([exif]) if exif is not None else None,
+            "parsed_exif": exif,
+        }
+
+
+class _ScanProgress:
+    """Progress reporting for the hashing phase of `scan`.
+
+    Per-file "found file" lines are only printed in verbose mode, and are
+    buffered and written out in one call every `VERBOSE_FLUSH_LINES` lines (or
+    `interval` seconds); otherwise a single summary line is printed at most
+    every `interval` seconds (same cadence as the discovery progress) so large
+    scans don't serialize on stdout. Skipped files are always reported
+    immediately.
+    """
+
+    VERBOSE_FLUSH_LINES = 256
+
+    def __init__(self, total: Optional[int], folder_idx: Optional[int] = None, total_folders: Optional[int] = None,
+                 verbose: bool = False, interval: float = 2.0):
+        self.total = total
+        self.prefix = f"{folder_idx} / {total_folders}: " if folder_idx and total_folders else ""
+        self.verbose = verbose
+        self.interval = interval
+        self.done = 0
+        self.skipped_count = 0
+        self.start_time = time.monotonic()
+        self.last_report = self.start_time
+        self.reported = 0
+        self._lines: list[str] = []
+
+    def _position(self, i: int) -> str:
+        # total is None while discovery is still streaming candidates in
+        return f"{self.prefix}{i} / {self.total}" if self.total is not None else f"{self.prefix}{i}"
+
+    def found(self, i: int, res: dict) -> None:
+        self.done = i
+        if self.verbose:
+            # hashes and type are in the database; the path is what shows progress
+            lines = self._lines
+            lines.append(f"{self._position(i)}: found file: {res['path']}\n")
+            if len(lines) >= self.VERBOSE_FLUSH_LINES or time.monotonic() - self.last_report >= self.interval:
+                self._flush()
+            return
+        now = time.monotonic()
+        if now - self.last_report >= self.interval:
+            self._summary(now)
+
+    def skipped(self, i: int, path: str, err: str) -> None:
+        self.done = i
+        self.skipped_count += 1
+        self._flush()
+        print(f"{self._position(i)}: skipping {path}: {err}")
+
+    def finish(self) -> None:
+        self._flush()
+        if not self.verbose and self.done != self.reported:
+            self._summary(time.monotonic())
+
+    def _flush(self) -> None:
+        if self._lines:
+            self.last_report = time.monotonic()
+            sys.stdout.write("".join(self._lines))
+            sys.stdout.flush()
+            self._lines.clear()
+
+    def _summary(self, now: float) -> None:
+        self.last_report = now
+        self.reported = self.done
+        counts = f"{self.done:,} / {self.total:,}" if self.total is not None else f"{self.done:,}"
+        print(f"{self.prefix}{counts} files hashed "
+              f"({self.skipped_count:,} skipped, {now - self.start_time:.1f}s elapsed)")
 
 
 def scan(args, session: Optional[object] = None):
@@ -142,7 +578,7 @@ def scan(args, session: Optional[object] = None):
     if exts_arg:
         exts = _exts_from_arg(exts_arg)
     else:
-        exts = { ("." + e) for e in cfg.get("extensions") } if cfg.get("extensions") else None
+        exts = frozenset("." + e for e in cfg.get("extensions")) if cfg.get("extensions") else None
 
     # Convert min/max size to int once before loop to avoid repeated conversions and None checks
     min_size_raw = getattr(args, "min_size", None) if getattr(args, "min_size", None) is not None else cfg.get("min_size")
@@ -150,10 +586,14 @@ def scan(args, session: Optional[object] = None):
     min_size = int(min_size_raw) if min_size_raw is not None else None
     max_size = int(max_size_raw) if max_size_raw is not None else None
 
+    skip_symlinks = bool(getattr(args, "skip_symlinks", False)) or cfg.get("skip_symlinks", False)
+
     print(f"Scanning folder: {folder} (config={cfg_path}) recursive={recursive} extensions={exts} min_size={min_size} max_size={max_size}")
 
     repo = None
     if session is not None:
+        from dupdetector.services.repository import Repository
+
         repo = Repository(session)
 
     # Determine exiftool path from config (folder-specific or project)
@@ -170,160 +610,214 @@ def scan(args, session: Optional[object] = None):
         # If not present in folder config, try project config next to this package
         if not exiftool_path:
             project_cfg_path = Path(__file__).resolve().parents[1] / "config.json"
-            if project_cfg_path.exists():
+            proj_cfg = _load_config(str(project_cfg_path), verbose=False)
+            if isinstance(proj_cfg, dict):
+                exiftool_path = proj_cfg.get("exiftool_path")
+                # allow project-level exiftool_timeout
                 try:
-                    with project_cfg_path.open("r", encoding="utf-8") as fh:
-                        proj_cfg = json.load(fh)
-                        exiftool_path = proj_cfg.get("exiftool_path")
-                        # allow project-level exiftool_timeout
-                        try:
-                            exiftool_timeout = int(proj_cfg.get("exiftool_timeout", exiftool_timeout))
-                        except Exception:
-                            pass
+                    exiftool_timeout = int(proj_cfg.get("exiftool_timeout", exiftool_timeout))
                 except Exception:
-                    exiftool_path = None
+                    pass
     except Exception:
         exiftool_path = None
 
-    # Build candidate list first so we can report total and progress (memory: holds Path objects)
-    candidates = []
+    # Worker pool size (tests may not set this arg)
+    workers = getattr(args, "workers", None)
+
+    hash_algo = _as_hash_algo(getattr(args, "hash_algo", None) or cfg.get("hash_algo"))
+    try:
+        get_hash_constructor(hash_algo)
+    except ImportError as exc:
+        print(f"ERROR: hash_algo '{hash_algo}' is not available (optional package missing): {exc}")
+        return 1
+    phash_algo = _as_phash_algo(getattr(args, "phash_algo", None) or cfg.get("phash_algo"))
+    if phash_algo != "average" and not phash_available(phash_algo):
+        print(f"ERROR: phash_algo '{phash_algo}' is not available (optional package missing)")
+        return 1
+
+    hash_mode = _as_hash_mode(getattr(args, "hash_mode", None) or cfg.get("hash_mode"))
+    executor_kind = _as_executor(getattr(args, "executor", None) or cfg.get("executor"))
+    if not workers:
+        # Worker processes are CPU-bound (hashing, phash decoding), so one per
+        # core; threads mostly wait on I/O and a few keep the disk busy.
+        workers = (os.cpu_count() or DEFAULT_WORKERS) if executor_kind == "process" else DEFAULT_WORKERS
+    use_processes = executor_kind == "process" and workers > 1
+    sort_results = bool(getattr(args, "sort", False))
+    io_ordering = _as_io_ordering(getattr(args, "io_ordering", None) or cfg.get("io_ordering"))
     limit = getattr(args, "limit", None)
 
     # Use optimized filtering logic based on which filters are configured
     # to avoid redundant None checks in the hot loop
-    has_ext_filter = exts is not None
     has_min_size = min_size is not None
     has_max_size = max_size is not None
 
-    # Measure time spent discovering and filtering files
-    start_time = time.time()
-    print(f"Discovering files in {folder}...")
-
-    # Track progress for user visibility
-    files_scanned = 0
-    last_progress_time = start_time
-    progress_interval = 2.0  # Report progress every 2 seconds
-
-    # Remove sorting to avoid collecting all files in memory first - process as we discover them
-    for p in _iter_files(folder, recursive):
-        files_scanned += 1
-
-        # Show progress every N seconds during discovery
-        current_time = time.time()
-        if current_time - last_progress_time >= progress_interval:
-            elapsed = current_time - start_time
-            print(f"  Scanned {files_scanned:,} files, found {len(candidates):,} candidates ({elapsed:.1f}s elapsed)...")
-            last_progress_time = current_time
-
-        # extension filter (strict: if exts provided we only consider those)
-        if has_ext_filter and p.suffix.lower() not in exts:
-            continue
-        try:
-            size = p.stat().st_size
-        except Exception as exc:
-            print(f"skipping {p}: cannot stat file: {exc}")
-            continue
-        # Only check size constraints if they are configured
-        if has_min_size and size < min_size:
-            continue
-        if has_max_size and size > max_size:
-            continue
-        candidates.append((p, size))
-        # Apply limit if specified
-        if limit and len(candidates) >= limit:
-            break
-
-    discovery_time = time.time() - start_time
-    total = len(candidates)
-    print(f"Discovery complete: found {total:,} candidate files (scanned {files_scanned:,} total files in {discovery_time:.2f}s)")
-
-    # Worker pool size (tests may not set this arg)
-    workers = getattr(args, "workers", None) or 4
-
-    def _hash_worker(item):
-        p, size = item
-        path_str = str(p)
-        try:
-            md5 = md5_file(path_str)
-        except Exception as exc:
-            return {"path": path_str, "size": size, "md5": None, "phash": None, "media_type": None, "error": str(exc)}
-        try:
-            ph = phash_stub(path_str)
-        except Exception:
-            ph = None
-        # Detect actual file type using magic bytes
-        try:
-            media_type = detect_media_type(path_str)
-        except Exception:
-            media_type = None
-        return {"path": path_str, "size": size, "md5": md5, "phash": ph, "media_type": media_type, "error": None}
-
-    # Submit hashing work to workers; collect results and write to DB in main thread
-    results = []
-    if total > 0:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as ex:
-            future_to_item = {ex.submit(_hash_worker, item): item for item in candidates}
-            for i, fut in enumerate(concurrent.futures.as_completed(future_to_item), start=1):
-                res = fut.result()
-                results.append(res)
-                path = res.get("path")
-                size = res.get("size")
-                md5 = res.get("md5")
-                ph = res.get("phash")
-                media_type = res.get("media_type")
-                err = res.get("error")
-
-                # Check if we have folder progress info
-                folder_idx = getattr(args, "folder_idx", None)
-                total_folders = getattr(args, "total_folders", None)
-
-                if err:
-                    if folder_idx and total_folders:
-                        print(f"{folder_idx} / {total_folders}: {i} / {total}: skipping {path}: {err}")
-                    else:
-                        print(f"{i} / {total}: skipping {path}: {err}")
-                    continue
-
-                if folder_idx and total_folders:
-                    print(f"{folder_idx} / {total_folders}: {i} / {total}: found file: {path} size={size} md5={md5} phash={ph} type={media_type}")
+    # Files already stored with the same size and mtime are not hashed again:
+    # their rows would be kept as they are anyway. Stored paths are resolved,
+    # so only the scan root is resolved here; walked paths are compared by
+    # their part relative to the root, without a realpath per file.
+    known = repo.get_file_stats_under(os.path.realpath(folder)) if repo is not None else {}
+    walk_root_len = len(os.fspath(folder))
+    path_seps = os.sep + (os.altsep or "")
+    # sizes of the skipped files, still counted as collisions by partial and
+    # size-only hashing
+    skipped_sizes: set[int] = set()
+
+    def _discover() -> Iterator[tuple[str, int, int, int]]:
+        """Yield filtered `(path, size, inode, mtime_ns)` candidates as the walk finds them."""
+        # Measure time spent discovering and filtering files
+        start_time = time.time()
+        print(f"Discovering files in {folder}...")
+
+        # Track progress for user visibility
+        files_scanned = 0
+        found = 0
+        unchanged = 0
+        last_progress_time = start_time
+        progress_interval = 2.0  # Report progress every 2 seconds
+
+        for p, st in _iter_files(folder, recursive, exts, skip_symlinks):
+            files_scanned += 1
+
+            # Show progress every N seconds during discovery
+            current_time = time.time()
+            if current_time - last_progress_time >= progress_interval:
+                elapsed = current_time - start_time
+                print(f"  Scanned {files_scanned:,} files, found {found:,} candidates ({elapsed:.1f}s elapsed)...")
+                last_progress_time = current_time
+
+            # extension filter (strict: if exts provided we only consider those)
+            # is applied by _iter_files before stat'ing.
+            size = st.st_size
+            # Only check size constraints if they are configured
+            if has_min_size and size < min_size:
+                continue
+            if has_max_size and size > max_size:
+                continue
+            if known and known.get(p[walk_root_len:].lstrip(path_seps)) == (size, st.st_mtime_ns):
+                unchanged += 1
+                skipped_sizes.add(size)
+                continue
+            found += 1
+            yield (p, size, st.st_ino, st.st_mtime_ns)
+            # Apply limit if specified
+            if limit and found >= limit:
+                break
+
+        discovery_time = time.time() - start_time
+        print(f"Discovery complete: found {found:,} candidate files (scanned {files_scanned:,} {'matching ' if exts is not None else ''}files in {discovery_time:.2f}s)")
+        if unchanged:
+            print(f"  {unchanged:,} files unchanged since the last scan were skipped")
+
+    # Hashing normally starts while the walk is still running, with a bounded
+    # number of files in flight, so memory doesn't grow with the tree size.
+    # Options that need to see every candidate first (a global ordering, the
+    # partial-hash size buckets, chunked process-pool map) materialize the
+    # list instead.
+    streaming = not (sort_results or io_ordering != "walk" or hash_mode != "full" or use_processes)
+    full_hash = None
+    # with hash_mode="size_only", candidates outside full_hash are not read at all
+    read_unselected = hash_mode != "size_only"
+    if streaming:
+        candidates: Iterable[tuple[str, int, int, int]] = _discover()
+        total = None
+    else:
+        candidates = list(_discover())
+        # The walk is lazy; ordering is only imposed on the (filtered)
+        # candidates when requested.
+        if sort_results:
+            candidates.sort(key=lambda c: str(c[0]))
+        elif io_ordering == "inode":
+            # Inode order approximates on-disk order on ext4/xfs/NTFS-via-Linux,
+            # turning concurrent reads into mostly forward seeks on spinning
+            # disks. (st_ino is 0 from scandir on Windows, making this a no-op.)
+            candidates.sort(key=lambda c: c[2])
+        total = len(candidates)
+        if hash_mode == "partial" and total > 0:
+            full_hash = _select_full_hash(candidates, workers, frozenset(skipped_sizes))
+            print(f"Partial hashing: {len(full_hash):,} of {total:,} candidates share size and prefix hash and will be fully hashed")
+        elif hash_mode == "size_only" and total > 0:
+            full_hash = set(_size_collisions(candidates, frozenset(skipped_sizes)))
+            print(f"Size-only hashing: {len(full_hash):,} of {total:,} candidates share their size and will be hashed")
+
+    # Hash on worker pools; DB writes go through a background writer thread
+    progress = _ScanProgress(
+        total,
+        folder_idx=getattr(args, "folder_idx", None),
+        total_folders=getattr(args, "total_folders", None),
+        verbose=bool(getattr(args, "verbose", False)),
+    )
+    if total is None or total > 0:
+        import concurrent.futures
+        from dupdetector.lib.exiftool import ExifTool
+
+        # One exiftool process for the whole scan instead of one per file
+        exiftool = ExifTool(exiftool_path, timeout=exiftool_timeout) if (repo and exiftool_path) else None
+        with contextlib.ExitStack() as stack:
+            if exiftool is not None:
+                stack.enter_context(exiftool)
+            if use_processes:
+                # Processes sidestep the GIL for phash decoding and magic
+                # detection; results come back in candidate order and are
+                # shipped in chunks to amortize IPC.
+                flags = [full_hash is None or idx in full_hash for idx in range(total)]
+                reads = flags if not read_unselected else itertools.repeat(True)
+                pool = stack.enter_context(concurrent.futures.ProcessPoolExecutor(max_workers=workers))
+                pools = [pool]
+                hashed = pool.map(_hash_worker, candidates, flags, itertools.repeat(hash_algo), reads,
+                                  itertools.repeat(phash_algo),
+                                  chunksize=max(1, total // (workers * 8)))
+            else:
+                # Small files are dominated by open/read latency and are dispatched to a
+                # wider pool; large files get their own pool so a few multi-GB videos
+                # can't occupy every worker while thousands of photos wait behind them.
+                small_ex = stack.enter_context(concurrent.futures.ThreadPoolExecutor(max_workers=workers * 2))
+                large_ex = stack.enter_context(concurrent.futures.ThreadPoolExecutor(max_workers=workers))
+                pools = [small_ex, large_ex]
+
+                def _submit(run):
+                    ex = small_ex if run[0][1][1] < SMALL_FILE_THRESHOLD else large_ex
+                    chunk = []
+                    for idx, item in run:
+                        with_md5 = full_hash is None or idx in full_hash
+                        chunk.append((item, with_md5, with_md5 or read_unselected))
+                    return ex.submit(_hash_chunk, chunk, hash_algo, phash_algo)
+
+                runs = _chunk_runs(enumerate(candidates), HASH_CHUNK_FILES)
+                if sort_results:
+                    # --sort persists in path order (deterministic choice of
+                    # which copy is the original).
+                    futures = [_submit(run) for run in runs]
+                    hashed = itertools.chain.from_iterable(fut.result() for fut in futures)
                 else:
-                    print(f"{i} / {total}: found file: {path} size={size} md5={md5} phash={ph} type={media_type}")
-                if repo:
-                    try:
-                        # If exiftool_path is configured, run it first and capture raw EXIF
-                        raw_out = None
-                        if exiftool_path:
-                            try:
-                                import subprocess
-
-                                proc = subprocess.run([exiftool_path, "-j", str(path)], capture_output=True, text=True, timeout=exiftool_timeout)
-                                raw_out = proc.stdout if proc.returncode == 0 else None
-                            except subprocess.TimeoutExpired as te:
-                                print(f"exiftool timed out for {path} after {exiftool_timeout}s: {te}")
-                                raw_out = None
-                            except Exception as ex_exc:
-                                print(f"exiftool invocation failed for {path}: {ex_exc}")
-                                raw_out = None
-
-                        created = repo.create_file(
-                            path=str(Path(path).resolve()),
-                            original_path=str(Path(path).resolve()),
-                            name=Path(path).name,
-                            original_name=Path(path).name,
-                            size=size,
-                            md5_hash=md5,
-                            photo_hash=ph,
-                            media_type=media_type,
-                            raw_exif=raw_out,
-                        )
-                        # Persist raw EXIF to exif_data table
-                        if raw_out:
-                            repo.save_exif(created.id, raw_out)
-                    except Exception as exc:
-                        # Per user policy, abort the entire scan if any file
-                        # with GPS cannot be reverse-geocoded to a city/country.
-                        print(f"FATAL: error persisting {path}: {exc}")
-                        raise SystemExit(1)
+                    hashed = itertools.chain.from_iterable(_bounded_completions(_submit, runs, workers * HASH_INFLIGHT_PER_WORKER))
+            # DB writes (and exiftool calls) happen on a background thread so
+            # a slow INSERT doesn't hold up collecting the next hash result.
+            writer = _DbWriter(repo, exiftool, exiftool_timeout) if repo else None
+            if writer is not None:
+                writer.start()
+            try:
+                for i, res in enumerate(hashed, start=1):
+                    path = res.get("path")
+                    err = res.get("error")
+
+                    if err:
+                        progress.skipped(i, path, err)
+                        continue
+
+                    progress.found(i, res)
+                    if writer is not None and not writer.put(res):
+                        # The writer aborted; don't hash files we won't persist
+                        for pool in pools:
+                            pool.shutdown(wait=False, cancel_futures=True)
+                        break
+            finally:
+                progress.finish()
+                if writer is not None:
+                    writer.close()
+            if writer is not None and writer.error is not None:
+                # Per user policy, abort the entire scan if any file
+                # with GPS cannot be reverse-geocoded to a city/country.
+                raise SystemExit(1)
 
     return 0
 
@@ -338,6 +832,8 @@ def duplicates(args):
         print("No database session provided; cannot list duplicates in scaffold")
         return 0
 
+    from dupdetector.services.repository import Repository
+
     repo = Repository(session)
     threshold = getattr(args, "threshold", 5)
     clusters = repo.cluster_similar_photos(threshold=threshold)
@@ -377,6 +873,14 @@ def main(argv=None):
     p_scan.add_argument("--max-size", type=int, help="Override config: maximum file size in bytes to include")
     p_scan.add_argument("--limit", type=int, help="Limit the number of files to process")
     p_scan.add_argument("--workers", type=int, help="Number of worker threads for hashing")
+    p_scan.add_argument("--hash-mode", choices=HASH_MODES, help="Override config: 'partial' skips the full MD5 for files with a unique size or first-4KB hash; 'size_only' doesn't read files with a unique size at all")
+    p_scan.add_argument("--hash-algo", choices=HASH_ALGOS, help="Override config: content hash algorithm (blake3/xxh64/xxh3_128 need optional packages; don't mix within one database)")
+    p_scan.add_argument("--phash-algo", choices=PHASH_ALGOS, help="Override config: perceptual hash ('dct' needs NumPy; don't mix within one database)")
+    p_scan.add_argument("--executor", choices=EXECUTORS, help="Override config: hash in threads (default) or worker processes (bypasses the GIL; one per CPU unless --workers is given; ignored with --workers 1)")
+    p_scan.add_argument("--io-ordering", choices=IO_ORDERINGS, help="Override config: 'inode' hashes files in inode order to reduce seeks on spinning disks")
+    p_scan.add_argument("--skip-symlinks", action="store_true", help="Override config: ignore symlinked files instead of hashing their targets")
+    p_scan.add_argument("--sort", action="store_true", help="Process and persist candidates in path order (deterministic, slightly slower)")
+    p_scan.add_argument("--verbose", action="store_true", help="Print one line per hashed file instead of periodic summaries")
     p_scan.set_defaults(func=scan)
 
     p_dup = sub.add_parser("duplicates")
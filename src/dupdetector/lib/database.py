@@ -1,20 +1,122 @@
-from sqlalchemy import create_engine
+import functools
+import hashlib
+import sqlite3
+import threading
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, event
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 from urllib.parse import quote_plus, unquote_plus
 import os
 from urllib.parse import urlparse, urlunparse
 
 
-def get_engine(url: str | None = None):
-    """Create a SQLAlchemy engine. Defaults to in-memory SQLite when url is None."""
+# Pool sizing for server databases (MySQL/MariaDB/PostgreSQL). SQLAlchemy's
+# default of 5 (+10 overflow) serializes a scan's DB calls once more threads
+# than that talk to the database.
+DEFAULT_POOL_SIZE = 25
+DEFAULT_POOL_RECYCLE = 3600
+# MySQL/MariaDB drop idle connections after wait_timeout; recycling well
+# before that avoids handing out dead connections in the first place.
+MYSQL_POOL_RECYCLE = 1800
+DEFAULT_POOL_TIMEOUT = 30
+
+
+# Applied to every connection of a file-backed SQLite database when
+# get_engine(sqlite_wal=True) is asked for it (off by default). WAL lets
+# readers run while a writer commits, and with WAL synchronous=NORMAL only
+# syncs at checkpoints (a power loss can drop the last commits). WAL mode is
+# stored in the database file and does not work on network shares, so it is
+# only for local, disposable databases such as test runs.
+SQLITE_WAL_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+def _apply_sqlite_pragmas(dbapi_conn, connection_record) -> None:
+    cur = dbapi_conn.cursor()
+    try:
+        for pragma in SQLITE_WAL_PRAGMAS:
+            cur.execute(pragma)
+    finally:
+        cur.close()
+
+
+def get_engine(
+    url: str | None = None,
+    pool_size: int | None = None,
+    max_overflow: int | None = None,
+    pool_recycle: int | None = None,
+    pool_timeout: int = DEFAULT_POOL_TIMEOUT,
+    pool_pre_ping: bool | None = None,
+    sqlite_wal: bool = False,
+):
+    """Create a SQLAlchemy engine. Defaults to in-memory SQLite when url is None.
+
+    Engines for file/server databases are cached per URL and pool settings,
+    so repeated calls share one connection pool instead of building a new
+    engine (and pool) every time. In-memory SQLite engines are never cached:
+    each call is a fresh, independent database.
+
+    The pool arguments only apply to server databases: `pool_size`
+    (default DEFAULT_POOL_SIZE) persistent connections plus up to
+    `max_overflow` (default: `pool_size`) extra ones, recycled after
+    `pool_recycle` seconds (default MYSQL_POOL_RECYCLE for MySQL/MariaDB,
+    DEFAULT_POOL_RECYCLE otherwise); checkout waits at most `pool_timeout`
+    seconds.
+
+    `pool_pre_ping` tests each connection with a round-trip on checkout. It
+    defaults to on for network databases, where firewalls and server idle
+    timeouts can silently kill pooled connections, and off for SQLite, where
+    it is pure overhead.
+
+    `sqlite_wal=True` switches a file-backed SQLite database to the WAL
+    journal (see SQLITE_WAL_PRAGMAS); by default the journal mode is left as
+    it is in the file.
+    """
     url = url or "sqlite:///:memory:"
     # Normalize semicolon-style MySQL connection strings or plain paths
     url = normalize_db_url(url)
-    # Enable pool_pre_ping to reduce spurious auth/connection issues on some servers
-    engine = create_engine(url, echo=False, future=True, pool_pre_ping=True)
+    # pool_size=0 is meaningful (no limit on QueuePool), so only None defaults
+    pool_size = DEFAULT_POOL_SIZE if pool_size is None else pool_size
+    max_overflow = pool_size if max_overflow is None else max_overflow
+    if pool_recycle is None:
+        pool_recycle = MYSQL_POOL_RECYCLE if url.startswith(("mysql", "mariadb")) else DEFAULT_POOL_RECYCLE
+    if pool_pre_ping is None:
+        pool_pre_ping = not url.startswith("sqlite")
+    args = (url, pool_size, max_overflow, pool_recycle, pool_timeout, pool_pre_ping, sqlite_wal)
+    if url.startswith("sqlite") and ":memory:" in url:
+        return _build_engine(*args)
+    return _build_engine_cached(*args)
+
+
+def _build_engine(url: str, pool_size: int, max_overflow: int, pool_recycle: int, pool_timeout: int,
+                  pool_pre_ping: bool, sqlite_wal: bool = False):
+    kwargs = {}
+    if url.startswith("sqlite") and ":memory:" in url:
+        # One shared connection for the in-memory DB so every thread (e.g. the
+        # scan's background DB writer) sees the same database.
+        kwargs["poolclass"] = StaticPool
+        kwargs["connect_args"] = {"check_same_thread": False}
+    elif not url.startswith("sqlite"):
+        kwargs["pool_size"] = pool_size
+        kwargs["max_overflow"] = max_overflow
+        kwargs["pool_timeout"] = pool_timeout
+        # Recycle before typical server-side idle timeouts drop the connection
+        kwargs["pool_recycle"] = pool_recycle
+    # pool_pre_ping reduces spurious auth/connection issues on some servers
+    engine = create_engine(url, echo=False, future=True, pool_pre_ping=pool_pre_ping, **kwargs)
+    if sqlite_wal and url.startswith("sqlite") and ":memory:" not in url:
+        event.listen(engine, "connect", _apply_sqlite_pragmas)
     return engine
 
 
+_build_engine_cached = functools.lru_cache(maxsize=8)(_build_engine)
+
+
+@functools.lru_cache(maxsize=32)
 def normalize_db_url(value: str) -> str:
     """Normalize different DB connection representations into a SQLAlchemy URL.
 
@@ -93,7 +195,9 @@ def normalize_db_url(value: str) -> str:
     # treat as a filesystem path -> sqlite
     # normalize backslashes for sqlite URL
     v = value.replace("\\", "/")
-    if os.path.exists(v) or "/" in v or "\\" in value:
+    # anything with a separator is path-like; only bare names need the
+    # filesystem check (a stat syscall)
+    if "/" in v or os.path.exists(v):
         return f"sqlite:///{v}"
 
     # fallback: return original value
@@ -124,15 +228,48 @@ def init_db(engine):
         pass
 
 
+# Fingerprint of the model columns as of the last complete
+# `_apply_missing_columns` pass. Kept outside the models' metadata: it is
+# bookkeeping for the auto-update, not part of the application schema. Alembic
+# creates the same table in revision 0010_add_schema_fingerprint.
+_FINGERPRINT_METADATA = MetaData()
+_schema_fingerprint = Table(
+    "schema_fingerprint",
+    _FINGERPRINT_METADATA,
+    Column("id", Integer, primary_key=True),
+    Column("value", String(64), nullable=False),
+)
+
+
+def _models_fingerprint(base_metadata) -> str:
+    tables = base_metadata.metadata.sorted_tables
+    cols = sorted((t.name, c.name, str(c.type)) for t in tables for c in t.columns)
+    indexes = sorted((t.name, ix.name) for t in tables for ix in t.indexes)
+    return hashlib.sha1(repr((cols, indexes)).encode("utf-8")).hexdigest()
+
+
 def _apply_missing_columns(engine, base_metadata):
-    """Detect model-declared columns missing in the database and add them.
+    """Detect model-declared columns (and indexes) missing in the database and add them.
 
     This function uses a conservative mapping of SQLAlchemy column types to
     SQL literal types appropriate for MySQL and SQLite. It intentionally
     skips primary-key columns and complex constraints. Use this for simple
     additive schema changes only.
+
+    The pass is skipped when the models are unchanged since the last time it
+    completed against this database (see `schema_fingerprint`).
     """
-    from sqlalchemy import inspect, text
+    from sqlalchemy import inspect, select, text
+
+    fingerprint = _models_fingerprint(base_metadata)
+    try:
+        _FINGERPRINT_METADATA.create_all(engine)
+        with engine.connect() as conn:
+            stored = conn.execute(select(_schema_fingerprint.c.value).where(_schema_fingerprint.c.id == 1)).scalar()
+    except Exception:
+        stored = None
+    if stored == fingerprint:
+        return
 
     inspector = inspect(engine)
 
@@ -157,42 +294,120 @@ def _apply_missing_columns(engine, base_metadata):
         # Fallback to TEXT
         return "TEXT"
 
-    for table in base_metadata.metadata.sorted_tables:
-        tbl_name = table.name
-        try:
-            existing = {c['name'] for c in inspector.get_columns(tbl_name)}
-        except Exception:
-            # Table doesn't exist or inspector cannot read it; skip
-            continue
+    # Column names of every existing table, read once up front instead of one
+    # schema query per model table.
+    try:
+        existing_by_table = {
+            name: {c['name'] for c in inspector.get_columns(name)} for name in inspector.get_table_names()
+        }
+    except Exception:
+        return
 
-        for col in table.columns:
-            if col.name in existing:
-                continue
-            # Skip primary keys or server-managed columns
-            if col.primary_key:
-                continue
+    # MySQL/MariaDB rebuild the table for every ALTER, so all missing columns
+    # of a table are added with one statement there. SQLite only accepts one
+    # ADD COLUMN per ALTER TABLE.
+    multi_add = engine.dialect.name in ("mysql", "mariadb")
 
-            sql_type = _sql_type_for(col)
-            nullable = "NULL" if col.nullable else "NOT NULL"
-            # Attempt to synthesize a sensible default clause when server_default exists
-            default_clause = ""
-            try:
-                if col.server_default is not None:
-                    # Do not try to evaluate SQL expressions; leave default empty
-                    default_clause = ""
-            except Exception:
-                default_clause = ""
+    # One connection for the whole pass; each ALTER is committed on its own so
+    # a failing one doesn't take the others down with it.
+    with engine.connect() as conn:
+
+        complete = True
 
-            alter_sql = f"ALTER TABLE {tbl_name} ADD COLUMN {col.name} {sql_type} {nullable} {default_clause}".strip()
-            # Execute the ALTER TABLE statement
+        def _try(sql: str) -> bool:
             try:
-                with engine.connect() as conn:
-                    conn.execute(text(alter_sql))
+                conn.execute(text(sql))
+                conn.commit()
+                return True
             except Exception:
                 # If this simple ALTER fails (types/constraints mismatch), skip it
                 # and allow developer to apply a manual Alembic migration.
+                conn.rollback()
+                return False
+
+        for table in base_metadata.metadata.sorted_tables:
+            tbl_name = table.name
+            existing = existing_by_table.get(tbl_name)
+            if existing is None:
+                # Table doesn't exist; skip
                 continue
 
+            clauses = []
+            for col in table.columns:
+                if col.name in existing:
+                    continue
+                # Skip primary keys or server-managed columns
+                if col.primary_key:
+                    continue
+
+                sql_type = _sql_type_for(col)
+                nullable = "NULL" if col.nullable else "NOT NULL"
+                # Attempt to synthesize a sensible default clause when server_default exists
+                default_clause = ""
+                try:
+                    if col.server_default is not None:
+                        # Do not try to evaluate SQL expressions; leave default empty
+                        default_clause = ""
+                except Exception:
+                    default_clause = ""
+
+                clauses.append(f"ADD COLUMN {col.name} {sql_type} {nullable} {default_clause}".strip())
+
+            if clauses and not (
+                multi_add and len(clauses) > 1 and _try(f"ALTER TABLE {tbl_name} " + ", ".join(clauses))
+            ):
+                # one column at a time (SQLite, or the combined ALTER failed)
+                for clause in clauses:
+                    if not _try(f"ALTER TABLE {tbl_name} {clause}"):
+                        complete = False
+
+            # Indexes declared on the model but missing in the database
+            # (create_all only indexes the tables it creates)
+            if table.indexes:
+                try:
+                    existing_indexes = {ix["name"] for ix in inspector.get_indexes(tbl_name)}
+                except Exception:
+                    complete = False
+                    continue
+                for index in table.indexes:
+                    if index.name in existing_indexes:
+                        continue
+                    try:
+                        index.create(conn)
+                        conn.commit()
+                    except Exception:
+                        conn.rollback()
+                        complete = False
+
+        if complete:
+            # Only remember the models once every column made it in, so a
+            # failed ALTER is retried on the next start.
+            try:
+                conn.execute(_schema_fingerprint.delete())
+                conn.execute(_schema_fingerprint.insert().values(id=1, value=fingerprint))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+
+
+# Schema-initialized in-memory SQLite database that InMemoryAdapter copies
+# from, so create_all and the schema pass run once per process rather than
+# once per adapter.
+_template_db = None
+_template_lock = threading.Lock()
+
+
+def _get_template_db():
+    global _template_db
+    with _template_lock:
+        if _template_db is None:
+            engine = get_engine("sqlite:///:memory:")
+            init_db(engine)
+            # StaticPool: this is the engine's one and only DBAPI connection;
+            # keep a reference to the engine so it stays open
+            _template_db = (engine, engine.raw_connection().driver_connection)
+        return _template_db[1]
+
 
 class InMemoryAdapter:
     """Lightweight in-memory DB adapter for tests.
@@ -200,12 +415,24 @@ class InMemoryAdapter:
     Usage:
         adapter = InMemoryAdapter()
         session = adapter.session()
+
+    Each adapter is an independent database, initialized by copying a
+    prebuilt schema with SQLite's backup API instead of running init_db.
     """
 
     def __init__(self):
-        self.engine = get_engine("sqlite:///:memory:")
+        template = _get_template_db()
+
+        def _connect():
+            conn = sqlite3.connect(":memory:", check_same_thread=False)
+            with _template_lock:
+                template.backup(conn)
+            return conn
+
+        # Same setup as get_engine() for in-memory URLs
+        self.engine = create_engine("sqlite://", echo=False, future=True, pool_pre_ping=False,
+                                    poolclass=StaticPool, creator=_connect)
         self.Session = get_sessionmaker(self.engine)
-        init_db(self.engine)
 
     def session(self):
         return self.Session()
@@ -6,12 +6,14 @@ conflicting operations from running simultaneously.
 from __future__ import annotations
 
 import os
+import random
 import socket
 import time
 from contextlib import contextmanager
 from datetime import datetime, timedelta
 from typing import Optional, Generator
 
+from sqlalchemy import bindparam, delete, func, select, text
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 
@@ -23,6 +25,49 @@ class LockAcquisitionError(Exception):
     pass
 
 
+# Polling while waiting for a lock starts at WAIT_BACKOFF_START seconds and
+# grows by WAIT_BACKOFF_FACTOR per attempt up to WAIT_BACKOFF_MAX, with +-50%
+# jitter so several waiters don't hit the lock table in lockstep.
+WAIT_BACKOFF_START = 0.1
+WAIT_BACKOFF_FACTOR = 1.5
+WAIT_BACKOFF_MAX = 2.0
+
+
+def _db_now(session: Session) -> datetime:
+    """Current time on the database server's clock."""
+    return session.execute(select(func.current_timestamp())).scalar()
+
+
+def _find_lock(session: Session, lock_name: str) -> tuple[Optional[ApplicationLock], bool]:
+    """Return `(lock_row, expired)` for `lock_name`.
+
+    Expiry is decided in SQL against the database's CURRENT_TIMESTAMP, so
+    clock drift between hosts can't make a lock leak or expire early. The row
+    is always re-read (sessions don't expire on commit, and the lock row may
+    have been taken over by another process in the meantime).
+    """
+    row = session.query(
+        ApplicationLock,
+        (ApplicationLock.expires_at < func.current_timestamp()).label("expired"),
+    ).filter(ApplicationLock.lock_name == lock_name).populate_existing().first()
+    if row is None:
+        return None, False
+    # a NULL expires_at never expires
+    return row[0], bool(row[1])
+
+
+def _delete_if_expired(session: Session, lock: ApplicationLock) -> None:
+    """Delete `lock` if it is (still) expired; commits, raises on failure."""
+    session.execute(
+        delete(ApplicationLock)
+        .where(ApplicationLock.lock_name == lock.lock_name)
+        .where(ApplicationLock.expires_at < func.current_timestamp())
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    session.expunge(lock)
+
+
 class DatabaseLock:
     """Context manager for acquiring and releasing database locks.
 
@@ -57,32 +102,128 @@ class DatabaseLock:
         self.wait_for_lock = wait_for_lock
         self.wait_timeout = wait_timeout
         self.lock_record: Optional[ApplicationLock] = None
+        self._lock_id: Optional[int] = None
+        self._native_conn = None
 
     def acquire(self) -> None:
         """Acquire the lock.
 
+        On MySQL/MariaDB and PostgreSQL the server's own named/advisory lock
+        is taken first, so competing processes queue in the server's lock
+        manager instead of polling the lock table; the lock-table row is
+        still written so `check_lock_exists` and dry-run checkers can see the
+        holder. SQLite uses the lock table alone.
+
         Raises:
             LockAcquisitionError: If lock cannot be acquired
         """
+        start_time = time.time()
+        if not self._acquire_native(start_time):
+            holder = check_lock_exists(self.session, self.lock_name)
+            held_by = f" (held by PID {holder.process_id} on {holder.hostname})" if holder else ""
+            if self.wait_for_lock:
+                raise LockAcquisitionError(f"Timeout waiting for lock '{self.lock_name}'{held_by}")
+            raise LockAcquisitionError(f"Lock '{self.lock_name}' is held by another process{held_by}")
+        try:
+            self._acquire_row(start_time)
+        except BaseException:
+            self._release_native()
+            raise
+
+    def _native_key(self) -> str:
+        # MySQL lock names are limited to 64 characters
+        return f"dupdetector:{self.lock_name}"[:64]
+
+    def _acquire_native(self, start_time: float) -> bool:
+        """Take the server-side lock on a dedicated connection.
+
+        Returns True when the lock is held (or the dialect has no native
+        locks), False when it could not be acquired within the wait budget.
+        Native locks belong to a connection, which is why they are not taken
+        through the session: its connection goes back to the pool on commit.
+        """
+        bind = self.session.get_bind()
+        dialect = bind.dialect.name
+        if dialect not in ("mysql", "mariadb", "postgresql"):
+            return True
+        engine = getattr(bind, "engine", bind)
+        conn = engine.connect()
+        try:
+            if dialect == "postgresql":
+                # pg_advisory_lock can't time out; poll the try-variant
+                backoff = WAIT_BACKOFF_START
+                while True:
+                    got = conn.execute(text("SELECT pg_try_advisory_lock(hashtext(:n))"), {"n": self._native_key()}).scalar()
+                    remaining = self.wait_timeout - (time.time() - start_time)
+                    if got or not self.wait_for_lock or remaining <= 0:
+                        break
+                    time.sleep(min(remaining, min(backoff, WAIT_BACKOFF_MAX) * (0.5 + random.random())))
+                    backoff *= WAIT_BACKOFF_FACTOR
+            else:
+                # GET_LOCK waits inside the server: 1 = acquired, 0 = timed out
+                wait = max(0, int(self.wait_timeout)) if self.wait_for_lock else 0
+                got = conn.execute(text("SELECT GET_LOCK(:n, :t)"), {"n": self._native_key(), "t": wait}).scalar()
+            # end the implicit transaction; the lock itself is session-level
+            conn.commit()
+        except Exception:
+            conn.close()
+            raise
+        if got:
+            self._native_conn = conn
+            return True
+        conn.close()
+        return False
+
+    def _release_native(self) -> None:
+        conn, self._native_conn = self._native_conn, None
+        if conn is None:
+            return
+        try:
+            if conn.dialect.name == "postgresql":
+                conn.execute(text("SELECT pg_advisory_unlock(hashtext(:n))"), {"n": self._native_key()})
+            else:
+                conn.execute(text("SELECT RELEASE_LOCK(:n)"), {"n": self._native_key()})
+            conn.commit()
+        finally:
+            # closing the connection releases the lock server-side regardless
+            conn.close()
+
+    def _acquire_row(self, start_time: float) -> None:
+        """Table-based lock: insert this process's row into application_locks."""
         process_id = os.getpid()
         hostname = socket.gethostname()
-        expires_at = datetime.now() + timedelta(seconds=self.timeout_seconds)
+        # expiry is compared on the database clock, so it is computed from it too
+        expires_at = _db_now(self.session) + timedelta(seconds=self.timeout_seconds)
 
-        start_time = time.time()
+        backoff = WAIT_BACKOFF_START
+        last_notice = None
+
+        def _wait() -> None:
+            nonlocal backoff
+            delay = min(backoff, WAIT_BACKOFF_MAX) * (0.5 + random.random())
+            # don't oversleep the wait timeout
+            remaining = self.wait_timeout - (time.time() - start_time)
+            time.sleep(max(0.0, min(delay, remaining)))
+            backoff *= WAIT_BACKOFF_FACTOR
 
         while True:
+            # One-statement acquire where the dialect supports it
+            upserted = self._upsert_row(process_id, hostname, expires_at)
+            if upserted:
+                return
+
             # Check for existing lock
-            existing_lock = self.session.query(ApplicationLock).filter_by(
-                lock_name=self.lock_name
-            ).first()
+            existing_lock, expired = _find_lock(self.session, self.lock_name)
+            if upserted is not None and existing_lock is None:
+                # released between the upsert and the lookup; try again
+                continue
 
             if existing_lock:
                 # Check if lock has expired
-                if existing_lock.expires_at and existing_lock.expires_at < datetime.now():
+                if expired:
                     # Lock expired, clean it up
-                    self.session.delete(existing_lock)
                     try:
-                        self.session.commit()
+                        _delete_if_expired(self.session, existing_lock)
                     except Exception:
                         self.session.rollback()
                         # Another process may have deleted it, retry
@@ -103,8 +244,11 @@ class DatabaseLock:
                             f"(held by PID {existing_lock.process_id} on {existing_lock.hostname})"
                         )
 
-                    print(f"Waiting for lock '{self.lock_name}' (held by PID {existing_lock.process_id})...")
-                    time.sleep(2)
+                    # polling gets faster than this; keep the message at the old pace
+                    if last_notice is None or time.time() - last_notice >= 2:
+                        print(f"Waiting for lock '{self.lock_name}' (held by PID {existing_lock.process_id})...")
+                        last_notice = time.time()
+                    _wait()
                     continue
 
             # Try to acquire lock
@@ -120,6 +264,7 @@ class DatabaseLock:
             try:
                 self.session.commit()
                 self.lock_record = lock_record
+                self._lock_id = lock_record.id
                 return
             except IntegrityError:
                 # Another process acquired the lock first
@@ -128,19 +273,76 @@ class DatabaseLock:
                     raise LockAcquisitionError(
                         f"Lock '{self.lock_name}' was acquired by another process"
                     )
-                # Retry
+                # Lost the race: back off before re-reading the lock table
+                _wait()
                 continue
 
+    def _upsert_row(self, process_id: int, hostname: str, expires_at: datetime) -> Optional[bool]:
+        """Insert our lock row, or take over an expired one, in one statement.
+
+        Uses INSERT ... ON CONFLICT (lock_name) DO UPDATE ... WHERE expired
+        RETURNING id (PostgreSQL, SQLite >= 3.35): a row comes back only if
+        we now hold the lock. Returns True (acquired), False (held by someone
+        else) or None when the dialect can't do this; MySQL is left out since
+        ON DUPLICATE KEY UPDATE can't report whether the guarded update applied
+        (and GET_LOCK already serializes acquirers there).
+        """
+        dialect = self.session.get_bind().dialect
+        if dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        elif dialect.name == "sqlite" and getattr(dialect, "dbapi", None) is not None \
+                and dialect.dbapi.sqlite_version_info >= (3, 35):
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            return None
+
+        stmt = insert(ApplicationLock).values(
+            lock_name=self.lock_name,
+            process_id=process_id,
+            hostname=hostname,
+            expires_at=expires_at,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ApplicationLock.lock_name],
+            set_={
+                "process_id": stmt.excluded.process_id,
+                "hostname": stmt.excluded.hostname,
+                "acquired_at": func.current_timestamp(),
+                "expires_at": stmt.excluded.expires_at,
+            },
+            where=ApplicationLock.expires_at < func.current_timestamp(),
+        ).returning(ApplicationLock.id)
+        try:
+            lock_id = self.session.execute(stmt).scalar()
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+        if lock_id is None:
+            return False
+        self._lock_id = lock_id
+        return True
+
     def release(self) -> None:
         """Release the lock."""
-        if self.lock_record:
-            try:
-                self.session.delete(self.lock_record)
-                self.session.commit()
-                self.lock_record = None
-            except Exception:
-                self.session.rollback()
-                raise
+        try:
+            if self._lock_id is not None:
+                try:
+                    self.session.execute(
+                        delete(ApplicationLock)
+                        .where(ApplicationLock.id == self._lock_id)
+                        .execution_options(synchronize_session=False)
+                    )
+                    self.session.commit()
+                    if self.lock_record is not None:
+                        self.session.expunge(self.lock_record)
+                    self.lock_record = None
+                    self._lock_id = None
+                except Exception:
+                    self.session.rollback()
+                    raise
+        finally:
+            self._release_native()
 
     def __enter__(self) -> DatabaseLock:
         """Context manager entry."""
@@ -201,24 +403,20 @@ def cleanup_expired_locks(session: Session) -> int:
     Returns:
         Number of locks cleaned up
     """
-    now = datetime.now()
-
-    expired_locks = session.query(ApplicationLock).filter(
-        ApplicationLock.expires_at < now
-    ).all()
-
-    count = len(expired_locks)
-
-    for lock in expired_locks:
-        session.delete(lock)
-
+    # One DELETE for all expired rows instead of loading and deleting each;
+    # expiry is judged on the database clock
     try:
+        result = session.execute(
+            delete(ApplicationLock)
+            .where(ApplicationLock.expires_at < func.current_timestamp())
+            .execution_options(synchronize_session=False)
+        )
         session.commit()
     except Exception:
         session.rollback()
         raise
 
-    return count
+    return result.rowcount
 
 
 def check_lock_exists(session: Session, lock_name: str) -> Optional[ApplicationLock]:
@@ -231,17 +429,14 @@ def check_lock_exists(session: Session, lock_name: str) -> Optional[ApplicationL
     Returns:
         ApplicationLock if lock exists and is not expired, None otherwise
     """
-    existing_lock = session.query(ApplicationLock).filter_by(
-        lock_name=lock_name
-    ).first()
+    existing_lock, expired = _find_lock(session, lock_name)
 
     if existing_lock:
         # Check if lock has expired
-        if existing_lock.expires_at and existing_lock.expires_at < datetime.now():
+        if expired:
             # Lock expired, clean it up
             try:
-                session.delete(existing_lock)
-                session.commit()
+                _delete_if_expired(session, existing_lock)
             except Exception:
                 session.rollback()
             return None
@@ -251,6 +446,16 @@ def check_lock_exists(session: Session, lock_name: str) -> Optional[ApplicationL
     return None
 
 
+# Holder of a live lock, as plain columns: the periodic dry-run check only
+# needs these for its message, so no ORM object is loaded. Built once so the
+# compiled statement is reused from SQLAlchemy's cache on every check.
+_HELD_LOCK_STMT = (
+    select(ApplicationLock.process_id, ApplicationLock.hostname, ApplicationLock.acquired_at)
+    .where(ApplicationLock.lock_name == bindparam("lock_name"))
+    .where((ApplicationLock.expires_at.is_(None)) | (ApplicationLock.expires_at >= func.current_timestamp()))
+)
+
+
 class DryRunLockChecker:
     """Helper for checking locks periodically during dry-run operations.
 
@@ -308,7 +513,8 @@ class DryRunLockChecker:
         elapsed = current_time - self.last_check_time
 
         if elapsed >= self.check_interval:
-            existing_lock = check_lock_exists(self.session, self.lock_name)
+            # read-only: expired rows are ignored here, not cleaned up
+            existing_lock = self.session.execute(_HELD_LOCK_STMT, {"lock_name": self.lock_name}).first()
 
             if existing_lock:
                 raise LockAcquisitionError(
@@ -18,11 +18,13 @@ Or legacy format (still supported):
 """
 from __future__ import annotations
 
+import functools
 import os
 from pathlib import Path
 from typing import Optional
 
 
+@functools.lru_cache(maxsize=4096)
 def get_drive_letter(path: str | Path) -> str:
     """Extract drive letter from a Windows path.
 
@@ -34,6 +36,8 @@ def get_drive_letter(path: str | Path) -> str:
 
     Raises:
         ValueError: If path doesn't contain a drive letter
+
+    Results are cached: dedup runs ask for the same folders over and over.
     """
     path_str = str(path)
 
@@ -56,7 +60,10 @@ def get_duplicate_folder_for_file(
     """Get the duplicate folder path for a given file.
 
     This function ensures files are never moved across drives by matching
-    the file's drive to the appropriate duplicate folder.
+    the file's drive to the appropriate duplicate folder. Only the entry
+    serving the file's drive is checked. Callers looking up many files
+    should resolve the configuration once with `resolve_duplicate_folders`
+    (which checks every entry) and use `get_duplicate_folder_for_file_resolved`.
 
     Args:
         file_path: Path to the file being moved
@@ -70,50 +77,131 @@ def get_duplicate_folder_for_file(
     Raises:
         ValueError: If no duplicate folder is configured for the file's drive
     """
-    file_path_obj = Path(file_path).resolve()
+    file_drive = _file_drive(file_path)
 
-    # Get the file's drive
-    try:
-        file_drive = get_drive_letter(file_path_obj)
-    except ValueError as e:
-        raise ValueError(f"Cannot determine drive for file: {file_path}") from e
-
-    # Try to find matching duplicate folder
-    # First check with backslash (Z:\)
-    drive_with_backslash = file_drive + "\\"
-
-    if drive_with_backslash in duplicate_folders:
-        dup_folder = duplicate_folders[drive_with_backslash]
-    elif file_drive in duplicate_folders:
-        # Also check without backslash (Z:)
-        dup_folder = duplicate_folders[file_drive]
-    elif legacy_duplicate_folder:
+    # "Z:\\" and "Z:" keys are equivalent
+    for drive_key, dup_folder in duplicate_folders.items():
+        if drive_key.rstrip("\\").upper() == file_drive:
+            break
+    else:
+        if not legacy_duplicate_folder:
+            raise ValueError(
+                f"No duplicate folder configured for drive {file_drive}. "
+                f"Available drives: {list(duplicate_folders.keys())}"
+            )
         # Fall back to legacy single duplicate_folder
         dup_folder = legacy_duplicate_folder
-    else:
-        raise ValueError(
-            f"No duplicate folder configured for drive {file_drive}. "
-            f"Available drives: {list(duplicate_folders.keys())}"
-        )
-
-    dup_folder_path = Path(dup_folder).resolve()
-
-    # Verify the duplicate folder is on the same drive
-    try:
-        dup_drive = get_drive_letter(dup_folder_path)
-    except ValueError as e:
-        raise ValueError(f"Invalid duplicate folder path: {dup_folder}") from e
 
+    dup_folder_path, dup_drive = _resolve_duplicate_folder(dup_folder)
     if dup_drive != file_drive:
         raise ValueError(
             f"Duplicate folder {dup_folder} is on drive {dup_drive}, "
             f"but file {file_path} is on drive {file_drive}. "
             f"Cross-drive moves are not allowed."
         )
-
     return dup_folder_path
 
 
+def get_duplicate_folder_for_file_resolved(
+    file_path: str | Path,
+    resolved_folders: dict[str, Path],
+) -> Path:
+    """Like `get_duplicate_folder_for_file`, with the configuration already resolved.
+
+    Args:
+        file_path: Path to the file being moved
+        resolved_folders: Drive -> duplicate folder map from
+                          `resolve_duplicate_folders`, e.g. {"Z:": Path("Z:/MacMini/duplicates")}
+
+    Returns:
+        Path to the duplicate folder on the same drive as the file
+
+    Raises:
+        ValueError: If no duplicate folder is configured for the file's drive
+    """
+    file_drive = _file_drive(file_path)
+    try:
+        return resolved_folders[file_drive]
+    except KeyError:
+        raise ValueError(
+            f"No duplicate folder configured for drive {file_drive}. "
+            f"Available drives: {list(resolved_folders.keys())}"
+        ) from None
+
+
+def _file_drive(file_path: str | Path) -> str:
+    """Drive of the file being moved.
+
+    Paths from the database are absolute, so the drive is read straight from
+    the string; only relative paths need resolve() (filesystem calls) to find
+    out which drive they live on.
+    """
+    try:
+        return get_drive_letter(str(file_path))
+    except ValueError:
+        try:
+            return get_drive_letter(Path(file_path).resolve())
+        except ValueError as e:
+            raise ValueError(f"Cannot determine drive for file: {file_path}") from e
+
+
+def resolve_duplicate_folders(
+    duplicate_folders: dict[str, str],
+    legacy_duplicate_folder: Optional[str] = None
+) -> dict[str, Path]:
+    """Build the drive -> resolved duplicate folder map used per file.
+
+    Keys are drive letters without a trailing backslash ("Z:"); values are
+    resolved paths already checked to be on that drive, so the per-file
+    lookup in `get_duplicate_folder_for_file_resolved` is a single dict access.
+
+    Args:
+        duplicate_folders: Dict mapping drive roots to duplicate folders
+                          (as returned by `load_duplicate_folders_from_config`)
+        legacy_duplicate_folder: Fallback duplicate_folder from old config format;
+                                 used for its own drive when that drive has no entry
+
+    Returns:
+        Dict mapping drives to resolved duplicate folder paths
+
+    Raises:
+        ValueError: If a duplicate folder is not on the drive it is configured for
+    """
+    resolved: dict[str, Path] = {}
+    for drive_key, dup_folder in duplicate_folders.items():
+        drive = drive_key.rstrip("\\").upper()
+        dup_folder_path, dup_drive = _resolve_duplicate_folder(dup_folder)
+        if dup_drive != drive:
+            raise ValueError(
+                f"Duplicate folder {dup_folder} is on drive {dup_drive}, "
+                f"but is configured for drive {drive}. "
+                f"Cross-drive moves are not allowed."
+            )
+        resolved[drive] = dup_folder_path
+
+    if legacy_duplicate_folder:
+        # The legacy folder can only ever serve files on its own drive
+        legacy_path, legacy_drive = _resolve_duplicate_folder(legacy_duplicate_folder)
+        resolved.setdefault(legacy_drive, legacy_path)
+
+    return resolved
+
+
+@functools.lru_cache(maxsize=64)
+def _resolve_duplicate_folder(dup_folder: str) -> tuple[Path, str]:
+    """Resolved duplicate folder and its drive, computed once per configured folder.
+
+    Raises:
+        ValueError: If the resolved folder has no drive letter
+    """
+    dup_folder_path = Path(dup_folder).resolve()
+    try:
+        dup_drive = get_drive_letter(dup_folder_path)
+    except ValueError as e:
+        raise ValueError(f"Invalid duplicate folder path: {dup_folder}") from e
+    return dup_folder_path, dup_drive
+
+
 def validate_duplicate_folders_config(
     duplicate_folders: dict[str, str],
     media_folders: list[str]
@@ -150,19 +238,20 @@ def validate_duplicate_folders_config(
             continue
 
         # Check that the drive key matches the duplicate folder's drive
-        drive_key_clean = drive_key.rstrip("\\")
+        drive_key_clean = drive_key.rstrip("\\").upper()
         if drive_key_clean != dup_drive:
             errors.append(
                 f"Drive key '{drive_key}' does not match duplicate folder drive '{dup_drive}': {dup_folder}"
             )
 
     # Check that all media folders have a matching duplicate folder
+    # ("Z:" and "Z:\\" keys are equivalent; normalize them once)
+    configured_drives = {drive_key.rstrip("\\").upper() for drive_key in duplicate_folders}
     for media_folder in media_folders:
         try:
             media_drive = get_drive_letter(media_folder)
-            drive_with_backslash = media_drive + "\\"
 
-            if drive_with_backslash not in duplicate_folders and media_drive not in duplicate_folders:
+            if media_drive not in configured_drives:
                 errors.append(
                     f"No duplicate folder configured for media folder drive {media_drive}: {media_folder}"
                 )
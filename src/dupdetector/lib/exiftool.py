@@ -0,0 +1,153 @@
+"""Persistent exiftool process.
+
+Starting exiftool (a Perl program) costs 100-400 ms per invocation, which
+dominates a scan that calls it once per file. `ExifTool` starts a single
+`exiftool -stay_open True -@ -` process and feeds it requests (one file or
+a batch of files per `-execute`) over stdin, reading the JSON answer back
+from stdout.
+"""
+import os
+import queue
+import subprocess
+import threading
+from typing import Optional
+
+from dupdetector.lib.jsonutil import dumps_compact, loads
+
+
+class ExifToolTimeout(Exception):
+    """Raised when exiftool does not answer a request within the timeout."""
+
+
+class ExifTool:
+    """Long-lived exiftool process answering `exiftool -j <path>` requests.
+
+    Usage:
+        with ExifTool("/usr/bin/exiftool", timeout=15) as et:
+            raw_json = et.get_json("photo.jpg")
+
+    The process is started on first use. If a request times out the process is
+    killed and transparently restarted on the next request, so one stuck file
+    cannot block the rest of the scan.
+    """
+
+    READY = "{ready}"
+
+    def __init__(self, executable: str, timeout: float = 15.0):
+        self.executable = executable
+        self.timeout = timeout
+        self._proc: Optional[subprocess.Popen] = None
+        self._lines: Optional[queue.Queue] = None
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "ExifTool":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def _start(self) -> None:
+        self._proc = subprocess.Popen(
+            [self.executable, "-stay_open", "True", "-@", "-"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+        )
+        # A reader thread lets us wait on stdout with a timeout on every
+        # platform (select() does not work on pipes on Windows).
+        lines: queue.Queue = queue.Queue()
+        self._lines = lines
+        stdout = self._proc.stdout
+
+        def _reader():
+            for line in stdout:
+                lines.put(line)
+            lines.put(None)
+
+        threading.Thread(target=_reader, name="exiftool-reader", daemon=True).start()
+
+    def get_json(self, path: str) -> Optional[str]:
+        """Return exiftool's `-j` JSON output for `path`, or None if it produced none.
+
+        Raises ExifToolTimeout if no answer arrives within `timeout` seconds.
+        """
+        raw = self._execute([path])
+        return raw if raw.strip() else None
+
+    def get_parsed_batch(self, paths: list[str]) -> list[Optional[dict]]:
+        """Metadata for several files from a single `-execute`, already decoded.
+
+        Returns one entry per input path: that file's exiftool object, or None
+        when exiftool reported nothing for it. `timeout` applies to the silence
+        between output lines, so large batches are not cut off while making
+        progress.
+        """
+        raw = self._execute(paths)
+        by_path = {}
+        if raw.strip():
+            try:
+                for obj in loads(raw):
+                    src = obj.get("SourceFile") if isinstance(obj, dict) else None
+                    if src:
+                        # exiftool reports paths with forward slashes on Windows
+                        by_path[os.path.normcase(os.path.normpath(src))] = obj
+            except ValueError:
+                pass
+        return [by_path.get(os.path.normcase(os.path.normpath(path))) for path in paths]
+
+    def get_json_batch(self, paths: list[str]) -> list[Optional[str]]:
+        """Like `get_json` for several files with a single `-execute`.
+
+        Each entry is a compact JSON array holding that file's object (same
+        shape as `exiftool -j <path>`), or None.
+        """
+        return [dumps_compact([obj]) if obj is not None else None for obj in self.get_parsed_batch(paths)]
+
+    def _execute(self, paths: list[str]) -> str:
+        with self._lock:
+            if self._proc is None or self._proc.poll() is not None:
+                self._start()
+            self._proc.stdin.write("-j\n-charset\nfilename=utf8\n" + "".join(f"{p}\n" for p in paths) + "-execute\n")
+            self._proc.stdin.flush()
+
+            out = []
+            while True:
+                try:
+                    line = self._lines.get(timeout=self.timeout)
+                except queue.Empty:
+                    self._kill()
+                    raise ExifToolTimeout(f"no response within {self.timeout}s")
+                if line is None:
+                    self._kill()
+                    raise RuntimeError("exiftool exited unexpectedly")
+                if line.rstrip() == self.READY:
+                    break
+                out.append(line)
+            return "".join(out)
+
+    def _kill(self) -> None:
+        if self._proc is not None:
+            try:
+                self._proc.kill()
+                self._proc.wait(timeout=5)
+            except Exception:
+                pass
+        self._proc = None
+        self._lines = None
+
+    def close(self) -> None:
+        """Ask exiftool to exit; kill it if it does not."""
+        with self._lock:
+            if self._proc is None:
+                return
+            try:
+                self._proc.stdin.write("-stay_open\nFalse\n")
+                self._proc.stdin.flush()
+                self._proc.stdin.close()
+                self._proc.wait(timeout=5)
+            except Exception:
+                pass
+            self._kill()
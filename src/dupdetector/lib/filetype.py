@@ -3,16 +3,77 @@
 This module detects actual file types by reading file content,
 not relying on file extensions which can be incorrect or missing.
 """
+import threading
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Union
 import magic
 
+# libmagic loads and compiles its database when a Magic object is created, so
+# each thread keeps one instead of building a new one per file. (A Magic
+# object wraps a libmagic cookie, which must not be shared between threads.)
+_tls = threading.local()
+
+
+def _get_magic() -> "magic.Magic":
+    mime = getattr(_tls, "mime", None)
+    if mime is None:
+        mime = _tls.mime = magic.Magic(mime=True)
+    return mime
+
+
+# Fixed-offset signatures of the formats that make up nearly every photo/video
+# library. Matching these needs 12 bytes and no libmagic call; the results are
+# the same MIME strings libmagic reports for these files. Anything else
+# (TIFF-based RAW formats, odd containers) is left to libmagic.
+_PREFIX_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+_RIFF_TYPES = {
+    b"WEBP": "image/webp",
+    b"AVI ": "video/x-msvideo",
+}
+# ISO base media (MP4/MOV/HEIC): "ftyp" at offset 4, major brand at offset 8
+_FTYP_BRANDS = {
+    b"isom": "video/mp4",
+    b"iso2": "video/mp4",
+    b"mp41": "video/mp4",
+    b"mp42": "video/mp4",
+    b"qt  ": "video/quicktime",
+    b"M4V ": "video/x-m4v",
+    b"heic": "image/heic",
+    b"heix": "image/heic",
+    b"avif": "image/avif",
+}
+SNIFF_BYTES = 16
+
+
+def sniff_media_type(header: bytes) -> Optional[str]:
+    """Classify common media formats from the first bytes of a file.
+
+    Returns None when the header matches none of the known signatures.
+    """
+    for prefix, media_type in _PREFIX_SIGNATURES:
+        if header.startswith(prefix):
+            return media_type
+    if header[:4] == b"RIFF":
+        return _RIFF_TYPES.get(header[8:12])
+    if header[4:8] == b"ftyp":
+        return _FTYP_BRANDS.get(header[8:12])
+    return None
 
-def detect_media_type(file_path: str) -> Optional[str]:
+
+def detect_media_type(file_path: Union[str, bytes]) -> Optional[str]:
     """Detect the actual media type of a file using magic bytes.
 
+    Common photo/video formats are recognized from their first bytes
+    (`sniff_media_type`); libmagic is only consulted for everything else.
+
     Args:
-        file_path: Absolute path to the file
+        file_path: Absolute path to the file, or the file's leading bytes
+            (a few KB are enough) when the caller has already read them
 
     Returns:
         Media type string (e.g., 'image/jpeg', 'video/mp4', 'image/png')
@@ -23,10 +84,17 @@ def detect_media_type(file_path: str) -> Optional[str]:
         'image/jpeg'
         >>> detect_media_type('/path/to/wrong_extension.txt')  # actually a PNG
         'image/png'
+        >>> detect_media_type(header_bytes)  # first KB of a PNG
+        'image/png'
     """
     try:
-        mime = magic.Magic(mime=True)
-        media_type = mime.from_file(file_path)
+        if isinstance(file_path, (bytes, bytearray)):
+            header = bytes(file_path)
+            return sniff_media_type(header) or _get_magic().from_buffer(header)
+        with open(file_path, "rb") as fh:
+            media_type = sniff_media_type(fh.read(SNIFF_BYTES))
+        if media_type is None:
+            media_type = _get_magic().from_file(file_path)
         return media_type
     except Exception:
         return None
@@ -83,6 +151,30 @@ def is_supported_media(media_type: Optional[str]) -> bool:
     return category in ('image', 'video')
 
 
+# Map common MIME types to readable names
+_TYPE_MAP = {
+    'image/jpeg': 'JPEG Image',
+    'image/png': 'PNG Image',
+    'image/gif': 'GIF Image',
+    'image/bmp': 'BMP Image',
+    'image/tiff': 'TIFF Image',
+    'image/heic': 'HEIC Image',
+    'image/heif': 'HEIF Image',
+    'image/webp': 'WebP Image',
+    'image/x-canon-cr2': 'Canon RAW (CR2)',
+    'image/x-canon-cr3': 'Canon RAW (CR3)',
+    'image/x-nikon-nef': 'Nikon RAW (NEF)',
+    'image/x-sony-arw': 'Sony RAW (ARW)',
+    'image/x-adobe-dng': 'Adobe DNG RAW',
+    'video/mp4': 'MP4 Video',
+    'video/quicktime': 'QuickTime Video',
+    'video/x-matroska': 'Matroska Video (MKV)',
+    'video/mpeg': 'MPEG Video',
+    'video/x-msvideo': 'AVI Video',
+    'video/x-ms-wmv': 'Windows Media Video',
+}
+
+
 def get_human_readable_type(media_type: Optional[str]) -> str:
     """Convert MIME type to human-readable format.
 
@@ -102,28 +194,4 @@ def get_human_readable_type(media_type: Optional[str]) -> str:
     """
     if not media_type:
         return 'Unknown'
-
-    # Map common MIME types to readable names
-    type_map = {
-        'image/jpeg': 'JPEG Image',
-        'image/png': 'PNG Image',
-        'image/gif': 'GIF Image',
-        'image/bmp': 'BMP Image',
-        'image/tiff': 'TIFF Image',
-        'image/heic': 'HEIC Image',
-        'image/heif': 'HEIF Image',
-        'image/webp': 'WebP Image',
-        'image/x-canon-cr2': 'Canon RAW (CR2)',
-        'image/x-canon-cr3': 'Canon RAW (CR3)',
-        'image/x-nikon-nef': 'Nikon RAW (NEF)',
-        'image/x-sony-arw': 'Sony RAW (ARW)',
-        'image/x-adobe-dng': 'Adobe DNG RAW',
-        'video/mp4': 'MP4 Video',
-        'video/quicktime': 'QuickTime Video',
-        'video/x-matroska': 'Matroska Video (MKV)',
-        'video/mpeg': 'MPEG Video',
-        'video/x-msvideo': 'AVI Video',
-        'video/x-ms-wmv': 'Windows Media Video',
-    }
-
-    return type_map.get(media_type, media_type)
+    return _TYPE_MAP.get(media_type, media_type)
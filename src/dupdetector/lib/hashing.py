@@ -1,17 +1,162 @@
 import hashlib
-from pathlib import Path
+import io
+import mmap
+import os
 from typing import Optional
 from typing import Iterable
 
 
+def _advise_sequential(fh) -> None:
+    """Hint the kernel that `fh` will be read front to back (Linux/BSD only)."""
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(fh.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except OSError:
+            pass
+
+
+def _advise_dontneed(fh) -> None:
+    """Let the kernel drop `fh`'s pages from the page cache (Linux/BSD only).
+
+    A scan reads each file once; keeping its pages cached only evicts data
+    that other programs (or the database) will actually read again.
+    """
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(fh.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+        except OSError:
+            pass
+
+
+# Read size for streaming hashes. Large reads keep the syscall count low; the
+# hash update runs with the GIL released for buffers this size.
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def _digest_stream(path: str, constructor, probe_len: int = 0) -> tuple[str, bytes]:
+    """Hex digest of the file at `path`, read sequentially in HASH_CHUNK_SIZE chunks.
+
+    Also returns the first `probe_len` bytes of the file (b"" by default).
+    This replaces `hashlib.file_digest`, which reads in 256 KiB pieces and
+    can neither hand back the header nor drop the pages once hashed.
+    """
+    h = constructor()
+    buf = bytearray(HASH_CHUNK_SIZE)
+    view = memoryview(buf)
+    header = b""
+    with open(path, "rb", buffering=0) as fh:
+        _advise_sequential(fh)
+        while True:
+            n = fh.readinto(buf)
+            if not n:
+                break
+            if len(header) < probe_len:
+                header += bytes(view[:min(n, probe_len - len(header))])
+            h.update(view[:n])
+        _advise_dontneed(fh)
+    return h.hexdigest(), header
+
+
+# Content hash algorithms accepted by `hash_file` / `compute_all`. md5 is the
+# default; sha256 is always available too and runs on the CPU's SHA
+# extensions (SHA-NI) through OpenSSL where present. blake3 and xxh64 /
+# xxh3_128 need the optional `blake3` / `xxhash` packages. xxh3_128 is the
+# fastest (SIMD, several GB/s per core) and, at 128 bits, as collision-safe
+# as md5 for duplicate detection. All return hex digests, stored in the
+# files.md5_hash column. Don't mix algorithms within one database: digests of
+# different algorithms never match.
+HASH_ALGOS = ("md5", "sha256", "blake3", "xxh64", "xxh3_128")
+
+
+def get_hash_constructor(algo: str = "md5"):
+    """Return a zero-argument constructor for the hash object of `algo`.
+
+    Raises ValueError for unknown algorithms and ImportError when the optional
+    package backing `algo` is not installed.
+    """
+    if algo == "md5":
+        return hashlib.md5
+    if algo == "sha256":
+        return hashlib.sha256
+    if algo == "blake3":
+        from blake3 import blake3
+        return blake3
+    if algo == "xxh64":
+        from xxhash import xxh64
+        return xxh64
+    if algo == "xxh3_128":
+        from xxhash import xxh3_128
+        return xxh3_128
+    raise ValueError(f"unsupported hash algorithm: {algo!r}")
+
+
+def hash_file(path: str, algo: str = "md5") -> str:
+    """Compute the hex digest of a file with `algo` (see HASH_ALGOS), streaming."""
+    if algo == "md5":
+        return md5_file(path)
+    return _digest_stream(path, get_hash_constructor(algo))[0]
+
+
 def md5_file(path: str) -> str:
-    """Compute MD5 hex digest for a file in streaming fashion."""
-    h = hashlib.md5()
-    p = Path(path)
-    with p.open("rb") as fh:
-        for chunk in iter(lambda: fh.read(8192), b""):
-            h.update(chunk)
-    return h.hexdigest()
+    """Compute MD5 hex digest for a file in streaming fashion.
+
+    Reads 1 MiB at a time into one reusable buffer; hashlib releases the GIL
+    while hashing each chunk, so worker threads can hash files concurrently.
+    The file's pages are dropped from the page cache afterwards.
+    """
+    return _digest_stream(path, hashlib.md5)[0]
+
+
+def md5_files(paths: Iterable[str], workers: Optional[int] = None, algo: str = "md5") -> dict[str, Optional[str]]:
+    """Hash several files concurrently; returns `{path: hexdigest}`.
+
+    Uses a thread pool (`workers` threads, default min(8, cpu count)): the
+    hash update releases the GIL, so threads overlap reads and hashing across
+    files. Files that cannot be read map to None.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def _one(path: str) -> Optional[str]:
+        try:
+            return hash_file(path, algo)
+        except OSError:
+            return None
+
+    paths = list(paths)
+    if workers is None:
+        workers = min(8, os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        return dict(zip(paths, ex.map(_one, paths)))
+
+
+def prefix_md5(path: str, length: int = 4096) -> str:
+    """MD5 hex digest of the first `length` bytes of a file.
+
+    Cheap prefilter for duplicate detection: files that differ in size or in
+    their first block cannot be byte-identical, so they never need a full hash.
+    """
+    with open(path, "rb") as fh:
+        return hashlib.md5(fh.read(length)).hexdigest()
+
+
+# Perceptual hash algorithms. "average" (the default) thresholds an 8x8
+# thumbnail at its mean; "dct" is the classic pHash (sign of the 8x8
+# low-frequency DCT block of a 32x32 thumbnail against its median), which
+# survives recompression and resizing better and so works with tighter
+# Hamming thresholds. "dct" needs NumPy. Both are 64-bit and stored in
+# files.photo_hash; don't mix them within one database.
+PHASH_ALGOS = ("average", "dct")
+
+
+def phash_available(algo: str = "average") -> bool:
+    """True when the optional packages `algo` needs (see PHASH_ALGOS) are installed."""
+    try:
+        import PIL  # noqa: F401
+        if algo == "dct":
+            import numpy  # noqa: F401
+    except ImportError:
+        return False
+    return True
 
 
 def phash_stub(path: str) -> Optional[str]:
@@ -21,67 +166,311 @@ def phash_stub(path: str) -> Optional[str]:
     This is intentionally lightweight for tests — a more robust implementation
     can be added later (imagehash, perceptual hashing libs).
     """
+    return _phash_from_source(path)
+
+
+def phash_dct(path: str) -> Optional[str]:
+    """DCT-based pHash of the image at `path` as hex, or None (no Pillow/NumPy, not an image)."""
+    return _phash_from_source(path, "dct")
+
+
+def _phash_from_source(source, algo: str = "average") -> Optional[str]:
+    """Compute the perceptual hash `algo` for `source` (a path or binary file object)."""
     try:
         from PIL import Image
     except Exception:
         return None
+    if algo == "dct":
+        try:
+            import numpy as np
+        except Exception:
+            return None
+    side = 32 if algo == "dct" else 8
 
     try:
-        img = Image.open(path)
+        img = Image.open(source)
     except Exception:
         return None
 
     try:
-        img = img.convert("L").resize((8, 8))
-        pixels = list(img.getdata())
+        # For JPEGs, let the decoder downscale by 1/2..1/8 in the DCT domain
+        # (no-op for other formats). A small hash doesn't need a
+        # full-resolution decode, which is by far the most expensive step.
+        img.draft("L", (64, 64))
+        img = img.convert("L").resize((side, side))
+        pixels = img.tobytes()
     except Exception:
         return None
-    avg = sum(pixels) / len(pixels)
-    bits = ["1" if p >= avg else "0" for p in pixels]
+    if algo == "dct":
+        return _dct_hash(np, pixels, side)
+    # p >= mean, in integer arithmetic: p * count >= total
+    total = sum(pixels)
+    count = len(pixels)
+    bitstring = "".join(["1" if p * count >= total else "0" for p in pixels])
     # return as hex string
-    bitstring = "".join(bits)
-    return hex(int(bitstring, 2))[2:]
+    return format(int(bitstring, 2), "x")
+
+
+_DCT_BASIS = {}
+
+
+def _dct_hash(np, pixels: bytes, side: int) -> str:
+    """64-bit pHash of a `side` x `side` grayscale buffer."""
+    basis = _DCT_BASIS.get(side)
+    if basis is None:
+        # Rows 0..7 of the (unnormalized) DCT-II matrix: only the 8x8
+        # low-frequency block is needed, so the 2-D transform is two small
+        # matrix products instead of a full DCT.
+        k = np.arange(8).reshape(-1, 1)
+        n = np.arange(side).reshape(1, -1)
+        basis = _DCT_BASIS[side] = np.cos(np.pi * k * (2 * n + 1) / (2 * side))
+    x = np.frombuffer(pixels, dtype=np.uint8).reshape(side, side).astype(np.float64)
+    low = basis @ x @ basis.T
+    bits = (low > np.median(low)).ravel()
+    return format(int.from_bytes(np.packbits(bits).tobytes(), "big"), "x")
 
 
-def _hex_to_bitstring(hexstr: str, bits: int = 64) -> str:
-    """Convert a hex string (without 0x) to a zero-padded bitstring."""
+# Files up to this size are mapped into memory once and both hashes are
+# computed from the same buffer; larger files (typically video, which has no
+# phash anyway) are streamed for MD5 and only opened by Pillow separately.
+FUSED_READ_LIMIT = 64 * 1024 * 1024
+
+# Bytes of file header returned by `hash_and_probe` for file-type detection.
+# libmagic identifies media formats from their first few KB.
+MEDIA_PROBE_BYTES = 8192
+
+
+def compute_all(path: str, size: Optional[int] = None, algo: str = "md5") -> tuple[str, Optional[str]]:
+    """Return `(content_hash_hex, phash_hex)` for `path`, reading the file only once.
+
+    `size` is the file size when already known by the caller (e.g. from the
+    directory walk); it is only used to choose between the in-memory and the
+    streaming strategy. `algo` selects the content hash (see HASH_ALGOS).
+    """
+    digest, ph, _ = hash_and_probe(path, size, algo, probe_len=0)
+    return digest, ph
+
+
+def hash_and_probe(
+    path: str, size: Optional[int] = None, algo: str = "md5", probe_len: int = MEDIA_PROBE_BYTES,
+    phash_algo: str = "average",
+) -> tuple[str, Optional[str], bytes]:
+    """Like `compute_all`, additionally returning the first `probe_len` bytes.
+
+    The header comes from the same open file as the hashes, so callers can
+    detect the file type (`filetype.detect_media_type(header)`) without
+    opening the file again. `phash_algo` selects the perceptual hash (see
+    PHASH_ALGOS).
+    """
+    if size is None:
+        size = os.path.getsize(path)
+    if size > FUSED_READ_LIMIT:
+        digest, header = _digest_stream(path, get_hash_constructor(algo), probe_len)
+        return digest, _phash_from_source(path, phash_algo), header
+
+    digest = get_hash_constructor(algo)()
+    with open(path, "rb") as fh:
+        try:
+            # Map the file instead of read()ing it: the hash consumes the
+            # mapping as one buffer and Pillow reads from it like a file,
+            # so the contents are never copied into a Python bytes object.
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # empty file (can't be mapped) or a filesystem without mmap
+            data = fh.read()
+            digest.update(data)
+            return digest.hexdigest(), _phash_from_source(io.BytesIO(data), phash_algo), data[:probe_len]
+        with mm:
+            digest.update(mm)
+            header = mm[:probe_len]
+            return digest.hexdigest(), _phash_from_source(mm, phash_algo), header
+
+
+def phash_and_probe(
+    path: str, probe_len: int = MEDIA_PROBE_BYTES, phash_algo: str = "average"
+) -> tuple[Optional[str], bytes]:
+    """Return `(phash_hex, header)` for `path` from a single open file."""
+    with open(path, "rb") as fh:
+        if hasattr(os, "pread"):
+            # positional read: Pillow still starts at offset 0
+            header = os.pread(fh.fileno(), probe_len, 0)
+        else:
+            header = fh.read(probe_len)
+            fh.seek(0)
+        return _phash_from_source(fh, phash_algo), header
+
+
+def phash_to_int64(phash_hex: Optional[str]) -> Optional[int]:
+    """Signed 64-bit integer form of a hex phash, for the files.photo_hash_int column.
+
+    SQL BIGINT is signed, so hashes with the top bit set are stored as
+    negative numbers; `hamming_distance` and `cluster_by_hamming` accept
+    either form. Returns None for missing or unparsable hashes.
+    """
     try:
-        i = int(hexstr, 16)
-    except Exception:
-        return ""
-    b = bin(i)[2:].rjust(bits, "0")
-    return b[-bits:]
+        value = int(phash_hex, 16) & 0xFFFFFFFFFFFFFFFF
+    except (TypeError, ValueError):
+        return None
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _phash_value(phash, mask: int) -> Optional[int]:
+    """Masked integer value of a phash given as hex string or int, or None if unparsable."""
+    if isinstance(phash, int):
+        return phash & mask
+    try:
+        return int(phash, 16) & mask
+    except (TypeError, ValueError):
+        return None
 
 
-def hamming_distance(hex1: str, hex2: str, bits: int = 64) -> int:
-    """Compute Hamming distance between two hex phash strings (default 64-bit)."""
-    b1 = _hex_to_bitstring(hex1, bits)
-    b2 = _hex_to_bitstring(hex2, bits)
-    if not b1 or not b2:
+def hamming_distance(hex1, hex2, bits: int = 64) -> int:
+    """Compute Hamming distance between two phashes (default 64-bit).
+
+    Each phash is a hex string or an integer (see `phash_to_int64`). Only the
+    low `bits` bits are compared; unparsable input is at distance `bits` from
+    everything.
+    """
+    mask = (1 << bits) - 1
+    a = _phash_value(hex1, mask)
+    b = _phash_value(hex2, mask)
+    if a is None or b is None:
         return bits
-    return sum(ch1 != ch2 for ch1, ch2 in zip(b1, b2))
+    return (a ^ b).bit_count()
+
+
+# Below this many items the pure-Python loop is as fast as setting up NumPy arrays.
+NUMPY_CLUSTER_MIN_ITEMS = 256
+# Below this many items the pure-Python loop is as fast as building a PhashIndex.
+# (With NumPy the vectorized row scan is faster than the index in C-vs-Python
+# terms, so the index is only used when NumPy is missing.)
+PHASH_INDEX_MIN_ITEMS = 128
+
+
+class _DisjointSet:
+    """Union-find over 0..n-1 with path halving and union by rank."""
+
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+        self.rank = [0] * n
+
+    def find(self, x: int) -> int:
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a: int, b: int) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return
+        if self.rank[ra] < self.rank[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        if self.rank[ra] == self.rank[rb]:
+            self.rank[ra] += 1
+
+    def groups(self, items: list[tuple]) -> list[list[int]]:
+        """Ids of `items` grouped by set, in input order (clusters ordered by first member)."""
+        by_root: dict[int, list[int]] = {}
+        for i, (item_id, _) in enumerate(items):
+            by_root.setdefault(self.find(i), []).append(item_id)
+        return list(by_root.values())
+
 
+def cluster_by_hamming(items: Iterable[tuple], threshold: int = 5, bits: int = 64) -> list[list[int]]:
+    """Cluster items by phash: items is iterable of (id, phash). Returns list of clusters as lists of ids.
 
-def cluster_by_hamming(items: Iterable[tuple[int, str]], threshold: int = 5, bits: int = 64) -> list[list[int]]:
-    """Simple greedy clustering: items is iterable of (id, phash_hex). Returns list of clusters as lists of ids.
+    A phash is a hex string or an integer (see `phash_to_int64`).
 
-    This is O(n^2) and intended for small datasets or tests. It groups items if their phash Hamming
-    distance <= threshold.
+    Two items are linked if their phash Hamming distance <= threshold, and a
+    cluster is a connected group of linked items (union-find), so A~B and
+    B~C put A, B and C together even when A and C are further apart.
+    Clusters are ordered by their first item, ids in input order.
+
+    This is O(n^2). When NumPy is installed and the input is large, each row
+    of the distance matrix is computed with one vectorized XOR + popcount
+    instead of a Python loop. Without NumPy, a `PhashIndex` narrows each
+    item's comparisons to the items sharing a hash chunk with it (usual small
+    thresholds only). Clusters are identical either way.
     """
+    from dupdetector.lib.phash_index import index_supported
+
     items = list(items)
-    clusters: list[list[int]] = []
-    used = set()
-    for i, (id_i, p_i) in enumerate(items):
-        if id_i in used:
+    if len(items) >= NUMPY_CLUSTER_MIN_ITEMS and bits <= 64 and threshold < bits:
+        try:
+            import numpy as np
+        except Exception:
+            np = None
+        if np is not None:
+            return _cluster_by_hamming_numpy(np, items, threshold, bits)
+    if len(items) >= PHASH_INDEX_MIN_ITEMS and index_supported(threshold, bits):
+        return _cluster_by_hamming_indexed(items, threshold, bits)
+    # Parse every hash once; the pair loop is then one XOR + popcount.
+    # Unparsable hashes (None) are at distance `bits` from everything.
+    mask = (1 << bits) - 1
+    values = [_phash_value(ph, mask) for _, ph in items]
+    invalid_matches = bits <= threshold
+
+    n = len(items)
+    sets = _DisjointSet(n)
+    for i in range(n):
+        v_i = values[i]
+        for j in range(i + 1, n):
+            v_j = values[j]
+            if v_i is None or v_j is None:
+                close = invalid_matches
+            else:
+                close = (v_i ^ v_j).bit_count() <= threshold
+            if close:
+                sets.union(i, j)
+    return sets.groups(items)
+
+
+def _cluster_by_hamming_indexed(items: list[tuple], threshold: int, bits: int) -> list[list[int]]:
+    """`cluster_by_hamming` using a PhashIndex (same clusters)."""
+    from dupdetector.lib.phash_index import PhashIndex
+
+    mask = (1 << bits) - 1
+    values = [_phash_value(ph, mask) for _, ph in items]
+    index = PhashIndex(values, threshold, bits)
+    sets = _DisjointSet(len(items))
+    for i, v in enumerate(values):
+        if v is None:
             continue
-        cluster = [id_i]
-        used.add(id_i)
-        for j in range(i + 1, len(items)):
-            id_j, p_j = items[j]
-            if id_j in used:
-                continue
-            if hamming_distance(p_i, p_j, bits) <= threshold:
-                cluster.append(id_j)
-                used.add(id_j)
-        clusters.append(cluster)
-    return clusters
+        for j in index.within(v):
+            if j > i:
+                sets.union(i, j)
+    return sets.groups(items)
+
+
+def _popcount64(np, x):
+    """Per-element popcount of a uint64 array (SWAR fallback for NumPy < 2.0)."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x)
+    x = x - ((x >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return (x * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+
+def _cluster_by_hamming_numpy(np, items: list[tuple], threshold: int, bits: int) -> list[list[int]]:
+    """NumPy implementation of `cluster_by_hamming` (same clusters)."""
+    mask = (1 << bits) - 1
+    values = []
+    valid = []
+    for _, ph in items:
+        v = _phash_value(ph, mask)
+        # unparsable hashes are at distance `bits` from everything
+        values.append(0 if v is None else v)
+        valid.append(v is not None)
+    arr = np.array(values, dtype=np.uint64)
+    valid_arr = np.array(valid, dtype=bool)
+
+    sets = _DisjointSet(len(items))
+    for i in np.flatnonzero(valid_arr).tolist():
+        dist = _popcount64(np, arr[i + 1:] ^ arr[i])
+        for j in (np.flatnonzero((dist <= threshold) & valid_arr[i + 1:]) + (i + 1)).tolist():
+            sets.union(i, j)
+    return sets.groups(items)
@@ -0,0 +1,32 @@
+"""JSON helpers that use orjson when it is installed.
+
+orjson is an optional dependency; without it these fall back to the stdlib
+`json` module with equivalent output.
+"""
+import json
+
+try:
+    import orjson
+except Exception:  # optional speedup
+    orjson = None
+
+
+def loads(raw):
+    """Decode JSON from str or bytes."""
+    if orjson is not None:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            # e.g. integers beyond 64 bits; the stdlib parser accepts them
+            pass
+    return json.loads(raw)
+
+
+def dumps_compact(obj) -> str:
+    """Serialize without whitespace."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj).decode("utf-8")
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
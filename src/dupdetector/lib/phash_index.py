@@ -0,0 +1,74 @@
+"""Multi-index lookup of phashes within a Hamming radius.
+
+Comparing every phash with every other one is O(n^2). `PhashIndex` uses the
+pigeonhole principle instead: split each `bits`-bit hash into `radius + 1`
+chunks; two hashes that differ in at most `radius` bits must agree exactly
+on at least one chunk. Each chunk position gets a dict from chunk value to
+item positions, so a lookup only compares the items sharing a chunk with
+the query, typically a tiny fraction of the collection.
+"""
+from __future__ import annotations
+
+from typing import Optional, Sequence
+
+# Narrower chunks make the buckets too crowded to beat a linear scan.
+MIN_CHUNK_BITS = 8
+
+
+def index_supported(radius: int, bits: int = 64) -> bool:
+    """True when a `PhashIndex` for `radius` has chunks of at least MIN_CHUNK_BITS bits."""
+    return 0 <= radius < bits and bits // (radius + 1) >= MIN_CHUNK_BITS
+
+
+class PhashIndex:
+    """Index of integer phashes answering "which items are within `radius` bits".
+
+    `values` are the masked hash values (None for unparsable hashes, which
+    are never returned). Items are identified by their position in `values`;
+    `add` appends more.
+    """
+
+    def __init__(self, values: Sequence[Optional[int]], radius: int, bits: int = 64):
+        if not index_supported(radius, bits):
+            raise ValueError(f"radius {radius} too large for a {bits}-bit multi-index")
+        self.values = list(values)
+        self.radius = radius
+        n_chunks = radius + 1
+        width, extra = divmod(bits, n_chunks)
+        # (shift, mask) per chunk; the first `extra` chunks are one bit wider
+        self._chunks: list[tuple[int, int]] = []
+        shift = 0
+        for k in range(n_chunks):
+            w = width + (1 if k < extra else 0)
+            self._chunks.append((shift, (1 << w) - 1))
+            shift += w
+        self._tables: list[dict[int, list[int]]] = [{} for _ in self._chunks]
+        for pos, value in enumerate(self.values):
+            if value is not None:
+                self._insert(pos, value)
+
+    def _insert(self, pos: int, value: int) -> None:
+        for (shift, mask), table in zip(self._chunks, self._tables):
+            table.setdefault((value >> shift) & mask, []).append(pos)
+
+    def add(self, value: Optional[int]) -> int:
+        """Append one value (None for an unparsable hash) and return its position."""
+        pos = len(self.values)
+        self.values.append(value)
+        if value is not None:
+            self._insert(pos, value)
+        return pos
+
+    def candidates(self, value: int) -> set[int]:
+        """Positions of items sharing at least one chunk with `value` (a superset of the matches)."""
+        found: set[int] = set()
+        for (shift, mask), table in zip(self._chunks, self._tables):
+            bucket = table.get((value >> shift) & mask)
+            if bucket:
+                found.update(bucket)
+        return found
+
+    def within(self, value: int) -> list[int]:
+        """Sorted positions of items at Hamming distance <= radius from `value`."""
+        values = self.values
+        return sorted(pos for pos in self.candidates(value) if (values[pos] ^ value).bit_count() <= self.radius)
@@ -7,3 +7,4 @@ from .tag import Tag  # noqa: F401
 from .filetag import FileTag  # noqa: F401
 from .exif import ExifData  # noqa: F401
 from .application_lock import ApplicationLock  # noqa: F401
+from .geocode_cache import GeocodeCache  # noqa: F401
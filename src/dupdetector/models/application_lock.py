@@ -22,4 +22,5 @@ class ApplicationLock(Base):
     process_id = Column(Integer, nullable=False)  # OS process ID
     hostname = Column(String(255), nullable=False)  # Machine hostname
     acquired_at = Column(DateTime, server_default=func.current_timestamp(), nullable=False)
-    expires_at = Column(DateTime, nullable=True)  # Optional expiration time
+    # Indexed: expired-lock cleanup filters on it
+    expires_at = Column(DateTime, nullable=True, index=True)  # Optional expiration time
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Text, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime
 from sqlalchemy.sql import func
 from dupdetector.models import Base
 
@@ -9,4 +9,7 @@ class ExifData(Base):
     id = Column(Integer, primary_key=True)
     file_id = Column(Integer, ForeignKey("files.id"), nullable=False, index=True)
     raw_exif = Column(Text, nullable=True)
+    # 64-bit blake2b of raw_exif (hex), written with it; lets
+    # Repository.update_file_from_exif skip dumps it already applied.
+    raw_exif_hash = Column(String(16), nullable=True)
     created_at = Column(DateTime, server_default=func.current_timestamp(), nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey
+from sqlalchemy import BigInteger, Column, Integer, String, Text, Boolean, DateTime, ForeignKey
 from sqlalchemy.sql import func
 from dupdetector.models import Base
 
@@ -21,8 +21,16 @@ class File(Base):
     manufacturer = Column(String(255), nullable=True)
     # NOTE: detailed EXIF/metadata is stored in the separate exif_data table
     # to avoid slowing queries on the main files table.
-    md5_hash = Column(String(64), nullable=False)
-    photo_hash = Column(String(64), nullable=True)
+    # NULL when the scan ran with hash_mode="partial" or "size_only" and the
+    # file could not have a byte-identical twin (unique size or first-4KB hash).
+    # Indexed for duplicate lookups on insert (same index names as the
+    # 0002/0003 migrations, so create_all and Alembic databases agree).
+    md5_hash = Column(String(64), nullable=True, index=True)
+    photo_hash = Column(String(64), nullable=True, index=True)
+    # photo_hash as a signed 64-bit integer (see hashing.phash_to_int64), so
+    # near-duplicate searches fetch 8 bytes per row and skip hex parsing.
+    # Kept in sync by the repository; NULL for rows written before it existed.
+    photo_hash_int = Column(BigInteger, nullable=True)
     # Identifiers extracted from camera/vendor metadata useful for grouping
     content_identifier = Column(String(255), nullable=True, index=True)
     photo_identifier = Column(String(255), nullable=True, index=True)
@@ -60,3 +68,12 @@ class File(Base):
     # 4 = (gps_manual provided) + (manual_city + manual_country)
     # Keep this as a small integer so it's easy to query and update.
     geocode_provenance = Column(Integer, nullable=True, default=None)
+
+    # exif_data.raw_exif_hash of the dump last applied by
+    # Repository.update_file_from_exif (NULL: never applied that way).
+    exif_applied_hash = Column(String(16), nullable=True)
+
+    # File modification time (st_mtime_ns) when the row was hashed. A rescan
+    # skips paths whose size and mtime still match instead of hashing them
+    # again; NULL for rows written before it existed (always re-hashed).
+    mtime_ns = Column(BigInteger, nullable=True)
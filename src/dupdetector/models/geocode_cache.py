@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.sql import func
+from dupdetector.models import Base
+
+
+class GeocodeCache(Base):
+    """Reverse-geocoding results kept across scans.
+
+    Keyed by the GPS position rounded to GEOCODE_CACHE_DECIMALS (4 decimals,
+    about 11 m) and stored as integers (degrees * 10**4), so a re-scan of
+    already-seen places skips the geocode providers entirely.
+    """
+    __tablename__ = "geocode_cache"
+
+    lat_q = Column(Integer, primary_key=True, autoincrement=False)
+    lon_q = Column(Integer, primary_key=True, autoincrement=False)
+    city = Column(String(100), nullable=False)
+    country = Column(String(100), nullable=False)
+    created_at = Column(DateTime, server_default=func.current_timestamp(), nullable=False)
@@ -1,108 +1,623 @@
-from typing import Iterable, Optional
+from typing import Iterable, Iterator, Optional
+import functools
+import hashlib
+import logging
+import os
+import re
 import threading
+import time
 import json
+from datetime import datetime
+from math import cos, radians
 from pathlib import Path
+from types import SimpleNamespace
 
+from sqlalchemy import and_, case, inspect, insert, or_, update
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.sql import func as sa_func
 from sqlalchemy.orm import Session
 
+from dupdetector.lib.hashing import cluster_by_hamming, hamming_distance, phash_to_int64
+from dupdetector.lib.jsonutil import loads as exif_loads
+from dupdetector.lib.phash_index import PhashIndex, index_supported
+from dupdetector.models.exif import ExifData
 from dupdetector.models.file import File
+from dupdetector.models.geocode_cache import GeocodeCache
 from dupdetector.models.tag import Tag
-# Module-level cached geocode config to avoid reading config file per file
-_geocode_cfg_cache = None
-_geocode_cfg_lock = threading.Lock()
 
+logger = logging.getLogger(__name__)
+
+# Package config path, resolved once at import (resolve() stats the filesystem)
+_PKG_CONFIG_PATH = Path(__file__).resolve().parents[1] / "config.json"
+
+
+@functools.cache
 def _get_geocode_cfg_cached():
     """Load geocode config once and cache it.
 
     Returns the `geocode` dict from either the CWD `config.json` or the
     package `config.json`, or None if not present. Prints a single-line
     diagnostic indicating where (if anywhere) a geocode block was found.
+    The result (including None) is cached for the life of the process, so
+    the config files are read at most once rather than once per file.
     """
-    global _geocode_cfg_cache
-    if _geocode_cfg_cache is not None:
-        return _geocode_cfg_cache
-    with _geocode_cfg_lock:
-        if _geocode_cfg_cache is not None:
-            return _geocode_cfg_cache
-        # Helper to convert a legacy top-level `geodatabase` DSN into a
-        # `geocode` block using local_geonames provider so older configs
-        # continue to work without editing.
-        def _convert_legacy_geodatabase(proj):
-            try:
-                dsn = proj.get('geodatabase')
-                if not dsn or not isinstance(dsn, str):
-                    return None
-                from urllib.parse import urlparse, unquote
-                u = urlparse(dsn)
-                user = u.username
-                passwd = u.password
-                host = u.hostname
-                port = u.port or 3306
-                db = (u.path[1:]) if u.path and u.path.startswith('/') else u.path
-                if not (host and user and db):
-                    return None
-                return {
-                    'enabled': True,
-                    'providers': ['local_geonames'],
-                    'local_geonames': {
-                        'host': host,
-                        'user': user,
-                        'password': unquote(passwd) if passwd else None,
-                        'database': db,
-                        'port': port,
-                    }
-                }
-            except Exception:
+    # Helper to convert a legacy top-level `geodatabase` DSN into a
+    # `geocode` block using local_geonames provider so older configs
+    # continue to work without editing.
+    def _convert_legacy_geodatabase(proj):
+        try:
+            dsn = proj.get('geodatabase')
+            if not dsn or not isinstance(dsn, str):
                 return None
+            from urllib.parse import urlparse, unquote
+            u = urlparse(dsn)
+            user = u.username
+            passwd = u.password
+            host = u.hostname
+            port = u.port or 3306
+            db = (u.path[1:]) if u.path and u.path.startswith('/') else u.path
+            if not (host and user and db):
+                return None
+            return {
+                'enabled': True,
+                'providers': ['local_geonames'],
+                'local_geonames': {
+                    'host': host,
+                    'user': user,
+                    'password': unquote(passwd) if passwd else None,
+                    'database': db,
+                    'port': port,
+                }
+            }
+        except Exception:
+            return None
 
-        # Try CWD config first
+    # Try CWD config first
+    try:
+        cfg_path = Path.cwd() / "config.json"
+        if cfg_path.exists():
+            try:
+                with cfg_path.open("r", encoding="utf-8") as fh:
+                    proj = json.load(fh)
+                    geocode_cfg = proj.get("geocode")
+                    if not geocode_cfg:
+                        # try legacy top-level geodatabase
+                        legacy = _convert_legacy_geodatabase(proj)
+                        if legacy:
+                            geocode_cfg = legacy
+                            logger.info("geocode: derived geocode block from legacy geodatabase in cwd config: %s", cfg_path)
+                            return geocode_cfg
+                    if geocode_cfg:
+                        logger.info("geocode: found geocode block in cwd config: %s", cfg_path)
+                    else:
+                        logger.info("geocode: no geocode block in cwd config: %s", cfg_path)
+                    return geocode_cfg
+            except Exception as e:
+                logger.warning("geocode: failed parsing cwd config %s: %s", cfg_path, e)
+    except Exception:
+        logger.warning("geocode: unexpected error checking cwd config path")
+
+    # Try package config path next
+    try:
+        pkg_cfg_path = _PKG_CONFIG_PATH
+        if pkg_cfg_path.exists():
+            try:
+                with pkg_cfg_path.open("r", encoding="utf-8") as fh:
+                    proj = json.load(fh)
+                    geocode_cfg = proj.get("geocode")
+                    if geocode_cfg:
+                        logger.info("geocode: found geocode block in package config: %s", pkg_cfg_path)
+                    else:
+                        logger.info("geocode: no geocode block in package config: %s", pkg_cfg_path)
+                    return geocode_cfg
+            except Exception as e:
+                logger.warning("geocode: failed parsing package config %s: %s", pkg_cfg_path, e)
+    except Exception:
+        logger.warning("geocode: unexpected error checking package config path")
+
+    logger.info("geocode: no geocode configuration found in cwd or package config")
+    return None
+
+
+# Pooled engines for the local_geonames reverse-geocoding database, keyed by
+# connection settings, so a scan doesn't open a new MySQL connection (TCP +
+# handshake + auth) for every photo with GPS.
+_geonames_engines: dict = {}
+_geonames_engines_lock = threading.Lock()
+
+
+def _get_geonames_engine(host: str, port: int, user: str, password: Optional[str], database: str):
+    """Return the shared SQLAlchemy engine (mysql+pymysql) for a local geonames database."""
+    key = (host, port, user, password, database)
+    engine = _geonames_engines.get(key)
+    if engine is not None:
+        return engine
+    with _geonames_engines_lock:
+        engine = _geonames_engines.get(key)
+        if engine is None:
+            from sqlalchemy import create_engine
+            from sqlalchemy.engine import URL
+
+            from dupdetector.lib.database import MYSQL_POOL_RECYCLE
+
+            url = URL.create("mysql+pymysql", username=user, password=password, host=host, port=port,
+                             database=database)
+            engine = create_engine(url, pool_size=8, max_overflow=8, pool_pre_ping=True,
+                                   pool_recycle=MYSQL_POOL_RECYCLE, connect_args={"connect_timeout": 5})
+            _geonames_engines[key] = engine
+    return engine
+
+
+# Great-circle distance (km) from the bound position to a geoname row, in SQL.
+_GEONAME_DISTANCE_SQL = (
+    "(6371 * 2 * ASIN(SQRT(POWER(SIN(RADIANS(latitude - %s) / 2), 2) "
+    "+ COS(RADIANS(%s)) * COS(RADIANS(latitude)) * POWER(SIN(RADIANS(longitude - %s) / 2), 2))))"
+)
+# Nearest place inside a lat/lon bounding box: with an index on
+# geoname(latitude, longitude) this is a range scan instead of computing the
+# distance for every row of the table.
+_GEONAME_NEAREST_IN_BOX_SQL = (
+    "SELECT name, country_code FROM geoname "
+    "WHERE latitude BETWEEN %s AND %s AND longitude BETWEEN %s AND %s "
+    f"ORDER BY {_GEONAME_DISTANCE_SQL} ASC LIMIT 1"
+)
+# One arm of the batched lookup: the same box query, tagged with the
+# position's index in the batch (arms are joined with UNION ALL).
+_GEONAME_NEAREST_IN_BOX_BULK_SQL = (
+    "(SELECT %s AS idx, name, country_code FROM geoname "
+    "WHERE latitude BETWEEN %s AND %s AND longitude BETWEEN %s AND %s "
+    f"ORDER BY {_GEONAME_DISTANCE_SQL} ASC LIMIT 1)"
+)
+_GEONAME_NEAREST_SQL = f"SELECT name, country_code FROM geoname ORDER BY {_GEONAME_DISTANCE_SQL} ASC LIMIT 1"
+
+# Default half-size (km) of the local_geonames search box; see `search_km`.
+GEONAMES_SEARCH_KM = 100.0
+
+
+def _geonames_box(lat_f: float, lon_f: float, search_km: float) -> tuple:
+    """(lat_min, lat_max, lon_min, lon_max) of a box reaching `search_km` around a position."""
+
+    delta_lat = max(0.01, search_km / 111.0)
+    delta_lon = delta_lat / max(cos(radians(lat_f)), 0.01)
+    return lat_f - delta_lat, lat_f + delta_lat, lon_f - delta_lon, lon_f + delta_lon
+
+
+def _geocode_local_geonames(gn: dict, lat_f: float, lon_f: float,
+                            search_km: float = GEONAMES_SEARCH_KM) -> Optional[tuple]:
+    """(city, country_code) of the place nearest to (lat_f, lon_f) in a local geonames DB, or None.
+
+    Looks within `search_km` first (index range scan) and only falls back to
+    ranking the whole table when the box is empty (remote areas).
+    """
+    host = gn.get('host')
+    user = gn.get('user')
+    db = gn.get('database')
+    port = int(gn.get('port', 3306)) if gn.get('port') else 3306
+    passwd = gn.get('password')
+    if not (host and user and db):
+        return None
+    engine = _get_geonames_engine(host, port, user, passwd, db)
+    distance_args = (lat_f, lat_f, lon_f)
+    with engine.connect() as conn:
         try:
-            cfg_path = Path.cwd() / "config.json"
-            if cfg_path.exists():
-                try:
-                    with cfg_path.open("r", encoding="utf-8") as fh:
-                        proj = json.load(fh)
-                        _geocode_cfg_cache = proj.get("geocode")
-                        if not _geocode_cfg_cache:
-                            # try legacy top-level geodatabase
-                            legacy = _convert_legacy_geodatabase(proj)
-                            if legacy:
-                                _geocode_cfg_cache = legacy
-                                print(f"geocode: derived geocode block from legacy geodatabase in cwd config: {cfg_path}")
-                                return _geocode_cfg_cache
-                        if _geocode_cfg_cache:
-                            print(f"geocode: found geocode block in cwd config: {cfg_path}")
-                        else:
-                            print(f"geocode: no geocode block in cwd config: {cfg_path}")
-                        return _geocode_cfg_cache
-                except Exception as e:
-                    print(f"geocode: failed parsing cwd config {cfg_path}: {e}")
+            row = conn.exec_driver_sql(_GEONAME_NEAREST_IN_BOX_SQL,
+                                       _geonames_box(lat_f, lon_f, search_km) + distance_args).first()
+            if row is None:
+                row = conn.exec_driver_sql(_GEONAME_NEAREST_SQL, distance_args).first()
+        except Exception:
+            row = None
+    return (row[0], row[1]) if row is not None else None
+
+
+# Shared HTTP session for the web geocoders: reuses keep-alive connections
+# (one TLS handshake per host instead of one per photo). Created on first use
+# so `requests` stays an optional dependency.
+_http_session = None
+_http_session_lock = threading.Lock()
+# Nominatim's usage policy allows at most one request per second
+NOMINATIM_MIN_INTERVAL = 1.0
+_nominatim_last_request = 0.0
+_nominatim_lock = threading.Lock()
+
+
+def _get_http_session():
+    """Module-wide `requests.Session` with a small connection pool and retries."""
+    global _http_session
+    if _http_session is not None:
+        return _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            session = requests.Session()
+            session.headers.update({'User-Agent': 'DupDetector/1.0'})
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8,
+                                  max_retries=Retry(total=2, backoff_factor=0.3))
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _http_session = session
+    return _http_session
+
+
+def _nominatim_wait() -> None:
+    """Sleep as needed so Nominatim requests are at least NOMINATIM_MIN_INTERVAL apart."""
+    global _nominatim_last_request
+
+    with _nominatim_lock:
+        delay = _nominatim_last_request + NOMINATIM_MIN_INTERVAL - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        _nominatim_last_request = time.monotonic()
+
+
+def _geocode_geonames_api(gn_cfg: dict, lat_f: float, lon_f: float) -> Optional[tuple]:
+    """(city, country) from the geonames.org web service, or None."""
+    username = gn_cfg.get('username')
+    if not username:
+        return None
+    resp = _get_http_session().get('http://api.geonames.org/findNearbyPlaceNameJSON', params={'lat': str(lat_f), 'lng': str(lon_f), 'username': username}, timeout=6)
+    if resp.status_code == 200:
+        j = resp.json()
+        geonames = j.get('geonames') or []
+        if geonames:
+            p = geonames[0]
+            return p.get('name'), p.get('countryName')
+    return None
+
+
+def _geocode_nominatim(geocode_cfg: dict, lat_f: float, lon_f: float) -> Optional[tuple]:
+    """(city, country) from a Nominatim endpoint, or None."""
+    endpoint = geocode_cfg.get('endpoint') or 'https://nominatim.openstreetmap.org/reverse'
+    params = {'format': 'jsonv2', 'lat': str(lat_f), 'lon': str(lon_f), 'zoom': 10, 'addressdetails': 1}
+    if geocode_cfg.get('email'):
+        params['email'] = geocode_cfg['email']
+    _nominatim_wait()
+    resp = _get_http_session().get(endpoint, params=params, timeout=10)
+    if resp.status_code == 200:
+        j = resp.json()
+        addr = j.get('address') or {}
+        country = addr.get('country') or addr.get('country_name')
+        city = addr.get('city') or addr.get('town') or addr.get('village') or addr.get('municipality')
+        if country or city:
+            return city, country
+    return None
+
+
+def _reverse_geocode(lat_f: float, lon_f: float) -> tuple:
+    """Resolve (city, country) for a GPS position with the configured providers, in order.
+
+    Raises RuntimeError when no provider yields both a city and a country
+    (the scan policy requires them for every file with GPS).
+    """
+    geocode_cfg = _get_geocode_cfg_cached() or {}
+    city = None
+    country = None
+    tried = []
+    providers = []
+    if geocode_cfg.get('enabled'):
+        providers = list(geocode_cfg.get('providers') or ([geocode_cfg['provider']] if geocode_cfg.get('provider') else []))
+
+    # Always try local geonames first if configured
+    for prov in providers:
+        try:
+            pv = str(prov).lower()
         except Exception:
-            print("geocode: unexpected error checking cwd config path")
+            continue
+        tried.append(pv)
+        try:
+            if pv == 'local_geonames':
+                found = _geocode_local_geonames(geocode_cfg.get('local_geonames', {}), lat_f, lon_f,
+                                                float(geocode_cfg.get('search_km', GEONAMES_SEARCH_KM)))
+            elif pv == 'geonames':
+                found = _geocode_geonames_api(geocode_cfg.get('geonames', {}), lat_f, lon_f)
+            elif pv == 'nominatim':
+                found = _geocode_nominatim(geocode_cfg, lat_f, lon_f)
+            else:
+                found = None
+        except Exception:
+            continue
+        if found:
+            city, country = found
+            break
+
+    # After trying providers, enforce a value per user requirement
+    # If we couldn't resolve a city or country for GPS, raise so
+    # the caller (scan) can abort the whole operation per policy.
+    if not country or not city:
+        raise RuntimeError(f"reverse-geocode failed for GPS {lat_f},{lon_f} (providers tried: {tried})")
+    return city, country
+
+
+# GPS positions are rounded to this many decimals (about 11 m) before
+# reverse geocoding, so photos taken at the same place share one lookup.
+GEOCODE_CACHE_DECIMALS = 4
+
+
+GEOCODE_CACHE_SIZE = 8192
+# (lat_q, lon_q) -> (city, country); filled per position by
+# `_reverse_geocode_cached` and per batch by `_prefetch_reverse_geocodes`.
+_geocode_cache: dict = {}
+
+
+def _remember_geocode(key: tuple, value: tuple) -> None:
+    if len(_geocode_cache) >= GEOCODE_CACHE_SIZE:
+        # drop the oldest entry (dicts keep insertion order)
+        _geocode_cache.pop(next(iter(_geocode_cache)), None)
+    _geocode_cache[key] = value
+
+
+def _reverse_geocode_cached(lat_q: float, lon_q: float) -> tuple:
+    """`_reverse_geocode` memoized on rounded coordinates (failures are not cached)."""
+    key = (lat_q, lon_q)
+    hit = _geocode_cache.get(key)
+    if hit is None:
+        hit = _reverse_geocode(lat_q, lon_q)
+        _remember_geocode(key, hit)
+    return hit
+
+
+def _gps_cache_key(data: dict) -> Optional[tuple]:
+    """Rounded (lat, lon) cache key for the GPS tags in an EXIF dict, or None."""
+    lat = data.get("GPSLatitude")
+    lon = data.get("GPSLongitude")
+    if not (lat and lon):
+        return None
+    try:
+        return (round(_gps_degrees(lat), GEOCODE_CACHE_DECIMALS),
+                round(_gps_degrees(lon), GEOCODE_CACHE_DECIMALS))
+    except (TypeError, ValueError):
+        return None
+
+
+# Positions per UNION ALL query in `_geocode_local_geonames_bulk`.
+GEOCODE_BULK_CHUNK = 200
+
+
+def _geocode_local_geonames_bulk(gn: dict, positions: list, search_km: float = GEONAMES_SEARCH_KM) -> dict:
+    """Nearest place for many positions with one local geonames query per GEOCODE_BULK_CHUNK.
+
+    Returns {(lat, lon): (city, country_code)} for the positions that have a
+    place within `search_km`; the others are left to `_geocode_local_geonames`
+    and its whole-table fallback.
+    """
+    host = gn.get('host')
+    user = gn.get('user')
+    db = gn.get('database')
+    port = int(gn.get('port', 3306)) if gn.get('port') else 3306
+    passwd = gn.get('password')
+    found: dict = {}
+    if not (host and user and db) or not positions:
+        return found
+    engine = _get_geonames_engine(host, port, user, passwd, db)
+    with engine.connect() as conn:
+        for start in range(0, len(positions), GEOCODE_BULK_CHUNK):
+            chunk = positions[start:start + GEOCODE_BULK_CHUNK]
+            params: list = []
+            for idx, (lat_f, lon_f) in enumerate(chunk):
+                params.append(idx)
+                params.extend(_geonames_box(lat_f, lon_f, search_km))
+                params.extend((lat_f, lat_f, lon_f))
+            sql = " UNION ALL ".join([_GEONAME_NEAREST_IN_BOX_BULK_SQL] * len(chunk))
+            try:
+                rows = conn.exec_driver_sql(sql, tuple(params)).all()
+            except Exception:
+                continue
+            for idx, name, country_code in rows:
+                found[chunk[int(idx)]] = (name, country_code)
+    return found
+
+
+def _prefetch_reverse_geocodes(positions: Iterable[tuple]) -> dict:
+    """Warm the geocode cache for rounded positions with batched local_geonames queries.
+
+    Only applies when local_geonames is the first configured provider (so the
+    result is what a per-file lookup would return). Returns the positions
+    resolved here as {(lat, lon): (city, country)}; the rest resolve per file
+    as before.
+    """
+    resolved: dict = {}
+    geocode_cfg = _get_geocode_cfg_cached()
+    if not geocode_cfg or not geocode_cfg.get('enabled'):
+        return resolved
+    providers = [str(p).lower() for p in (geocode_cfg.get('providers') or [])]
+    if not providers or providers[0] != 'local_geonames':
+        return resolved
+    todo = [key for key in dict.fromkeys(positions) if key not in _geocode_cache]
+    if not todo:
+        return resolved
+    found = _geocode_local_geonames_bulk(geocode_cfg.get('local_geonames', {}), todo,
+                                         float(geocode_cfg.get('search_km', GEONAMES_SEARCH_KM)))
+    for key, (city, country) in found.items():
+        if city and country:
+            _remember_geocode(key, (city, country))
+            resolved[key] = (city, country)
+    return resolved
+
+
+def _geocode_row_key(key: tuple) -> tuple:
+    """geocode_cache primary key (integer degrees * 10**GEOCODE_CACHE_DECIMALS) of a rounded position."""
+    scale = 10 ** GEOCODE_CACHE_DECIMALS
+    return int(round(key[0] * scale)), int(round(key[1] * scale))
+
+
+# Candidate exiftool tag names per File field, in priority order. Kept as
+# module constants so the per-file EXIF mapping doesn't rebuild the lists;
+# each lookup is a single dict probe, which beats walking the few hundred
+# keys of a full exiftool dump.
+_MAKE_TAGS = ("Make", "Manufacturer", "Maker")
+_DATE_TAGS = (
+    "DateTimeOriginal", "CreateDate", "DateCreated", "OriginDate",
+    "DateTime", "ModifyDate", "FileModifyDate", "Date/Time Original",
+    "Date Time Original",
+)
+_CONTENT_ID_TAGS = ("ContentIdentifier", "Content Identifier", "ContentID", "Content Id")
+_PHOTO_ID_TAGS = ("Photo Identifier", "PhotoIdentifier", "PhotoIdentifierGUID", "Photo ID", "PhotoID")
+_WIDTH_TAGS = ("ExifImageWidth", "ImageWidth", "Image Width")
+_HEIGHT_TAGS = ("ExifImageHeight", "ImageHeight", "Image Height")
+
+
+def _pick_tag(dct: dict, candidates):
+    """Value of the first tag in `candidates` present (and truthy) in `dct`, else None."""
+    for k in candidates:
+        v = dct.get(k)
+        if v:
+            return v
+    return None
+
+
+def _parse_exif_date(val):
+    """Parse an EXIF/exiftool date string into a datetime, or None."""
+    if not val or not isinstance(val, str):
+        return None
+    return _parse_exif_date_str(val.strip())
+
 
-        # Try package config path next
+def _exif_object(parsed) -> Optional[dict]:
+    """The file's tag dict from decoded `exiftool -j` output, or None.
+
+    exiftool always answers with a one-element list, so that case is tested
+    first; a bare object is accepted too.
+    """
+    if type(parsed) is list:
+        data = parsed[0] if parsed else None
+    else:
+        data = parsed
+    return data if type(data) is dict else None
+
+
+def _exif_taken_at(data: dict):
+    """First parsable date among _DATE_TAGS in `data`, or None."""
+    for tag in _DATE_TAGS:
+        val = data.get(tag)
+        if val:
+            dt = _parse_exif_date(val)
+            if dt:
+                return dt
+    return None
+
+
+_EXIF_DT_RE = re.compile(r'(\d{4})[:-](\d{2})[:-](\d{2})[ T](\d{2}):(\d{2}):(\d{2})')
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_exif_date_str(s: str):
+    # (cached: a burst of photos repeats the same timestamps)
+    # exiftool common format: 'YYYY:MM:DD HH:MM:SS' (a trailing sub-second
+    # or timezone part goes through the slower paths below)
+    m = _EXIF_DT_RE.fullmatch(s)
+    if m:
         try:
-            pkg_cfg_path = Path(__file__).resolve().parents[1] / "config.json"
-            if pkg_cfg_path.exists():
-                try:
-                    with pkg_cfg_path.open("r", encoding="utf-8") as fh:
-                        proj = json.load(fh)
-                        _geocode_cfg_cache = proj.get("geocode")
-                        if _geocode_cfg_cache:
-                            print(f"geocode: found geocode block in package config: {pkg_cfg_path}")
-                        else:
-                            print(f"geocode: no geocode block in package config: {pkg_cfg_path}")
-                        return _geocode_cfg_cache
-                except Exception as e:
-                    print(f"geocode: failed parsing package config {pkg_cfg_path}: {e}")
+            return datetime(*map(int, m.groups()))
+        except ValueError:
+            # e.g. '0000:00:00 00:00:00' written by cameras without a clock
+            return None
+    try:
+        if len(s) >= 19 and s[4] == ':' and s[7] == ':':
+            # replace first two ':' with '-' to make ISO-like date
+            s2 = s.replace(':', '-', 2).replace(' ', 'T', 1)
+            return datetime.fromisoformat(s2)
+    except Exception:
+        pass
+    # ISO-like formats or 'YYYY-MM-DD HH:MM:SS'
+    try:
+        s2 = s.replace(' ', 'T')
+        return datetime.fromisoformat(s2)
+    except Exception:
+        pass
+    # fallback: try to parse common variants
+    try:
+        return datetime.strptime(s, "%Y:%m:%d %H:%M:%S")
+    except Exception:
+        try:
+            return datetime.strptime(s, "%Y-%m-%d %H:%M:%S")
         except Exception:
-            print("geocode: unexpected error checking package config path")
+            return None
+
+
+def _gps_degrees(v) -> float:
+    """GPS tag value in decimal degrees: DMS text via `_parse_dms`, else float()."""
+    try:
+        return _parse_dms(v)
+    except Exception:
+        return float(v)
+
 
-        print("geocode: no geocode configuration found in cwd or package config")
-        _geocode_cfg_cache = None
+def _parse_dms(v) -> float:
+    """Parse a GPS coordinate (decimal, or exiftool DMS like `14 deg 37' 10.97" N`) into degrees.
+
+    Raises ValueError/IndexError when `v` can't be parsed.
+    """
+    return _parse_dms_str(str(v).strip())
+
+
+_DECIMAL_RE = re.compile(r'-?\d+(\.\d+)?$')
+_DMS_SEPARATORS_RE = re.compile(r'deg|°|"|\'')
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_dms_str(s: str) -> float:
+    # (cached: photos taken at one place repeat the same coordinate strings)
+    # quick path: if it already looks like a decimal number
+    if _DECIMAL_RE.match(s):
+        return float(s)
+    # split compass direction
+    dirc = None
+    if s.endswith(('N', 'S', 'E', 'W')):
+        dirc = s[-1]
+        s = s[:-1].strip()
+    # replace degree/min/sec words/symbols with separators
+    parts = _DMS_SEPARATORS_RE.sub(' ', s).split()
+    if len(parts) >= 3:
+        val = float(parts[0]) + (float(parts[1]) / 60.0) + (float(parts[2]) / 3600.0)
+    elif len(parts) == 2:
+        val = float(parts[0]) + (float(parts[1]) / 60.0)
+    else:
+        val = float(parts[0])
+    if dirc in ('S', 'W'):
+        val = -abs(val)
+    return val
+
+
+def _phash_within_sql(query: int, max_distance: int):
+    """MySQL/MariaDB condition: File.photo_hash_int within `max_distance` bits of `query` (signed 64-bit).
+
+    MySQL's bit operators work on unsigned 64-bit values, so the XOR of the
+    two's-complement forms counts the same bits as in Python.
+    """
+    return sa_func.bit_count(File.photo_hash_int.op("^")(query)) <= max_distance
+
+
+@functools.cache
+def _file_insert_defaults() -> dict:
+    """Starting column values of a bulk-inserted File row.
+
+    Scalar Python-side defaults (e.g. is_duplicate=False), else None; the
+    primary key and server-default columns are left out so the database
+    fills them. Every row then has the same keys, which keeps the INSERT a
+    single executemany.
+    """
+    defaults = {}
+    for col in File.__table__.columns:
+        if col.primary_key or col.server_default is not None:
+            continue
+        default = col.default
+        defaults[col.key] = default.arg if default is not None and default.is_scalar else None
+    return defaults
+
+
+def _exif_digest(raw_exif: Optional[str]) -> Optional[str]:
+    """16-hex-digit blake2b digest of an exif dump (exif_data.raw_exif_hash), None for no dump."""
+    if raw_exif is None:
         return None
+    return hashlib.blake2b(raw_exif.encode("utf-8", "surrogatepass"), digest_size=8).hexdigest()
+
+
+def _sync_phash_int(f: File) -> None:
+    """Fill `f.photo_hash_int` from `f.photo_hash` unless the caller set it."""
+    if f.photo_hash_int is None and f.photo_hash:
+        f.photo_hash_int = phash_to_int64(f.photo_hash)
 
 
 class Repository:
@@ -114,50 +629,97 @@ class Repository:
 
     def __init__(self, session: Session):
         self.session = session
+        # (PhashIndex, file ids by index position) for find_similar_by_phash;
+        # built on first use and kept current by this repository's writes
+        self._phash_index = None
+        # whether the geocode_cache table exists (checked on first use)
+        self._geocode_store = None
+
+    # Persistent reverse-geocode cache (geocode_cache table)
+    def _geocode_store_available(self) -> bool:
+        if self._geocode_store is None:
+            try:
+                self._geocode_store = inspect(self.session.connection()).has_table(GeocodeCache.__tablename__)
+            except Exception:
+                self._geocode_store = False
+            if not self._geocode_store:
+                logger.info("geocode: no geocode_cache table; reverse-geocode results are not kept across scans")
+        return self._geocode_store
+
+    def _load_stored_geocodes(self, positions: Iterable[tuple]) -> None:
+        """Copy the geocode_cache rows for rounded `positions` into the in-process cache."""
+        wanted = {_geocode_row_key(key): key for key in positions if key not in _geocode_cache}
+        if not wanted or not self._geocode_store_available():
+            return
+        lat_values = {lat_q for lat_q, _ in wanted}
+        try:
+            rows = (self.session.query(GeocodeCache.lat_q, GeocodeCache.lon_q, GeocodeCache.city, GeocodeCache.country)
+                    .filter(GeocodeCache.lat_q.in_(lat_values))
+                    .all())
+        except Exception as e:
+            logger.warning("geocode: reading geocode_cache failed: %s", e)
+            return
+        for lat_q, lon_q, city, country in rows:
+            key = wanted.get((lat_q, lon_q))
+            if key is not None:
+                _remember_geocode(key, (city, country))
+
+    def _store_geocodes(self, results: dict) -> None:
+        """Add {rounded position: (city, country)} to geocode_cache in the current transaction.
+
+        Existing rows (e.g. written by a concurrent scan) are left alone.
+        """
+        if not results or not self._geocode_store_available():
+            return
+        rows = []
+        for key, (city, country) in results.items():
+            lat_q, lon_q = _geocode_row_key(key)
+            rows.append({'lat_q': lat_q, 'lon_q': lon_q, 'city': str(city)[:100], 'country': str(country)[:100]})
+        dialect = self.session.get_bind().dialect.name
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            stmt = dialect_insert(GeocodeCache).on_conflict_do_nothing()
+        elif dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            stmt = dialect_insert(GeocodeCache).on_conflict_do_nothing()
+        elif dialect in ("mysql", "mariadb"):
+            stmt = insert(GeocodeCache).prefix_with("IGNORE")
+        else:
+            return
+        try:
+            self.session.execute(stmt, rows)
+        except Exception as e:
+            logger.warning("geocode: writing geocode_cache failed: %s", e)
+
+    def _geocode_position(self, key: tuple) -> tuple:
+        """(city, country) for a rounded position: process cache, then geocode_cache, then the providers."""
+        hit = _geocode_cache.get(key)
+        if hit is None:
+            self._load_stored_geocodes([key])
+            hit = _geocode_cache.get(key)
+        if hit is None:
+            hit = _reverse_geocode_cached(*key)
+            self._store_geocodes({key: hit})
+        return hit
 
     # File helpers
     def create_file(self, **kwargs) -> File:
         # duplicate detection: if md5_hash exists, mark as duplicate of first found
         md5 = kwargs.get("md5_hash")
         photo_hash = kwargs.get("photo_hash")
-        duplicate_of = None
-        if md5:
-            existing = self.session.query(File).filter_by(md5_hash=md5).first()
-            if existing:
-                duplicate_of = existing.id
-        if duplicate_of is None and photo_hash:
-            existing = self.session.query(File).filter_by(photo_hash=photo_hash).first()
-            if existing:
-                duplicate_of = existing.id
-
-        # allow callers to pass raw_exif so we can apply EXIF-derived values
+        duplicate_of = self._first_duplicate_id(md5, photo_hash)
+
+        # allow callers to pass raw_exif so we can apply EXIF-derived values;
+        # parsed_exif, when given, is the already-decoded raw_exif object
         raw_exif = kwargs.pop("raw_exif", None)
+        parsed_exif = kwargs.pop("parsed_exif", None)
 
         f = File(**kwargs)
+        _sync_phash_int(f)
         # If raw_exif provided, attempt to parse and apply before commit so a
         # single insert populates derived fields (gps, city, country, taken_at).
         if raw_exif:
-            try:
-                # reuse parsing logic from update_file_from_exif via helper
-                parsed = None
-                try:
-                    import json as _json
-                    parsed_list = _json.loads(raw_exif)
-                    if isinstance(parsed_list, list) and parsed_list:
-                        parsed = parsed_list[0]
-                    elif isinstance(parsed_list, dict):
-                        parsed = parsed_list
-                except Exception:
-                    parsed = None
-                if parsed:
-                    # Apply parsed EXIF to the in-memory File object.
-                    # Do not swallow exceptions here: per project policy a GPS
-                    # value that cannot be reverse-geocoded to city+country
-                    # must abort the scan. Let any parsing/geocode exceptions
-                    # propagate to the caller so the scan can fail fast.
-                    self._apply_parsed_exif_to_file(f, parsed)
-            except Exception:
-                pass
+            self._apply_raw_exif(f, raw_exif, parsed_exif)
         if duplicate_of is not None:
             f.is_duplicate = True
             f.duplicate_of_id = duplicate_of
@@ -170,43 +732,258 @@ class Repository:
             self.session.rollback()
             # Try to find an existing record that caused the unique constraint.
             # Prefer matching by path if provided, otherwise fall back to md5/photo_hash.
+            # Only ids are fetched here; the winning row is loaded once below.
             path = kwargs.get("path")
-            md5 = kwargs.get("md5_hash")
-            photo_hash = kwargs.get("photo_hash")
-            existing = None
+            existing_id = None
             if path:
-                existing = self.session.query(File).filter_by(path=path).first()
-            if existing is None and md5:
-                existing = self.session.query(File).filter_by(md5_hash=md5).first()
-            if existing is None and photo_hash:
-                existing = self.session.query(File).filter_by(photo_hash=photo_hash).first()
-            if existing:
+                existing_id = self.session.query(File.id).filter_by(path=path).limit(1).scalar()
+            if existing_id is None:
+                existing_id = self._first_duplicate_id(kwargs.get("md5_hash"), kwargs.get("photo_hash"))
+            if existing_id is not None:
                 # Mark the object as duplicate (idempotent) and update timestamp.
-                existing.is_duplicate = True
                 # Use a DB-side update to set updated_at using the same server
                 # timestamp mechanism as the original insert (func.current_timestamp()).
                 # This avoids timezone/clock mismatches between Python and DB server.
                 try:
                     (self.session.query(File)
-                        .filter_by(id=existing.id)
+                        .filter_by(id=existing_id)
                         .update({"is_duplicate": True, "updated_at": sa_func.current_timestamp()}, synchronize_session=False))
                     self.session.commit()
-                    # Refresh to load DB-managed values
-                    self.session.refresh(existing)
+                    # Load (or reload) the row with its DB-managed values
+                    existing = self.session.get(File, existing_id, populate_existing=True)
                 except Exception:
                     # If the DB-side update fails for some reason, rollback and
-                    # fall back to attaching the existing object to the session.
+                    # fall back to updating through the ORM object.
                     self.session.rollback()
-                    self.session.add(existing)
+                    existing = self.session.get(File, existing_id)
+                    existing.is_duplicate = True
                     self.session.commit()
                     self.session.refresh(existing)
                 return existing
             # If we couldn't find an existing record, re-raise so caller can investigate
             raise
-        # refresh to populate defaults
-        self.session.refresh(f)
+        # No refresh(): id and the server-default timestamps come back with the
+        # INSERT (RETURNING) where the dialect supports it, and otherwise load
+        # lazily if read; the session doesn't expire objects on commit.
+        self._index_new_phashes([f])
         return f
 
+    def _first_duplicate_id(self, md5: Optional[str], photo_hash: Optional[str], exclude_id: Optional[int] = None) -> Optional[int]:
+        """Lowest id of a file with the same md5, else with the same photo_hash.
+
+        Both hashes are looked up with a single query (one round trip per
+        insert instead of two); md5 matches sort first. `exclude_id` leaves a
+        row out of the match (the row being updated).
+        """
+        conds = []
+        if md5:
+            conds.append(File.md5_hash == md5)
+        if photo_hash:
+            conds.append(File.photo_hash == photo_hash)
+        if not conds:
+            return None
+        q = self.session.query(File.id).filter(or_(*conds))
+        if exclude_id is not None:
+            q = q.filter(File.id != exclude_id)
+        if md5 and photo_hash:
+            q = q.order_by(case((File.md5_hash == md5, 0), else_=1))
+        row = q.order_by(File.id).first()
+        return row[0] if row else None
+
+    def _apply_raw_exif(self, f: File, raw_exif: str, parsed: Optional[dict] = None) -> None:
+        """Apply EXIF-derived fields to `f` from an exiftool JSON dump.
+
+        `parsed` is the decoded object of `raw_exif` when the caller already
+        has it; otherwise `raw_exif` is parsed here.
+        """
+        try:
+            # reuse parsing logic from update_file_from_exif via helper
+            if parsed is None:
+                try:
+                    parsed = _exif_object(exif_loads(raw_exif))
+                except Exception:
+                    parsed = None
+            if parsed:
+                # Apply parsed EXIF to the in-memory File object.
+                # Do not swallow exceptions here: per project policy a GPS
+                # value that cannot be reverse-geocoded to city+country
+                # must abort the scan. Let any parsing/geocode exceptions
+                # propagate to the caller so the scan can fail fast.
+                self._apply_parsed_exif_to_file(f, parsed)
+        except Exception:
+            pass
+
+    def bulk_create_files(self, records: Iterable[dict]) -> list[File]:
+        """Create several files; each record holds `create_file` kwargs.
+
+        A record's `raw_exif` (if any) is also stored in the exif_data table,
+        mirroring what `scan` does for a single file. Duplicate marking follows
+        `create_file` (md5 match first, then photo_hash; existing rows win over
+        earlier records of the same batch).
+
+        New rows are written in one transaction: existing duplicates are
+        looked up with one IN query per hash column, all rows go out in one
+        executemany INSERT ... RETURNING (or one flush where the dialect
+        can't return rows in order) and are committed once. Records whose path is already in the DB
+        (re-scans) update the stored row when their size or mtime_ns changed
+        (the file was modified since it was stored) and otherwise go through
+        `create_file`, which handles that case; so does the whole batch if the
+        bulk insert still hits an IntegrityError (e.g. a concurrent writer).
+        Other exceptions propagate. Returns one File per record, in input order.
+        """
+        records = list(records)
+        if not records:
+            return []
+        paths = {r["path"] for r in records if r.get("path")}
+        known = {
+            path: (file_id, size, mtime_ns)
+            for path, file_id, size, mtime_ns in self.session.query(File.path, File.id, File.size, File.mtime_ns).filter(File.path.in_(paths))
+        } if paths else {}
+        fresh = [r for r in records if r.get("path") not in known]
+        try:
+            inserted = self._insert_file_batch(fresh) if fresh else []
+        except IntegrityError:
+            self.session.rollback()
+            return [self._create_file_with_exif(rec) for rec in records]
+        by_record = dict(zip(map(id, fresh), inserted))
+
+        def _stored(rec: dict) -> File:
+            file_id, size, mtime_ns = known[rec["path"]]
+            if rec.get("mtime_ns") is not None and (size, mtime_ns) != (rec.get("size"), rec["mtime_ns"]):
+                return self._update_changed_file(file_id, rec)
+            return self._create_file_with_exif(rec)
+
+        return [by_record[id(r)] if id(r) in by_record else _stored(r) for r in records]
+
+    def _update_changed_file(self, file_id: int, rec: dict) -> File:
+        """Refresh a stored row from the record of its modified file.
+
+        The content-derived columns are replaced and duplicate marking is
+        redone against the other rows, as `create_file` would for a new file.
+        """
+        f = self.session.get(File, file_id)
+        for key in ("md5_hash", "photo_hash", "media_type", "size", "mtime_ns"):
+            setattr(f, key, rec.get(key))
+        f.photo_hash_int = None
+        _sync_phash_int(f)
+        raw_exif = rec.get("raw_exif")
+        if raw_exif:
+            self._apply_raw_exif(f, raw_exif, rec.get("parsed_exif"))
+        duplicate_of = self._first_duplicate_id(f.md5_hash, f.photo_hash, exclude_id=file_id)
+        f.is_duplicate = duplicate_of is not None
+        f.duplicate_of_id = duplicate_of
+        try:
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+        if raw_exif:
+            self.save_exif(file_id, raw_exif)
+        # the phash index holds the old hash
+        self.invalidate_phash_index()
+        return f
+
+    def _create_file_with_exif(self, rec: dict) -> File:
+        raw_exif = rec.get("raw_exif")
+        f = self.create_file(**rec)
+        if raw_exif:
+            self.save_exif(f.id, raw_exif)
+        return f
+
+    def _first_ids_by(self, column, values: set) -> dict:
+        """Map each value to the lowest File.id having `column == value`."""
+        first: dict = {}
+        if not values:
+            return first
+        rows = (self.session.query(column, File.id)
+                .filter(column.in_(values))
+                .order_by(File.id)
+                .all())
+        for value, file_id in rows:
+            first.setdefault(value, file_id)
+        return first
+
+    def _insert_file_batch(self, records: list[dict]) -> list[File]:
+        existing_md5 = self._first_ids_by(File.md5_hash, {r["md5_hash"] for r in records if r.get("md5_hash")})
+        existing_ph = self._first_ids_by(File.photo_hash, {r["photo_hash"] for r in records if r.get("photo_hash")})
+
+        # Resolve the batch's GPS positions together (one geonames query per
+        # chunk) instead of one round trip per photo in _apply_raw_exif.
+        positions = [_gps_cache_key(r["parsed_exif"]) for r in records
+                     if r.get("raw_exif") and isinstance(r.get("parsed_exif"), dict)]
+        positions = [p for p in positions if p is not None]
+        if positions:
+            try:
+                self._load_stored_geocodes(positions)
+                self._store_geocodes(_prefetch_reverse_geocodes(positions))
+            except Exception as e:
+                logger.warning("geocode: batched reverse-geocode failed, resolving per file: %s", e)
+
+        # With RETURNING that keeps parameter order (SQLite >= 3.35, PostgreSQL,
+        # MariaDB) the rows go out as one executemany INSERT that hands back
+        # the File objects, skipping the unit-of-work flush; elsewhere (MySQL)
+        # File objects are added and flushed as before.
+        bulk = bool(getattr(self.session.get_bind().dialect,
+                            "insert_executemany_returning_sort_by_parameter_order", False))
+        # per record: a File, or (bulk) a namespace of its column values
+        pending: list = []
+        # (position, position of the earlier row of this batch it duplicates);
+        # those ids are only known after the insert
+        pending_links: list[tuple[int, int]] = []
+        batch_md5: dict = {}
+        batch_ph: dict = {}
+        try:
+            for pos, rec in enumerate(records):
+                kwargs = dict(rec)
+                raw_exif = kwargs.pop("raw_exif", None)
+                parsed_exif = kwargs.pop("parsed_exif", None)
+                md5 = kwargs.get("md5_hash")
+                photo_hash = kwargs.get("photo_hash")
+                f = SimpleNamespace(**{**_file_insert_defaults(), **kwargs}) if bulk else File(**kwargs)
+                _sync_phash_int(f)
+                if raw_exif:
+                    self._apply_raw_exif(f, raw_exif, parsed_exif)
+
+                dup_id = existing_md5.get(md5) if md5 else None
+                dup_pos = batch_md5.get(md5) if (md5 and dup_id is None) else None
+                if dup_id is None and dup_pos is None and photo_hash:
+                    dup_id = existing_ph.get(photo_hash)
+                    if dup_id is None:
+                        dup_pos = batch_ph.get(photo_hash)
+                if dup_id is not None:
+                    f.is_duplicate = True
+                    f.duplicate_of_id = dup_id
+                elif dup_pos is not None:
+                    f.is_duplicate = True
+                    pending_links.append((pos, dup_pos))
+                if md5:
+                    batch_md5.setdefault(md5, pos)
+                if photo_hash:
+                    batch_ph.setdefault(photo_hash, pos)
+                pending.append(f)
+
+            if bulk:
+                created = list(self.session.scalars(
+                    insert(File).returning(File, sort_by_parameter_order=True),
+                    [vars(f) for f in pending],
+                ))
+            else:
+                created = pending
+                self.session.add_all(created)
+                self.session.flush()
+            for pos, original in pending_links:
+                created[pos].duplicate_of_id = created[original].id
+            self.session.add_all(
+                ExifData(file_id=f.id, raw_exif=rec["raw_exif"], raw_exif_hash=_exif_digest(rec["raw_exif"]))
+                for f, rec in zip(created, records) if rec.get("raw_exif")
+            )
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+        self._index_new_phashes(created)
+        return created
+
     def get_file_by_id(self, file_id: int) -> Optional[File]:
         # use Session.get to avoid legacy Query.get warnings
         return self.session.get(File, file_id)
@@ -214,18 +991,43 @@ class Repository:
     def get_files_by_md5(self, md5: str) -> list[File]:
         return self.session.query(File).filter_by(md5_hash=md5).all()
 
+    def get_file_stats_under(self, folder: str) -> dict[str, tuple[int, int]]:
+        """Map stored files under `folder` to their `(size, mtime_ns)`.
+
+        Keys are paths relative to `folder` (a resolved path, as stored).
+        Rows without a recorded mtime are left out, so they never look
+        unchanged to a rescan. Rows are streamed from the database, but the
+        result holds one entry per stored file under `folder`: roughly 200
+        bytes each, e.g. about 200 MB for a million files.
+        """
+        prefix = folder.rstrip("/\\") + os.sep
+        start = len(prefix)
+        rows = (self.session.query(File.path, File.size, File.mtime_ns)
+                .filter(File.path.startswith(prefix, autoescape=True), File.mtime_ns.isnot(None))
+                .yield_per(10000))
+        return {path[start:]: (size, mtime_ns) for path, size, mtime_ns in rows}
+
     def list_files(self, limit: Optional[int] = None) -> list[File]:
         q = self.session.query(File).order_by(File.id)
         if limit:
             q = q.limit(limit)
         return q.all()
 
+    def iter_files(self, batch_size: int = 1000) -> Iterator[File]:
+        """Like `list_files`, but streams rows `batch_size` at a time.
+
+        For walking every file of a large database without materializing the
+        whole table; don't run other queries on the session mid-iteration.
+        """
+        yield from self.session.query(File).order_by(File.id).yield_per(batch_size)
+
     def delete_file(self, file_id: int) -> bool:
         f = self.get_file_by_id(file_id)
         if not f:
             return False
         self.session.delete(f)
         self.session.commit()
+        self.invalidate_phash_index()
         return True
 
     # Tag helpers (small convenience)
@@ -233,44 +1035,151 @@ class Repository:
         t = Tag(name=name)
         self.session.add(t)
         self.session.commit()
-        self.session.refresh(t)
         return t
 
     def list_tags(self) -> list[Tag]:
         return self.session.query(Tag).order_by(Tag.name).all()
 
     # Near-duplicate helpers (photo_hash)
+    # Radius the cached phash index is built for; searches with a larger
+    # max_distance rebuild it for that distance.
+    PHASH_INDEX_RADIUS = 5
+
     def find_similar_by_phash(self, phash: str, max_distance: int = 5) -> list[File]:
         """Return files whose photo_hash Hamming distance to `phash` is <= max_distance.
 
-        This implementation fetches candidates with non-null photo_hash and computes
-        Hamming distances in Python (sufficient for small datasets / tests).
+        For the usual small distances the search goes through a `PhashIndex`
+        of all stored phashes, built on the first call and kept in sync with
+        files created or deleted through this repository (call
+        `invalidate_phash_index` after writes made elsewhere). Larger
+        distances fall back to comparing every stored hash, on the server
+        (BIT_COUNT) for MySQL/MariaDB. Only the matching File rows are loaded.
         """
-        from dupdetector.lib.hashing import hamming_distance
-
-        candidates = self.session.query(File).filter(File.photo_hash.isnot(None)).all()
-        similar = []
-        for c in candidates:
-            try:
-                dist = hamming_distance(phash, c.photo_hash)
-            except Exception:
-                continue
-            if dist <= max_distance:
-                similar.append(c)
-        return similar
-
-    def cluster_similar_photos(self, threshold: int = 5) -> list[list[int]]:
+        if index_supported(max_distance):
+            query = phash_to_int64(phash)
+            if query is None:
+                # unparsable: at distance 64 from everything
+                return []
+            index, ids = self._get_phash_index(max_distance)
+            query &= 0xFFFFFFFFFFFFFFFF
+            values = index.values
+            matches = [ids[pos] for pos in index.within(query)
+                       if (values[pos] ^ query).bit_count() <= max_distance]
+        elif self.session.get_bind().dialect.name in ("mysql", "mariadb"):
+            query = phash_to_int64(phash)
+            if query is None:
+                return []
+            # Let the server compare the integer column (BIT_COUNT of the XOR)
+            # instead of shipping every hash; only rows written before
+            # photo_hash_int existed are compared here.
+            matches = [file_id for (file_id,) in self.session.query(File.id).filter(
+                File.photo_hash_int.isnot(None), _phash_within_sql(query, max_distance))]
+            matches += [
+                file_id
+                for file_id, ph_hex in self.session.query(File.id, File.photo_hash).filter(
+                    File.photo_hash_int.is_(None), File.photo_hash.isnot(None))
+                if hamming_distance(phash, ph_hex) <= max_distance
+            ]
+        else:
+            matches = [
+                file_id
+                for file_id, ph_int, ph_hex in self._phash_rows()
+                if hamming_distance(phash, ph_int if ph_int is not None else ph_hex) <= max_distance
+            ]
+        if not matches:
+            return []
+        return self.session.query(File).filter(File.id.in_(matches)).order_by(File.id).all()
+
+    def _get_phash_index(self, radius: int):
+        """The cached (PhashIndex, ids) pair, (re)built when missing or too narrow."""
+        cached = self._phash_index
+        if cached is not None and cached[0].radius >= radius:
+            return cached
+        build_radius = max(radius, self.PHASH_INDEX_RADIUS)
+        if not index_supported(build_radius):
+            build_radius = radius
+        ids = []
+        values = []
+        for file_id, ph_int, ph_hex in self._phash_rows():
+            ids.append(file_id)
+            v = ph_int if ph_int is not None else phash_to_int64(ph_hex)
+            values.append(None if v is None else v & 0xFFFFFFFFFFFFFFFF)
+        self._phash_index = (PhashIndex(values, build_radius), ids)
+        return self._phash_index
+
+    def _index_new_phashes(self, files: Iterable[File]) -> None:
+        """Add freshly committed files to the cached phash index, if one is built."""
+        if self._phash_index is None:
+            return
+        index, ids = self._phash_index
+        for f in files:
+            if f.photo_hash:
+                v = f.photo_hash_int if f.photo_hash_int is not None else phash_to_int64(f.photo_hash)
+                index.add(None if v is None else v & 0xFFFFFFFFFFFFFFFF)
+                ids.append(f.id)
+
+    def invalidate_phash_index(self) -> None:
+        """Drop the cached phash index; the next similarity search rebuilds it."""
+        self._phash_index = None
+
+    def cluster_similar_photos(self, threshold: int = 5, partition: bool = False) -> list[list[int]]:
         """Cluster files by photo_hash using a Hamming distance threshold.
 
         Returns list of clusters containing file IDs.
-        """
-        from dupdetector.lib.hashing import cluster_by_hamming
 
-        rows = self.session.query(File.id, File.photo_hash).filter(File.photo_hash.isnot(None)).all()
-        # rows are tuples (id, phash)
-        clusters = cluster_by_hamming(rows, threshold)
+        With `partition=True`, files are first bucketed by (size in MiB,
+        media_type) and only compared within a bucket, which divides the
+        quadratic comparison work by roughly the number of buckets. Resized or
+        re-encoded copies land in other buckets and are then not grouped with
+        their original, so this is opt-in.
+        """
+        if not partition:
+            items = [(file_id, ph_int if ph_int is not None else ph_hex)
+                     for file_id, ph_int, ph_hex in self._phash_rows()]
+            return cluster_by_hamming(items, threshold)
+
+        buckets: dict[tuple, list[tuple]] = {}
+        for file_id, ph_int, ph_hex, size, media_type in self._phash_rows(with_bucket_keys=True):
+            buckets.setdefault(((size or 0) >> 20, media_type), []).append(
+                (file_id, ph_int if ph_int is not None else ph_hex))
+        clusters = [c for items in buckets.values() for c in cluster_by_hamming(items, threshold)]
+        # rows arrive in id order: order clusters by first member, as unpartitioned
+        clusters.sort(key=lambda c: c[0])
         return clusters
 
+    # Rows fetched per round trip when streaming phashes.
+    PHASH_YIELD_PER = 10_000
+
+    # Plain SQL understood by every supported backend. The hex column is only
+    # returned for rows whose integer column is still NULL (written before
+    # photo_hash_int existed).
+    _PHASH_ROWS_SQL = (
+        "SELECT id, photo_hash_int, CASE WHEN photo_hash_int IS NULL THEN photo_hash END{extra} "
+        "FROM files WHERE photo_hash IS NOT NULL ORDER BY id"
+    )
+
+    def _phash_rows(self, with_bucket_keys: bool = False) -> Iterable[tuple]:
+        """(id, photo_hash_int, photo_hash) for files with a phash, in id order.
+
+        `with_bucket_keys` appends (size, media_type) to each row. Reads
+        straight from a DBAPI cursor on the session's connection, in batches
+        of PHASH_YIELD_PER: for millions of rows, SQLAlchemy's result
+        processing and Row objects cost several times the query itself.
+        """
+        sql = self._PHASH_ROWS_SQL.format(extra=", size, media_type" if with_bucket_keys else "")
+        # a raw cursor bypasses autoflush
+        self.session.flush()
+        cursor = self.session.connection().connection.cursor()
+        try:
+            cursor.execute(sql)
+            while True:
+                batch = cursor.fetchmany(self.PHASH_YIELD_PER)
+                if not batch:
+                    break
+                yield from batch
+        finally:
+            cursor.close()
+
     # Minimal predecessor/linking helpers
     def find_predecessor_for(self, new_file: File) -> Optional[int]:
         """Try to find a likely predecessor file id for a newly created file.
@@ -281,44 +1190,31 @@ class Repository:
         - same path but different md5 (latest)
         Returns an existing file id or None.
         """
-        # content_identifier
-        if getattr(new_file, 'content_identifier', None):
-            row = (self.session.query(File.id)
-                   .filter(File.content_identifier == new_file.content_identifier)
-                   .filter(File.id != new_file.id)
-                   .order_by(File.id.desc())
-                   .first())
-            if row:
-                return row[0]
-        # photo_identifier
-        if getattr(new_file, 'photo_identifier', None):
+        # One query for all three heuristics: each match is ranked by the
+        # heuristic it satisfies, best rank first, then latest id.
+        whens = []
+        content_identifier = getattr(new_file, 'content_identifier', None)
+        if content_identifier:
+            whens.append((File.content_identifier == content_identifier, 1))
+        photo_identifier = getattr(new_file, 'photo_identifier', None)
+        if photo_identifier:
+            whens.append((File.photo_identifier == photo_identifier, 2))
+        path = getattr(new_file, 'path', None)
+        if path:
+            whens.append((and_(File.path == path, File.md5_hash != new_file.md5_hash), 3))
+        if not whens:
+            return None
+        rank = case(*whens, else_=99)
+        try:
             row = (self.session.query(File.id)
-                   .filter(File.photo_identifier == new_file.photo_identifier)
+                   .filter(or_(*[cond for cond, _ in whens]))
                    .filter(File.id != new_file.id)
-                   .order_by(File.id.desc())
+                   .order_by(rank, File.id.desc())
                    .first())
-            if row:
-                return row[0]
-        # same path but different md5
-        try:
-            if getattr(new_file, 'path', None):
-                row = (self.session.query(File.id)
-                       .filter(File.path == new_file.path)
-                       .filter(File.id != new_file.id)
-                       .filter(File.md5_hash != new_file.md5_hash)
-                       .order_by(File.id.desc())
-                       .first())
-                if row:
-                    return row[0]
         except Exception as _e:
-            try:
-                import traceback as _tb
-                print('geocode: unexpected error in geocode block:', _e)
-                print(_tb.format_exc())
-            except Exception:
-                # if printing fails, re-raise to avoid hiding the original error
-                raise
-        return None
+            logger.warning("find_predecessor_for: predecessor lookup failed: %s", _e, exc_info=True)
+            return None
+        return row[0] if row else None
 
     def link_previous(self, new_id: int, previous_id: int) -> None:
         """Set previous_id on a file record."""
@@ -376,7 +1272,6 @@ class Repository:
         if copied:
             try:
                 self.session.commit()
-                self.session.refresh(new)
             except Exception:
                 self.session.rollback()
                 raise
@@ -386,21 +1281,19 @@ class Repository:
     # Exif helpers
     def save_exif(self, file_id: int, raw_exif: str) -> None:
         """Save or replace the raw exif dump for a given file_id."""
-        from dupdetector.models.exif import ExifData
-
         # If an ExifData row already exists for this file, update it; otherwise insert.
         existing = self.session.query(ExifData).filter_by(file_id=file_id).first()
         if existing:
             existing.raw_exif = raw_exif
+            existing.raw_exif_hash = _exif_digest(raw_exif)
             try:
                 self.session.commit()
             except Exception:
                 self.session.rollback()
                 raise
-            self.session.refresh(existing)
             return
 
-        row = ExifData(file_id=file_id, raw_exif=raw_exif)
+        row = ExifData(file_id=file_id, raw_exif=raw_exif, raw_exif_hash=_exif_digest(raw_exif))
         self.session.add(row)
         try:
             self.session.commit()
@@ -409,8 +1302,6 @@ class Repository:
             raise
 
     def get_exif_by_file_id(self, file_id: int) -> Optional[str]:
-        from dupdetector.models.exif import ExifData
-
         row = self.session.query(ExifData).filter_by(file_id=file_id).first()
         return row.raw_exif if row else None
 
@@ -425,64 +1316,21 @@ class Repository:
         changed = False
 
         # Manufacturer
-        make = data.get("Make") or data.get("Manufacturer") or data.get("Maker")
+        make = _pick_tag(data, _MAKE_TAGS)
         if make and getattr(f, "manufacturer", None) != make:
             f.manufacturer = str(make)
             changed = True
 
         # taken_at
-        def _parse_exif_date(val: str):
-            from datetime import datetime
-
-            if not val or not isinstance(val, str):
-                return None
-            s = val.strip()
-            try:
-                if len(s) >= 19 and s[4] == ':' and s[7] == ':':
-                    s2 = s.replace(':', '-', 2).replace(' ', 'T', 1)
-                    return datetime.fromisoformat(s2)
-            except Exception:
-                pass
-            try:
-                s2 = s.replace(' ', 'T')
-                return datetime.fromisoformat(s2)
-            except Exception:
-                pass
-            try:
-                from datetime import datetime as _dt
-                return _dt.strptime(s, "%Y:%m:%d %H:%M:%S")
-            except Exception:
-                try:
-                    return _dt.strptime(s, "%Y-%m-%d %H:%M:%S")
-                except Exception:
-                    return None
-
-        date_candidates = [
-            "DateTimeOriginal", "CreateDate", "DateCreated", "OriginDate",
-            "DateTime", "ModifyDate", "FileModifyDate", "Date/Time Original",
-            "Date Time Original",
-        ]
-        taken = None
-        for tag in date_candidates:
-            if tag in data and data[tag]:
-                dt = _parse_exif_date(data[tag])
-                if dt:
-                    taken = dt
-                    break
+        taken = _exif_taken_at(data)
         if taken and getattr(f, "taken_at", None) != taken:
             f.taken_at = taken
             f.taken_at_provenance = 1
             changed = True
 
         # Identifiers
-        def _pick_tag(dct, candidates):
-            for k in candidates:
-                if k in dct and dct[k]:
-                    return dct[k]
-            return None
-
-        content_id = _pick_tag(data, ["ContentIdentifier", "Content Identifier", "ContentID", "Content Id"]) 
-        photo_id = _pick_tag(data, ["Photo Identifier", "PhotoIdentifier", "PhotoIdentifierGUID", "Photo ID", "PhotoID"]) 
+        content_id = _pick_tag(data, _CONTENT_ID_TAGS)
+        photo_id = _pick_tag(data, _PHOTO_ID_TAGS)
         if content_id and getattr(f, "content_identifier", None) != content_id:
             f.content_identifier = str(content_id)
             changed = True
@@ -491,8 +1339,8 @@ class Repository:
             changed = True
 
         # Dimensions
-        w = data.get("ExifImageWidth") or data.get("ImageWidth") or data.get("Image Width")
-        h = data.get("ExifImageHeight") or data.get("ImageHeight") or data.get("Image Height")
+        w = _pick_tag(data, _WIDTH_TAGS)
+        h = _pick_tag(data, _HEIGHT_TAGS)
         if w and h:
             try:
                 dim = f"{int(w)}x{int(h)}"
@@ -522,159 +1370,15 @@ class Repository:
                     "geocode configuration not found or disabled; cannot reverse-geocode GPS coordinates"
                 )
 
-            # Helper: parse DMS into decimal degrees
-            def _parse_dms(v: str):
-                s = str(v).strip()
-                if s.replace('.', '').replace('-', '').isdigit():
-                    return float(s)
-                dirc = None
-                if s.endswith(('N', 'S', 'E', 'W')):
-                    dirc = s[-1]
-                    s = s[:-1].strip()
-                for ch in ("deg", "°"):
-                    s = s.replace(ch, ' ')
-                s = s.replace('"', ' ').replace("'", ' ')
-                parts = [p for p in s.split() if p]
-                if len(parts) >= 3:
-                    deg = float(parts[0])
-                    minu = float(parts[1])
-                    sec = float(parts[2])
-                    val = deg + (minu / 60.0) + (sec / 3600.0)
-                elif len(parts) == 2:
-                    deg = float(parts[0])
-                    minu = float(parts[1])
-                    val = deg + (minu / 60.0)
-                else:
-                    val = float(parts[0])
-                if dirc and dirc in ('S', 'W'):
-                    val = -abs(val)
-                return val
-
-            try:
-                lat_f = _parse_dms(lat)
-            except Exception:
-                lat_f = float(lat)
-            try:
-                lon_f = _parse_dms(lon)
-            except Exception:
-                lon_f = float(lon)
-
-            # Try providers in order; require city+country if GPS present
-            city = None
-            country = None
-            tried = []
-            providers = []
-            if geocode_cfg and geocode_cfg.get('enabled'):
-                providers = list(geocode_cfg.get('providers') or [])
-
-            # Always try local geonames first if configured
-            for prov in providers:
-                try:
-                    pv = str(prov).lower()
-                except Exception:
-                    continue
-                tried.append(pv)
-                if pv == 'local_geonames':
-                    gn = geocode_cfg.get('local_geonames', {})
-                    host = gn.get('host')
-                    user = gn.get('user')
-                    db = gn.get('database')
-                    port = int(gn.get('port', 3306)) if gn.get('port') else 3306
-                    passwd = gn.get('password')
-                    if not (host and user and db):
-                        continue
-                    try:
-                        import pymysql
-                        conn = pymysql.connect(host=host, port=port, user=user, password=passwd, database=db, connect_timeout=5)
-                        cur = conn.cursor()
-                        sql = ("SELECT name, country_code, latitude, longitude, "
-                               "(6371 * 2 * ASIN(SQRT(POWER(SIN(RADIANS(latitude - %s) / 2), 2) "
-                               "+ COS(RADIANS(%s)) * COS(RADIANS(latitude)) * POWER(SIN(RADIANS(longitude - %s) / 2), 2)))) "
-                               "AS distance_km FROM geoname ORDER BY distance_km ASC LIMIT 10;")
-                        try:
-                            cur.execute(sql, (lat_f, lat_f, lon_f))
-                            rows = cur.fetchall()
-                        except Exception:
-                            rows = []
-                        finally:
-                            try:
-                                cur.close()
-                            except Exception:
-                                pass
-                            try:
-                                conn.close()
-                            except Exception:
-                                pass
-                        # pick nearest
-                        best = None
-                        best_d = None
-                        for r in rows:
-                            try:
-                                if len(r) >= 4:
-                                    pname = r[0]
-                                    pcountry = r[1]
-                                    plat = float(r[2])
-                                    plon = float(r[3])
-                                else:
-                                    continue
-                                from math import radians, sin, cos, sqrt, atan2
-                                def _haversine(lat1, lon1, lat2, lon2):
-                                    R = 6371.0
-                                    dlat = radians(lat2 - lat1)
-                                    dlon = radians(lon2 - lon1)
-                                    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
-                                    c = 2 * atan2(sqrt(a), sqrt(1 - a))
-                                    return R * c
-                                d = _haversine(lat_f, lon_f, plat, plon)
-                            except Exception:
-                                continue
-                            if best is None or d < best_d:
-                                best = (pname, pcountry)
-                                best_d = d
-                        if best:
-                            city, country = best[0], best[1]
-                            break
-                    except Exception:
-                        continue
-                elif pv == 'geonames':
-                    try:
-                        import requests
-                        gn_cfg = geocode_cfg.get('geonames', {})
-                        username = gn_cfg.get('username')
-                        if not username:
-                            continue
-                        resp = requests.get('http://api.geonames.org/findNearbyPlaceNameJSON', params={'lat': str(lat_f), 'lng': str(lon_f), 'username': username}, timeout=6)
-                        if resp.status_code == 200:
-                            j = resp.json()
-                            geonames = j.get('geonames') or []
-                            if geonames:
-                                p = geonames[0]
-                                city = p.get('name')
-                                country = p.get('countryName')
-                                break
-                    except Exception:
-                        continue
-                elif pv == 'nominatim':
-                    try:
-                        import requests
-                        endpoint = geocode_cfg.get('endpoint') or 'https://nominatim.openstreetmap.org/reverse'
-                        params = {'format': 'jsonv2', 'lat': str(lat_f), 'lon': str(lon_f), 'zoom': 10, 'addressdetails': 1}
-                        resp = requests.get(endpoint, params=params, timeout=10, headers={'User-Agent': 'DupDetector/1.0'})
-                        if resp.status_code == 200:
-                            j = resp.json()
-                            addr = j.get('address') or {}
-                            country = addr.get('country') or addr.get('country_name')
-                            city = addr.get('city') or addr.get('town') or addr.get('village') or addr.get('municipality')
-                            if country or city:
-                                break
-                    except Exception:
-                        continue
+            lat_f = _gps_degrees(lat)
+            lon_f = _gps_degrees(lon)
 
-            # After trying providers, enforce a value per user requirement
-            # If we couldn't resolve a city or country for GPS, raise so
-            # the caller (scan) can abort the whole operation per policy.
-            if not country or not city:
-                raise RuntimeError(f"reverse-geocode failed for GPS {lat_f},{lon_f} (providers tried: {tried})")
+            # Try providers in order; require city+country if GPS present.
+            # Raises (per policy, aborting the scan) when no provider resolves
+            # both; nearby photos share one lookup through the caches (in
+            # process, then the geocode_cache table from earlier scans).
+            city, country = self._geocode_position((round(lat_f, GEOCODE_CACHE_DECIMALS),
+                                                    round(lon_f, GEOCODE_CACHE_DECIMALS)))
             if getattr(f, 'country', None) != country:
                 f.country = country
                 changed = True
@@ -701,93 +1405,43 @@ class Repository:
         when corresponding tags are present in the exif dump. Returns the
         updated File object (or None if the file doesn't exist).
         """
-        import json as _json
-        from dupdetector.models.exif import ExifData
-
-        f = self.get_file_by_id(file_id)
-        if not f:
+        # the file and its exif dump in one round trip
+        row = (self.session.query(File, ExifData)
+               .outerjoin(ExifData, ExifData.file_id == File.id)
+               .filter(File.id == file_id)
+               .first())
+        if row is None:
             return None
-
-        exif_row = self.session.query(ExifData).filter_by(file_id=file_id).first()
+        f, exif_row = row
         if not exif_row or not exif_row.raw_exif:
             return f
+        # Re-runs are cheap: skip the parse when this exact dump was already applied
+        digest = exif_row.raw_exif_hash or _exif_digest(exif_row.raw_exif)
+        if f.exif_applied_hash == digest:
+            return f
 
         # exiftool -j output is typically a JSON array with one element per file
         try:
-            parsed = _json.loads(exif_row.raw_exif)
+            parsed = exif_loads(exif_row.raw_exif)
         except Exception:
             # Keep original if parsing fails
             return f
 
-        data = None
-        if isinstance(parsed, list):
-            if len(parsed) > 0 and isinstance(parsed[0], dict):
-                data = parsed[0]
-        elif isinstance(parsed, dict):
-            data = parsed
-
+        data = _exif_object(parsed)
         if not data:
             return f
 
         changed = False
 
         # Manufacturer / Make
-        make = data.get("Make") or data.get("Manufacturer") or data.get("Maker")
-        if make and (getattr(f, "manufacturer", None) != make):
+        make = _pick_tag(data, _MAKE_TAGS)
+        if make and f.manufacturer != make:
             f.manufacturer = str(make)
             changed = True
 
-        # Photo taken date: look for common EXIF date tags and parse into datetime
-        def _parse_exif_date(val: str):
-            from datetime import datetime
-
-            if not val or not isinstance(val, str):
-                return None
-            s = val.strip()
-            # exiftool common format: 'YYYY:MM:DD HH:MM:SS'
-            try:
-                if len(s) >= 19 and s[4] == ':' and s[7] == ':':
-                    # replace first two ':' with '-' to make ISO-like date
-                    s2 = s.replace(':', '-', 2).replace(' ', 'T', 1)
-                    return datetime.fromisoformat(s2)
-            except Exception:
-                pass
-            # ISO-like formats or 'YYYY-MM-DD HH:MM:SS'
-            try:
-                s2 = s.replace(' ', 'T')
-                return datetime.fromisoformat(s2)
-            except Exception:
-                pass
-            # fallback: try to parse common variants
-            try:
-                # try without timezone
-                return datetime.strptime(s, "%Y:%m:%d %H:%M:%S")
-            except Exception:
-                try:
-                    return datetime.strptime(s, "%Y-%m-%d %H:%M:%S")
-                except Exception:
-                    return None
-
         # check multiple possible date tags
-        date_candidates = [
-            "DateTimeOriginal",
-            "CreateDate",
-            "DateCreated",
-            "OriginDate",
-            "DateTime",
-            "ModifyDate",
-            "FileModifyDate",
-            "Date/Time Original",
-            "Date Time Original",
-        ]
-        taken = None
-        for tag in date_candidates:
-            if tag in data and data[tag]:
-                dt = _parse_exif_date(data[tag])
-                if dt:
-                    taken = dt
-                    break
-        if taken and getattr(f, "taken_at", None) != taken:
+        taken = _exif_taken_at(data)
+        if taken and f.taken_at != taken:
             f.taken_at = taken
             changed = True
             try:
@@ -798,30 +1452,24 @@ class Repository:
 
         # ContentIdentifier / Photo Identifier (various tag names may be used);
         # prefer ContentIdentifier for grouping related media (photos/mov files)
-        def _pick_tag(dct, candidates):
-            for k in candidates:
-                if k in dct and dct[k]:
-                    return dct[k]
-            return None
-
-        content_id = _pick_tag(data, ["ContentIdentifier", "Content Identifier", "ContentID", "Content Id"]) 
-        photo_id = _pick_tag(data, ["Photo Identifier", "PhotoIdentifier", "PhotoIdentifierGUID", "Photo ID", "PhotoID"]) 
-        if content_id and getattr(f, "content_identifier", None) != content_id:
+        content_id = _pick_tag(data, _CONTENT_ID_TAGS)
+        photo_id = _pick_tag(data, _PHOTO_ID_TAGS)
+        if content_id and f.content_identifier != content_id:
             f.content_identifier = str(content_id)
             changed = True
-        if photo_id and getattr(f, "photo_identifier", None) != photo_id:
+        if photo_id and f.photo_identifier != photo_id:
             f.photo_identifier = str(photo_id)
             changed = True
 
         # Dimensions: prefer ExifImageWidth/Height or ImageWidth/ImageHeight
-        w = data.get("ExifImageWidth") or data.get("ImageWidth") or data.get("Image Width")
-        h = data.get("ExifImageHeight") or data.get("ImageHeight") or data.get("Image Height")
+        w = _pick_tag(data, _WIDTH_TAGS)
+        h = _pick_tag(data, _HEIGHT_TAGS)
         if w and h:
             try:
                 dim = f"{int(w)}x{int(h)}"
             except Exception:
                 dim = f"{w}x{h}"
-            if getattr(f, "dimensions", None) != dim:
+            if f.dimensions != dim:
                 f.dimensions = dim
                 changed = True
 
@@ -831,377 +1479,126 @@ class Repository:
         if lat and lon:
             gps = f"{lat},{lon}"
             # log GPS read along with any current country/city values
-            try:
-                cur_country = getattr(f, "country", None)
-                cur_city = getattr(f, "city", None)
-                print(f"read GPS for file id={f.id}: {gps} (current country={cur_country!r}, city={cur_city!r})")
-            except Exception:
-                pass
-            if getattr(f, "gps", None) != gps:
+            logger.debug("read GPS for file id=%s: %s (current country=%r, city=%r)", f.id, gps, f.country, f.city)
+            if f.gps != gps:
                 f.gps = str(gps)
                 changed = True
 
         # Optional reverse-geocoding: populate city/country when enabled in config
+        geocode_failed = False
         try:
-            import json as _json
-            from pathlib import Path as _Path
-            cfg_path = _Path.cwd() / "config.json"
-            geocode_cfg = None
-            if cfg_path.exists():
-                try:
-                    with cfg_path.open("r", encoding="utf-8") as _fh:
-                        proj = _json.load(_fh)
-                        geocode_cfg = proj.get("geocode")
-                except Exception:
-                    geocode_cfg = None
-            # fallback to project package config
-            if not geocode_cfg:
-                try:
-                    pkg_cfg_path = _Path(__file__).resolve().parents[1] / "config.json"
-                    if pkg_cfg_path.exists():
-                        with pkg_cfg_path.open("r", encoding="utf-8") as _fh:
-                            proj = _json.load(_fh)
-                            geocode_cfg = proj.get("geocode")
-                except Exception:
-                    geocode_cfg = None
+            # loaded once per process (see _get_geocode_cfg_cached)
+            geocode_cfg = _get_geocode_cfg_cached()
             if geocode_cfg and geocode_cfg.get("enabled") and lat and lon:
                     try:
-                        print(f"geocode: entering geocode block for file id={f.id}, raw lat={lat!r}, raw lon={lon!r}")
-                        print(f"geocode_cfg providers: {geocode_cfg.get('providers')}")
+                        logger.debug("geocode: entering geocode block for file id=%s, raw lat=%r, raw lon=%r", f.id, lat, lon)
+                        logger.debug("geocode_cfg providers: %s", geocode_cfg.get('providers'))
                     except Exception:
                         pass
-                    threshold_km = float(geocode_cfg.get("distance_km", 1.0))
-                    lat_f = float(lat)
-                    lon_f = float(lon)
-                    # If GPS values are in DMS text format (e.g. "14 deg 37' 10.97" N"),
-                    # attempt to parse into decimal degrees.
-                    def _parse_dms(v: str):
-                        # common exiftool DMS formats include: "14 deg 37' 10.97\" N"
-                        try:
-                            s = str(v).strip()
-                            # quick path: if it already looks like a decimal number
-                            if s.replace('.', '').replace('-', '').isdigit():
-                                return float(s)
-                            # split compass direction
-                            dir = None
-                            if s.endswith(('N', 'S', 'E', 'W')):
-                                dir = s[-1]
-                                s = s[:-1].strip()
-                            # replace degree/min/sec words/symbols with separators
-                            for ch in ("deg", "°"):
-                                s = s.replace(ch, ' ')
-                            s = s.replace("\"", ' ').replace("'", ' ')
-                            parts = [p for p in s.split() if p]
-                            if len(parts) >= 3:
-                                deg = float(parts[0])
-                                minu = float(parts[1])
-                                sec = float(parts[2])
-                                val = deg + (minu / 60.0) + (sec / 3600.0)
-                            elif len(parts) == 2:
-                                deg = float(parts[0])
-                                minu = float(parts[1])
-                                val = deg + (minu / 60.0)
-                            else:
-                                val = float(parts[0])
-                            if dir and dir in ('S', 'W'):
-                                val = -abs(val)
-                            return val
-                        except Exception:
-                            # fallback to raising so outer code can handle
-                            raise
-
-                    try:
-                        lat_f = _parse_dms(lat)
-                    except Exception:
-                        lat_f = float(lat)
-                    try:
-                        lon_f = _parse_dms(lon)
-                    except Exception:
-                        lon_f = float(lon)
-                    # bounding box delta in degrees (approx)
-                    # User requested removing the distance threshold: we still need
-                    # a bounding box to limit candidates for performance. Use a
-                    # larger default search radius (100 km) so the nearest place
-                    # will be found even if it's farther than the old threshold.
-                    search_km = float(geocode_cfg.get('search_km', 100.0))
-                    delta_deg = max(0.01, search_km / 111.0)
-                    # No cache: try providers in order directly
-                    # helper: haversine distance
-                    from math import radians, sin, cos, sqrt, atan2
-                    def _haversine_km(lat1, lon1, lat2, lon2):
-                        R = 6371.0
-                        dlat = radians(lat2 - lat1)
-                        dlon = radians(lon2 - lon1)
-                        a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
-                        c = 2 * atan2(sqrt(a), sqrt(1 - a))
-                        return R * c
-
-                    import requests
-                    import time
-
-                    providers = geocode_cfg.get("providers") or ([geocode_cfg.get("provider")] if geocode_cfg.get("provider") else [])
-                    try:
-                        # diagnostic: reveal providers object shape and length
-                        try:
-                            # force evaluation in case providers is a generator-like object
-                            providers_list = list(providers)
-                            print(f"geocode: providers forced list={providers_list!r} type={type(providers_list)} len={len(providers_list)}")
-                        except Exception:
-                            print(f"geocode: providers repr failed, type={type(providers)} repr={repr(providers)}")
-                            providers_list = None
-                    except Exception:
-                        providers_list = None
-                    if not providers_list:
-                        try:
-                            print(f"geocode: providers resolved to empty/falsey, skipping providers loop for file id={f.id}")
-                        except Exception:
-                            pass
-                    # iterate over the forced list when available
-                    iter_providers = providers_list if providers_list is not None else providers
-                    
+                    lat_f = _gps_degrees(lat)
+                    lon_f = _gps_degrees(lon)
+                    # Same lookup as the scan path: cached per rounded position
+                    # (in process and in geocode_cache), providers in order.
                     success = False
                     country = None
                     city = None
-                    for prov in iter_providers:
-                        # print raw provider so we can see the actual value/shape
+                    try:
+                        city, country = self._geocode_position((round(lat_f, GEOCODE_CACHE_DECIMALS),
+                                                                round(lon_f, GEOCODE_CACHE_DECIMALS)))
+                        success = True
+                    except RuntimeError as e:
+                        # unlike a scan, an update leaves city/country as they are
+                        geocode_failed = True
+                        logger.debug("geocode: no provider resolved file id=%s: %s", f.id, e)
+
+                    if success and (country or city):
+                        # log what we are about to set/update for traceability
                         try:
-                            print(f"geocode: provider raw value repr={repr(prov)} type={type(prov)}")
+                            logger.debug("geocode result for file id=%s: country=%r, city=%r", f.id, country, city)
                         except Exception:
                             pass
+                        if country and f.country != country:
+                            logger.debug("updating file id=%s country: %r -> %r", f.id, f.country, country)
+                            f.country = country
+                            changed = True
+                        if city and f.city != city:
+                            logger.debug("updating file id=%s city: %r -> %r", f.id, f.city, city)
+                            f.city = city
+                            changed = True
+                        # Set geocode provenance flag according to where GPS came from
                         try:
-                            prov = str(prov).lower()
-                        except Exception:
-                            # skip invalid provider entries
-                            continue
-                        try:
-                            # provider attempt log
-                            try:
-                                print(f"geocode: trying provider {prov} for file id={f.id}")
-                            except Exception:
-                                pass
-                            if prov == "local_geonames":
-                                # Query a local geonames MySQL database for nearby places
-                                gn_cfg = geocode_cfg.get("local_geonames", {})
-                                host = gn_cfg.get("host")
-                                port = int(gn_cfg.get("port", 3306))
-                                user = gn_cfg.get("user")
-                                password = gn_cfg.get("password")
-                                database = gn_cfg.get("database")
-                                if not (host and user and database):
-                                    try:
-                                        print("geocode: local_geonames config incomplete, skipping")
-                                    except Exception:
-                                        pass
-                                    continue
-                                try:
-                                    import pymysql
-
-                                    conn = pymysql.connect(host=host, port=port, user=user, password=password, database=database, connect_timeout=5)
-                                    cur = conn.cursor()
-                                    # Compute distance in SQL and return the nearest candidates globally
-                                    sql = ("SELECT geonameid, name, country_code, latitude, longitude, "
-                                           "(6371 * 2 * ASIN(SQRT(POWER(SIN(RADIANS(latitude - %s) / 2), 2) "
-                                           "+ COS(RADIANS(%s)) * COS(RADIANS(latitude)) * POWER(SIN(RADIANS(longitude - %s) / 2), 2)))) "
-                                           "AS distance_km "
-                                           "FROM geoname "
-                                           "ORDER BY distance_km ASC "
-                                           "LIMIT 10;")
-                                    try:
-                                        cur.execute(sql, (lat_f, lat_f, lon_f))
-                                        rows_g = cur.fetchall()
-                                        try:
-                                            print(f"geocode: local_geonames returned {len(rows_g)} rows")
-                                        except Exception:
-                                            pass
-                                    except Exception as _e:
-                                        try:
-                                            print(f"geocode: local_geonames SQL error: {_e}")
-                                        except Exception:
-                                            pass
-                                        rows_g = []
-                                    finally:
-                                        try:
-                                            cur.close()
-                                        except Exception:
-                                            pass
-                                        try:
-                                            conn.close()
-                                        except Exception:
-                                            pass
-                                except Exception as e:
-                                    # if local DB unavailable or auth fails, log and try next provider
-                                    try:
-                                        import traceback as _tb
-                                        print(f"geocode: local_geonames connection error: {e}")
-                                        print(_tb.format_exc())
-                                    except Exception:
-                                        pass
-                                    continue
-                                # compute closest candidate via haversine
-                                best = None
-                                best_d = None
-                                for r in rows_g:
-                                    try:
-                                        # r expected: (geonameid, name, country_code, latitude, longitude, distance_km)
-                                        if len(r) == 6:
-                                            _, pname, pcountry, plat, plon, _dist = r
-                                        elif len(r) == 5:
-                                            _, pname, pcountry, plat, plon = r
-                                        else:
-                                            # unexpected row shape
-                                            try:
-                                                print(f"geocode: unexpected row shape: {r}")
-                                            except Exception:
-                                                pass
-                                            continue
-                                        d = _haversine_km(lat_f, lon_f, float(plat), float(plon))
-                                    except Exception:
-                                        # continue to next candidate if conversion fails
-                                        continue
-                                    if best is None or d < best_d:
-                                        best = (pname, pcountry)
-                                        best_d = d
-                                if best is not None and best_d is not None:
-                                    city = best[0]
-                                    country = best[1]
-                                    try:
-                                        print(f"geocode: local_geonames best match city={city!r} country={country!r} dist_km={best_d}")
-                                    except Exception:
-                                        pass
-                                    success = True
-                                    break
-                                else:
-                                    # no local candidates; try next provider
-                                    continue
-
-                            if prov == "geonames":
-                                # Geonames reverse geocoding
-                                gn_cfg = geocode_cfg.get("geonames", {})
-                                username = gn_cfg.get("username")
-                                if not username:
-                                    continue
-                                gn_endpoint = "http://api.geonames.org/findNearbyPlaceNameJSON"
-                                params = {"lat": str(lat), "lng": str(lon), "username": username}
-                                resp = requests.get(gn_endpoint, params=params, timeout=6)
-                                if resp.status_code == 200:
-                                    j = resp.json()
-                                    geonames = j.get("geonames") or []
-                                    if geonames:
-                                        place = geonames[0]
-                                        country = place.get("countryName")
-                                        city = place.get("name")
-                                        success = True
-                                        break
-                            elif prov == "nominatim":
-                                endpoint = geocode_cfg.get("endpoint") or "https://nominatim.openstreetmap.org/reverse"
-                                email = geocode_cfg.get("email") or ""
-                                params = {"format": "jsonv2", "lat": str(lat), "lon": str(lon), "zoom": 10, "addressdetails": 1}
-                                if email:
-                                    params["email"] = email
-                                headers = {"User-Agent": "DupDetector/1.0 (+https://example.invalid)"}
-                                resp = requests.get(endpoint, params=params, headers=headers, timeout=10)
-                                if resp.status_code == 200:
-                                    j = resp.json()
-                                    address = j.get("address") or {}
-                                    country = address.get("country") or address.get("country_name")
-                                    city = address.get("city") or address.get("town") or address.get("village") or address.get("municipality")
-                                    success = True
-                                    break
-                                elif resp.status_code == 429:
-                                    time.sleep(1)
-                                    continue
+                            # If GPS string matches the EXIF-derived gps variable above, treat as EXIF raw GPS
+                            current_gps = f.gps
+                            if current_gps and current_gps == f"{lat},{lon}":
+                                # gps from EXIF + auto city/country
+                                f.geocode_provenance = 1
+                            else:
+                                # gps present but not equal to EXIF-derived -> assume manual GPS
+                                f.geocode_provenance = 3
+                            changed = True
                         except Exception:
-                            # try next provider
-                            continue
-
-                        if success and (country or city):
-                            # log what we are about to set/update for traceability
-                            try:
-                                print(f"geocode result for file id={f.id}: country={country!r}, city={city!r}")
-                            except Exception:
-                                pass
-                            if country and getattr(f, "country", None) != country:
-                                print(f"updating file id={f.id} country: {getattr(f, 'country', None)!r} -> {country!r}")
-                                f.country = country
-                                changed = True
-                            if city and getattr(f, "city", None) != city:
-                                print(f"updating file id={f.id} city: {getattr(f, 'city', None)!r} -> {city!r}")
-                                f.city = city
-                                changed = True
-                            # Set geocode provenance flag according to where GPS came from
-                            try:
-                                # If GPS string matches the EXIF-derived gps variable above, treat as EXIF raw GPS
-                                current_gps = getattr(f, 'gps', None)
-                                if current_gps and current_gps == f"{lat},{lon}":
-                                    # gps from EXIF + auto city/country
-                                    f.geocode_provenance = 1
-                                else:
-                                    # gps present but not equal to EXIF-derived -> assume manual GPS
-                                    f.geocode_provenance = 3
-                                changed = True
-                            except Exception:
-                                pass
-        except Exception:
-            pass
+                            pass
+        except Exception as e:
+            # e.g. unparsable GPS values or a failed geocode_cache lookup:
+            # leave the dump unapplied so the next run tries again
+            geocode_failed = True
+            logger.debug("geocode: failed for file id=%s: %s", f.id, e)
 
         # media_type: prefer MIMEType then FileType
         mt = data.get("MIMEType") or data.get("FileType") or data.get("FileTypeExtension")
-        if mt and getattr(f, "media_type", None) != mt:
+        if mt and f.media_type != mt:
             f.media_type = str(mt)
             changed = True
 
         # metadata_json: store the parsed exif object as a JSON string
         # NOTE: keep full exif JSON in the exif_data table (saved by save_exif).
 
-        if changed:
-            try:
-                self.session.commit()
-                self.session.refresh(f)
-                # After commit, print final gps/country/city for traceability
-                try:
-                    final_gps = getattr(f, "gps", None)
-                    final_country = getattr(f, "country", None)
-                    final_city = getattr(f, "city", None)
-                    print(f"final geocode for file id={f.id}: gps={final_gps!r}, country={final_country!r}, city={final_city!r}")
-                except Exception:
-                    pass
-            except Exception:
-                self.session.rollback()
-                raise
+        # (not when geocoding failed, so the next run retries the providers)
+        if not geocode_failed and f.exif_applied_hash != digest:
+            f.exif_applied_hash = digest
+            changed = True
 
         # After saving identifiers, attempt to link related files by identifier.
         # Prefer content_identifier grouping; fall back to photo_identifier.
+        # Linking is best-effort: it runs in a savepoint so a failure there
+        # does not discard the field updates, which share the commit below.
+        linked = False
         try:
-            gid = None
-            if f.content_identifier:
-                gid = f.content_identifier
-                # find all files with same content_identifier
-                rows = self.session.query(File.id).filter(File.content_identifier == gid).all()
-                ids = [r[0] for r in rows]
-            elif f.photo_identifier:
-                gid = f.photo_identifier
-                rows = self.session.query(File.id).filter(File.photo_identifier == gid).all()
-                ids = [r[0] for r in rows]
-            else:
-                ids = []
-
-            if ids:
-                canonical = min(ids)
-                # update related_id for all files with this identifier that are not the canonical
-                (self.session.query(File)
-                    .filter(File.id.in_(ids))
-                    .filter(File.id != canonical)
-                    .update({"related_id": canonical, "updated_at": sa_func.current_timestamp()}, synchronize_session=False))
-                # Ensure canonical row has related_id=None (or itself?) — keep as None to indicate canonical
-                (self.session.query(File)
-                    .filter_by(id=canonical)
-                    .update({"related_id": None, "updated_at": sa_func.current_timestamp()}, synchronize_session=False))
-                self.session.commit()
-        except Exception:
-            # On any failure during linking, rollback but do not raise — linking is best-effort
+            with self.session.begin_nested():
+                if f.content_identifier:
+                    group = File.content_identifier == f.content_identifier
+                elif f.photo_identifier:
+                    group = File.photo_identifier == f.photo_identifier
+                else:
+                    group = None
+
+                canonical = self.session.query(sa_func.min(File.id)).filter(group).scalar() if group is not None else None
+                if canonical is not None:
+                    # One UPDATE for the whole group: members point at the canonical
+                    # (lowest id) row, which itself keeps related_id=None. Rows that
+                    # are already linked that way are left alone.
+                    stale = or_(
+                        and_(File.id == canonical, File.related_id.isnot(None)),
+                        and_(File.id != canonical, or_(File.related_id.is_(None), File.related_id != canonical)),
+                    )
+                    result = self.session.execute(
+                        update(File)
+                        .where(group, stale)
+                        .values(related_id=case((File.id == canonical, None), else_=canonical),
+                                updated_at=sa_func.current_timestamp())
+                        .execution_options(synchronize_session=False)
+                    )
+                    linked = bool(result.rowcount)
+        except Exception as e:
+            logger.debug("linking related files failed for file id=%s: %s", f.id, e)
+
+        # One commit for the field updates and the related-id links
+        if changed or linked:
             try:
-                self.session.rollback()
+                self.session.commit()
             except Exception:
-                pass
+                self.session.rollback()
+                raise
+            logger.debug("final geocode for file id=%s: gps=%r, country=%r, city=%r", f.id, f.gps, f.country, f.city)
 
         return f
@@ -1,15 +1,13 @@
 from types import SimpleNamespace
-from dupdetector.lib.database import get_engine, get_sessionmaker, init_db
+from dupdetector.lib.database import InMemoryAdapter
 from dupdetector.services.repository import Repository
 from dupdetector.lib.hashing import md5_file
 from dupdetector.cli import duplicates
 
 
 def make_session():
-    engine = get_engine("sqlite:///:memory:")
-    init_db(engine)
-    Session = get_sessionmaker(engine)
-    return Session()
+    # a fresh database per test, copied from the prebuilt schema
+    return InMemoryAdapter().session()
 
 
 def test_cli_duplicates_prints_clusters(tmp_path, capsys):
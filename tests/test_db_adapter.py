@@ -10,3 +10,76 @@ def test_inmemory_adapter_basic():
     session.commit()
     q = session.query(File).filter_by(md5_hash="abc123").one()
     assert q.path == "/tmp/a.jpg"
+
+
+def test_get_engine_caches_file_engines_but_not_memory(tmp_path):
+    from dupdetector.lib.database import get_engine
+
+    url = f"sqlite:///{tmp_path / 'db.sqlite'}"
+    assert get_engine(url) is get_engine(url)
+    assert get_engine("sqlite:///:memory:") is not get_engine("sqlite:///:memory:")
+    # no connection pre-ping for local databases unless asked for
+    assert get_engine(url).pool._pre_ping is False
+    assert get_engine(url, pool_pre_ping=True).pool._pre_ping is True
+
+
+def test_get_engine_keeps_an_explicit_zero_pool_size(monkeypatch):
+    from dupdetector.lib import database
+
+    monkeypatch.setattr(database, "_build_engine_cached", lambda *args: args)
+    url = "postgresql://u@h/db"
+    assert database.get_engine(url, pool_size=0)[1:3] == (0, 0)
+    assert database.get_engine(url)[1] == database.DEFAULT_POOL_SIZE
+
+
+def test_sqlite_wal_is_opt_in(tmp_path):
+    from sqlalchemy import text
+
+    from dupdetector.lib.database import get_engine
+
+    with get_engine(f"sqlite:///{tmp_path / 'plain.sqlite'}").connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "delete"
+    with get_engine(f"sqlite:///{tmp_path / 'wal.sqlite'}", sqlite_wal=True).connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+
+
+def test_init_db_adds_missing_columns(tmp_path, monkeypatch):
+    from sqlalchemy import create_engine, inspect, text
+
+    from dupdetector.lib.database import init_db
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.sqlite'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE files (id INTEGER PRIMARY KEY, path VARCHAR(1024))"))
+    init_db(engine)
+    cols = {c["name"] for c in inspect(engine).get_columns("files")}
+    assert {"md5_hash", "photo_hash", "size"} <= cols
+
+    # unchanged models: the second start skips the inspection pass entirely
+    import sqlalchemy
+
+    calls = []
+    real_inspect = sqlalchemy.inspect
+    monkeypatch.setattr(sqlalchemy, "inspect", lambda *a: calls.append(a) or real_inspect(*a))
+    init_db(engine)
+    assert calls == []
+
+
+def test_init_db_adds_missing_indexes(tmp_path):
+    from sqlalchemy import create_engine, inspect, text
+
+    from dupdetector.lib.database import init_db
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.sqlite'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE application_locks (id INTEGER PRIMARY KEY, lock_name VARCHAR(255) NOT NULL UNIQUE, "
+            "process_id INTEGER NOT NULL, hostname VARCHAR(255) NOT NULL, "
+            "acquired_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL, expires_at DATETIME)"
+        ))
+    init_db(engine)
+    names = {ix["name"] for ix in inspect(engine).get_indexes("application_locks")}
+    assert "ix_application_locks_expires_at" in names
+    file_indexes = {ix["name"] for ix in inspect(engine).get_indexes("files")}
+    assert {"ix_files_md5_hash", "ix_files_photo_hash"} <= file_indexes
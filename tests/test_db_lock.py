@@ -0,0 +1,67 @@
+import pytest
+
+from dupdetector.lib.database import InMemoryAdapter
+from dupdetector.lib.db_lock import DatabaseLock, LockAcquisitionError, acquire_lock, check_lock_exists
+
+
+def test_lock_excludes_second_holder_until_released():
+    adapter = InMemoryAdapter()
+    session = adapter.session()
+
+    with acquire_lock(session, "scan"):
+        assert check_lock_exists(session, "scan") is not None
+        with pytest.raises(LockAcquisitionError):
+            DatabaseLock(adapter.session(), "scan").acquire()
+        with pytest.raises(LockAcquisitionError):
+            DatabaseLock(adapter.session(), "scan", wait_for_lock=True, wait_timeout=0.3).acquire()
+
+    assert check_lock_exists(session, "scan") is None
+    with acquire_lock(adapter.session(), "scan"):
+        pass
+
+
+def test_cleanup_expired_locks_deletes_only_expired():
+    from datetime import datetime, timedelta
+
+    from dupdetector.lib.db_lock import cleanup_expired_locks
+    from dupdetector.models.application_lock import ApplicationLock
+
+    session = InMemoryAdapter().session()
+    past = datetime.now() - timedelta(days=2)
+    session.add_all([
+        ApplicationLock(lock_name="a", process_id=1, hostname="h", expires_at=past),
+        ApplicationLock(lock_name="b", process_id=1, hostname="h", expires_at=past),
+        ApplicationLock(lock_name="c", process_id=1, hostname="h", expires_at=datetime.now() + timedelta(days=2)),
+    ])
+    session.commit()
+
+    assert cleanup_expired_locks(session) == 2
+    assert [lock.lock_name for lock in session.query(ApplicationLock).all()] == ["c"]
+
+
+def test_expired_lock_is_taken_over():
+    from datetime import datetime, timedelta
+
+    from dupdetector.models.application_lock import ApplicationLock
+
+    session = InMemoryAdapter().session()
+    session.add(ApplicationLock(lock_name="scan", process_id=1, hostname="h",
+                                expires_at=datetime.now() - timedelta(days=2)))
+    session.commit()
+
+    assert check_lock_exists(session, "scan") is None
+    with acquire_lock(session, "scan"):
+        assert check_lock_exists(session, "scan").process_id != 1
+
+
+def test_dry_run_checker_sees_lock_taken_later():
+    from dupdetector.lib.db_lock import DryRunLockChecker
+
+    adapter = InMemoryAdapter()
+    checker = DryRunLockChecker(adapter.session(), "scan", check_interval=0)
+    checker.check_at_start()
+    checker.periodic_check()
+
+    with acquire_lock(adapter.session(), "scan"):
+        with pytest.raises(LockAcquisitionError):
+            checker.periodic_check()
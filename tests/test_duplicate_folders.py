@@ -0,0 +1,38 @@
+import pytest
+
+from dupdetector.lib import duplicate_folders as df
+
+
+def test_get_duplicate_folder_for_file_uses_resolved_map(monkeypatch):
+    # Path.resolve() of a Windows path is meaningless on POSIX; fake it
+    def fake_resolve(folder):
+        return df.Path(folder), df.get_drive_letter(folder)
+
+    monkeypatch.setattr(df, "_resolve_duplicate_folder", fake_resolve)
+    resolved = df.resolve_duplicate_folders({"z:\\": "Z:\\dups"}, legacy_duplicate_folder="C:\\old")
+
+    assert set(resolved) == {"Z:", "C:"}
+    assert df.get_duplicate_folder_for_file_resolved("Z:\\photos\\a.jpg", resolved) == df.Path("Z:\\dups")
+    with pytest.raises(ValueError):
+        df.get_duplicate_folder_for_file_resolved("D:\\photos\\a.jpg", resolved)
+
+    # the config-form signature still works
+    assert df.get_duplicate_folder_for_file("Z:\\photos\\a.jpg", {"Z:\\": "Z:\\dups"}) == df.Path("Z:\\dups")
+    assert df.get_duplicate_folder_for_file("C:\\a.jpg", {}, legacy_duplicate_folder="C:\\old") == df.Path("C:\\old")
+    # resolving the whole configuration checks every entry...
+    with pytest.raises(ValueError):
+        df.resolve_duplicate_folders({"Z:\\": "C:\\dups"})
+    # ... while the config form only checks the entry for the file's drive
+    mismatched = {"D:\\": "Z:\\dups", "Z:\\": "Z:\\dups"}
+    assert df.get_duplicate_folder_for_file("Z:\\photos\\a.jpg", mismatched) == df.Path("Z:\\dups")
+    with pytest.raises(ValueError, match="Cross-drive"):
+        df.get_duplicate_folder_for_file("D:\\photos\\a.jpg", mismatched)
+
+
+def test_validate_media_folder_coverage():
+    errors = df.validate_duplicate_folders_config(
+        {"z:\\": "Z:\\dups", "C:": "C:\\dups"},
+        ["Z:\\photos", "C:\\Users\\Public\\Pictures", "D:\\videos"],
+    )
+    missing = [e for e in errors if e.startswith("No duplicate folder configured")]
+    assert missing == ["No duplicate folder configured for media folder drive D:: D:\\videos"]
@@ -0,0 +1,28 @@
+import struct
+
+import magic
+
+from dupdetector.lib.filetype import sniff_media_type
+
+
+def _ftyp(brand: bytes) -> bytes:
+    body = b"ftyp" + brand + b"\x00\x00\x00\x00" + brand
+    return struct.pack(">I", len(body) + 4) + body + b"\x00" * 64
+
+
+def test_sniffer_agrees_with_libmagic():
+    headers = [
+        b"\xff\xd8\xff\xe1\x00\x10Exif\x00\x00" + b"\x00" * 100,
+        b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR" + b"\x00" * 100,
+        b"GIF89a" + b"\x00" * 100,
+        b"RIFF\x00\x00\x00\x00WEBPVP8 " + b"\x00" * 100,
+        _ftyp(b"isom"),
+        _ftyp(b"qt  "),
+        _ftyp(b"heic"),
+    ]
+    mime = magic.Magic(mime=True)
+    for header in headers:
+        assert sniff_media_type(header) == mime.from_buffer(header)
+
+    # unknown headers are left to libmagic
+    assert sniff_media_type(b"II*\x00" + b"\x00" * 12) is None
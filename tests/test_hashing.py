@@ -0,0 +1,91 @@
+import hashlib
+
+import pytest
+
+from dupdetector.lib import hashing
+from dupdetector.lib.filetype import detect_media_type
+from dupdetector.lib.hashing import compute_all, get_hash_constructor, hash_and_probe, hash_file, md5_file, md5_files, phash_stub
+
+
+def test_compute_all_matches_separate_passes(tmp_path):
+    f = tmp_path / "a.bin"
+    f.write_bytes(b"some bytes" * 1000)
+
+    md5, ph = compute_all(str(f))
+    assert md5 == md5_file(str(f))
+    assert ph == phash_stub(str(f))
+
+
+def test_compute_all_honours_hash_algo(tmp_path):
+    p = tmp_path / "data.bin"
+    p.write_bytes(b"some bytes" * 100)
+
+    assert compute_all(str(p), algo="md5")[0] == hashlib.md5(p.read_bytes()).hexdigest()
+    assert compute_all(str(p), algo="sha256")[0] == hashlib.sha256(p.read_bytes()).hexdigest()
+    for algo in ("blake3", "xxh64", "xxh3_128"):
+        try:
+            get_hash_constructor(algo)
+        except ImportError:
+            continue
+        assert compute_all(str(p), algo=algo)[0] == hash_file(str(p), algo)
+    with pytest.raises(ValueError):
+        get_hash_constructor("crc32")
+
+
+def test_compute_all_empty_file(tmp_path):
+    f = tmp_path / "empty.bin"
+    f.write_bytes(b"")
+    assert compute_all(str(f)) == (hashlib.md5(b"").hexdigest(), None)
+
+
+def test_hash_and_probe_returns_header(tmp_path, monkeypatch):
+    png = b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x08\x00\x00\x00\x08\x08\x00\x00\x00\x00"
+    f = tmp_path / "img.dat"
+    f.write_bytes(png + b"\x00" * 20000)
+
+    md5, _, header = hash_and_probe(str(f), probe_len=4096)
+    assert md5 == md5_file(str(f))
+    assert header == f.read_bytes()[:4096]
+    assert detect_media_type(header) == detect_media_type(str(f))
+
+    # streaming path for files above the fused-read limit
+    monkeypatch.setattr(hashing, "FUSED_READ_LIMIT", 10)
+    assert hash_and_probe(str(f), probe_len=4096)[::2] == (md5, header)
+
+
+def test_md5_files_hashes_in_parallel(tmp_path):
+    paths = []
+    for i in range(5):
+        p = tmp_path / f"f{i}.bin"
+        p.write_bytes(bytes([i]) * (1000 * i))
+        paths.append(str(p))
+    missing = str(tmp_path / "missing.bin")
+
+    result = md5_files(paths + [missing], workers=3)
+    assert result == {**{p: md5_file(p) for p in paths}, missing: None}
+
+
+def test_phash_dct_is_stable_under_recompression(tmp_path):
+    import math
+
+    pytest.importorskip("numpy")
+    Image = pytest.importorskip("PIL.Image")
+    from dupdetector.lib.hashing import hamming_distance, phash_dct
+
+    def save(name, fn, **kw):
+        img = Image.new("L", (256, 192))
+        img.putdata([int(fn(x, y)) for y in range(192) for x in range(256)])
+        if name.endswith(".jpg"):
+            img = img.resize((200, 150))
+        img.save(tmp_path / name, **kw)
+        return phash_dct(str(tmp_path / name))
+
+    scene = lambda x, y: 127 + 60 * math.sin(x / 23) + 60 * math.cos(y / 17 + x / 51)  # noqa: E731
+    other = lambda x, y: 127 + 60 * math.cos(x / 13) + 60 * math.sin(y / 29)  # noqa: E731
+    original = save("a.png", scene)
+    recompressed = save("b.jpg", scene, quality=40)
+    different = save("c.png", other)
+
+    assert hamming_distance(original, recompressed) <= 2
+    assert hamming_distance(original, different) > 10
+    assert phash_dct(str(tmp_path / "missing.png")) is None
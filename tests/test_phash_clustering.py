@@ -20,3 +20,64 @@ def test_cluster_by_hamming():
     # expect first cluster [1,2] and second [3]
     assert any(set(c) == {1, 2} for c in clusters)
     assert any(set(c) == {3} for c in clusters)
+
+
+def test_cluster_by_hamming_numpy_matches_pure_python():
+    import random
+
+    import pytest
+
+    np = pytest.importorskip("numpy")
+    from dupdetector.lib import hashing
+
+    rng = random.Random(0)
+    base = [rng.getrandbits(64) for _ in range(40)]
+    items = []
+    for i in range(400):
+        # near-copies of a few base hashes so clusters actually form
+        v = base[i % len(base)] ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64))
+        items.append((i, format(v, "x")))
+    items.append((999, "not-hex"))
+
+    fast = hashing._cluster_by_hamming_numpy(np, items, 4, 64)
+    saved = hashing.NUMPY_CLUSTER_MIN_ITEMS
+    hashing.NUMPY_CLUSTER_MIN_ITEMS = len(items) + 1
+    try:
+        slow = hashing.cluster_by_hamming(items, threshold=4)
+    finally:
+        hashing.NUMPY_CLUSTER_MIN_ITEMS = saved
+    assert fast == slow
+
+
+def test_cluster_by_hamming_index_matches_pure_python():
+    import random
+
+    from dupdetector.lib import hashing
+    from dupdetector.lib.phash_index import PhashIndex
+
+    rng = random.Random(1)
+    base = [rng.getrandbits(64) for _ in range(30)]
+    items = [(i, format(base[i % len(base)] ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64)), "x"))
+             for i in range(300)]
+    items += [(i, format(rng.getrandbits(64), "x")) for i in range(300, 400)]
+    items.append((999, "not-hex"))
+
+    fast = hashing._cluster_by_hamming_indexed(items, 4, 64)
+    saved = hashing.NUMPY_CLUSTER_MIN_ITEMS, hashing.PHASH_INDEX_MIN_ITEMS
+    hashing.NUMPY_CLUSTER_MIN_ITEMS = hashing.PHASH_INDEX_MIN_ITEMS = len(items) + 1
+    try:
+        slow = hashing.cluster_by_hamming(items, threshold=4)
+    finally:
+        hashing.NUMPY_CLUSTER_MIN_ITEMS, hashing.PHASH_INDEX_MIN_ITEMS = saved
+    assert fast == slow
+
+    values = [int(ph, 16) for _, ph in items[:-1]] + [None]
+    index = PhashIndex(values, 4)
+    assert index.within(values[0]) == [j for j, v in enumerate(values)
+                                       if v is not None and (v ^ values[0]).bit_count() <= 4]
+
+
+def test_cluster_by_hamming_groups_transitively():
+    # 1~2 and 2~3 within 3 bits, but 1 and 3 are 6 bits apart
+    items = [(1, "0"), (2, "7"), (4, "ff00"), (3, "3f")]
+    assert cluster_by_hamming(items, threshold=3) == [[1, 2, 3], [4]]
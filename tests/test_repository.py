@@ -1,15 +1,36 @@
+import pytest
 import tempfile
-from dupdetector.lib.database import get_engine, get_sessionmaker, init_db
+from dupdetector.lib.database import InMemoryAdapter
 from dupdetector.services.repository import Repository
 from dupdetector.lib.hashing import md5_file
 from dupdetector.models.file import File
 
 
 def make_session():
-    engine = get_engine("sqlite:///:memory:")
-    init_db(engine)
-    Session = get_sessionmaker(engine)
-    return Session()
+    # a fresh database per test, copied from the prebuilt schema
+    return InMemoryAdapter().session()
+
+
+def _file_record(name, **overrides):
+    """`create_file` kwargs for a file called `name` under /p."""
+    rec = {"path": f"/p/{name}", "original_path": f"/p/{name}", "name": name, "original_name": name,
+           "size": 1, "md5_hash": f"m-{name}"}
+    rec.update(overrides)
+    return rec
+
+
+GEOCODE_CFG = {"enabled": True, "providers": ["local_geonames"], "local_geonames": {"host": "h", "user": "u", "database": "d"}}
+
+
+@pytest.fixture
+def geocode_enabled(monkeypatch):
+    """Enable local geonames geocoding with an empty process-wide cache."""
+    from dupdetector.services import repository as repo_mod
+
+    monkeypatch.setattr(repo_mod, "_get_geocode_cfg_cached", lambda: GEOCODE_CFG)
+    repo_mod._geocode_cache.clear()
+    yield repo_mod
+    repo_mod._geocode_cache.clear()
 
 
 def test_repository_crud_and_duplicate_detection(tmp_path):
@@ -87,3 +108,358 @@ def test_duplicate_detection_md5():
     assert not a.is_duplicate
     assert b.is_duplicate
     assert b.duplicate_of_id == a.id
+
+
+@pytest.mark.parametrize("executemany_returning", [True, False])
+def test_bulk_create_files_marks_duplicates_and_handles_rescans(monkeypatch, executemany_returning):
+    session = make_session()
+    # False: the add_all/flush path used on dialects without ordered RETURNING (MySQL)
+    monkeypatch.setattr(session.get_bind().dialect, "insert_executemany_returning_sort_by_parameter_order",
+                        executemany_returning)
+    repo = Repository(session)
+
+    existing = repo.create_file(**_file_record("old.jpg"))
+
+    created = repo.bulk_create_files([
+        _file_record("a.jpg", raw_exif='[{"SourceFile": "/p/a.jpg"}]'),
+        _file_record("b.jpg", md5_hash="m-a.jpg"),      # duplicate of a row from the same batch
+        _file_record("c.jpg", md5_hash="m-old.jpg"),    # duplicate of a pre-existing row
+        _file_record("d.jpg", photo_hash="ff"),
+        _file_record("e.jpg", photo_hash="ff"),         # photo_hash duplicate of d
+    ])
+    a, b, c, d, e = created
+    assert not a.is_duplicate
+    assert b.is_duplicate and b.duplicate_of_id == a.id
+    assert c.is_duplicate and c.duplicate_of_id == existing.id
+    assert e.is_duplicate and e.duplicate_of_id == d.id
+    assert repo.get_exif_by_file_id(a.id) == '[{"SourceFile": "/p/a.jpg"}]'
+
+    # re-scanning a known path returns the existing row instead of failing
+    again = repo.bulk_create_files([_file_record("a.jpg"), _file_record("f.jpg")])
+    assert again[0].id == a.id
+    assert again[1].id not in {f.id for f in created}
+    assert len(repo.list_files()) == 7
+    assert [f.id for f in repo.iter_files(batch_size=2)] == [f.id for f in repo.list_files()]
+
+
+def test_phash_search_uses_integer_column_and_legacy_hex():
+    session = make_session()
+    repo = Repository(session)
+
+    top_bit = "8000000000000000"
+    a, b, c = repo.bulk_create_files([_file_record("a.jpg", photo_hash=top_bit),
+                                      _file_record("b.jpg", photo_hash="8000000000000003"),
+                                      _file_record("c.jpg", photo_hash="00ff")])
+    assert a.photo_hash_int == -(1 << 63)
+    # a row written before photo_hash_int existed
+    legacy = repo.create_file(**_file_record("d.jpg", photo_hash="8000000000000001"))
+    session.query(File).filter_by(id=legacy.id).update({"photo_hash_int": None})
+    session.commit()
+
+    assert [f.id for f in repo.find_similar_by_phash(top_bit, max_distance=2)] == [a.id, b.id, legacy.id]
+    assert sorted(map(sorted, repo.cluster_similar_photos(threshold=2))) == [[a.id, b.id, legacy.id], [c.id]]
+
+
+def test_create_file_prefers_md5_match_over_photo_hash_match():
+    session = make_session()
+    repo = Repository(session)
+
+    a = repo.create_file(**_file_record("a.jpg", photo_hash="aaaa"))
+    b = repo.create_file(**_file_record("b.jpg", photo_hash="bbbb"))
+    c = repo.create_file(**_file_record("c.jpg", md5_hash="m-b.jpg", photo_hash="aaaa"))
+    d = repo.create_file(**_file_record("d.jpg", photo_hash="aaaa"))
+    e = repo.create_file(**_file_record("e.jpg"))
+    assert (c.duplicate_of_id, d.duplicate_of_id) == (b.id, a.id)
+    assert not e.is_duplicate and e.duplicate_of_id is None
+
+
+def test_cluster_similar_photos_partitioned_by_size_and_type():
+    session = make_session()
+    repo = Repository(session)
+
+    mib = 1 << 20
+    a, b, c, d = repo.bulk_create_files([
+        _file_record("a.jpg", size=3 * mib + 10, media_type="image/jpeg", photo_hash="f0"),
+        _file_record("thumb.jpg", size=20_000, media_type="image/jpeg", photo_hash="f1"),
+        _file_record("b.jpg", size=3 * mib + 99, media_type="image/jpeg", photo_hash="f3"),
+        _file_record("a.png", size=3 * mib + 50, media_type="image/png", photo_hash="f0"),
+    ])
+    assert repo.cluster_similar_photos(threshold=2) == [[a.id, b.id, c.id, d.id]]
+    assert repo.cluster_similar_photos(threshold=2, partition=True) == [[a.id, c.id], [b.id], [d.id]]
+
+
+def test_find_predecessor_for_ranks_heuristics():
+    session = make_session()
+    repo = Repository(session)
+
+    by_content = repo.create_file(**_file_record("a.heic", content_identifier="C1"))
+    repo.create_file(**_file_record("b.heic", photo_identifier="P1"))
+    new = File(path="/p/b.heic", md5_hash="m-new", content_identifier="C1", photo_identifier="P1")
+    # content_identifier wins over photo_identifier and same-path matches
+    assert repo.find_predecessor_for(new) == by_content.id
+
+    by_photo = repo.create_file(**_file_record("c.heic", photo_identifier="P1"))
+    new = File(path="/p/b.heic", md5_hash="m-new", photo_identifier="P1")
+    assert repo.find_predecessor_for(new) == by_photo.id
+    assert repo.find_predecessor_for(File(path="/p/b.heic", md5_hash="m-new")) is not None
+    assert repo.find_predecessor_for(File(path="/p/b.heic", md5_hash="m-b.heic")) is None
+    assert repo.find_predecessor_for(File()) is None
+
+
+def test_find_similar_by_phash_index_tracks_writes():
+    session = make_session()
+    repo = Repository(session)
+
+    a, _ = repo.bulk_create_files([_file_record("a.jpg", photo_hash="ffff0000ffff0000"),
+                                   _file_record("b.jpg", photo_hash="0123456789abcdef")])
+    assert [f.id for f in repo.find_similar_by_phash("ffff0000ffff0001", 2)] == [a.id]
+    index = repo._phash_index
+
+    c = repo.create_file(**_file_record("c.jpg", photo_hash="ffff0000ffff0003"))
+    (d,) = repo.bulk_create_files([_file_record("d.jpg", photo_hash="ffff0000ffff0007")])
+    assert [f.id for f in repo.find_similar_by_phash("ffff0000ffff0001", 2)] == [a.id, c.id, d.id]
+    assert repo._phash_index is index  # updated in place, not rebuilt
+    # wider than the cached radius: rebuilt, and the linear scan for huge distances
+    assert len(repo.find_similar_by_phash("ffff0000ffff0001", 7)) == 3
+    assert len(repo.find_similar_by_phash("ffff0000ffff0001", 64)) == 4
+    assert repo.find_similar_by_phash("not-hex", 5) == []
+
+    repo.delete_file(c.id)
+    assert [f.id for f in repo.find_similar_by_phash("ffff0000ffff0001", 2)] == [a.id, d.id]
+
+
+def test_reverse_geocode_is_cached_per_rounded_position(monkeypatch, geocode_enabled):
+    repo_mod = geocode_enabled
+    calls = []
+
+    def fake_lookup(gn, lat, lon, search_km):
+        calls.append((lat, lon))
+        return ("Paris", "FR") if lat > 0 else None
+
+    monkeypatch.setattr(repo_mod, "_geocode_local_geonames", fake_lookup)
+
+    session = make_session()
+    repo = Repository(session)
+
+    def make(name, lat, lon):
+        exif = {"GPSLatitude": lat, "GPSLongitude": lon}
+        return repo.create_file(**_file_record(name, raw_exif="[]", parsed_exif=exif))
+
+    a = make("a.jpg", "48.856610", "2.352220")
+    b = make("b.jpg", "48.856612", "2.352221")
+    assert (a.city, a.country, b.city, b.country) == ("Paris", "FR", "Paris", "FR")
+    assert calls == [(48.8566, 2.3522)]
+    # failures are not cached: the next file at that position retries
+    with pytest.raises(RuntimeError):
+        repo._apply_parsed_exif_to_file(File(), {"GPSLatitude": "-1", "GPSLongitude": "1"})
+    with pytest.raises(RuntimeError):
+        repo._apply_parsed_exif_to_file(File(), {"GPSLatitude": "-1", "GPSLongitude": "1"})
+    assert len(calls) == 3
+
+
+def test_geonames_search_box_widens_longitude_with_latitude():
+    from dupdetector.services.repository import _geonames_box
+
+    lat_min, lat_max, lon_min, lon_max = _geonames_box(0.0, 10.0, 111.0)
+    assert (round(lat_min, 6), round(lat_max, 6), round(lon_min, 6), round(lon_max, 6)) == (-1.0, 1.0, 9.0, 11.0)
+    lat_min, lat_max, lon_min, lon_max = _geonames_box(60.0, 10.0, 111.0)
+    assert round(lat_max - lat_min, 6) == 2.0
+    assert round(lon_max - lon_min, 6) == 4.0  # cos(60 deg) = 0.5
+
+
+def test_exif_value_parsers():
+    from datetime import datetime
+    from dupdetector.services.repository import _exif_object, _parse_dms, _parse_exif_date, _pick_tag
+
+    assert _parse_dms("14 deg 30' 0.00\" S") == -14.5
+    assert _parse_dms(121.25) == 121.25
+    assert _parse_dms("-33.5") == -33.5
+    assert abs(_parse_dms("121°15'36\" E") - 121.26) < 1e-9
+    assert _parse_exif_date("2021:05:06 07:08:09") == datetime(2021, 5, 6, 7, 8, 9)
+    assert _parse_exif_date("2021-05-06T07:08:09") == datetime(2021, 5, 6, 7, 8, 9)
+    assert _parse_exif_date("2021:05:06 07:08:09.25") == datetime(2021, 5, 6, 7, 8, 9, 250000)
+    assert _parse_exif_date("0000:00:00 00:00:00") is None
+    assert _parse_exif_date("not a date") is None
+    assert _parse_exif_date(None) is None
+    assert _pick_tag({"A": "", "B": "x"}, ["A", "B"]) == "x"
+    assert _exif_object([{"Make": "Canon"}]) == {"Make": "Canon"}
+    assert _exif_object({"Make": "Canon"}) == {"Make": "Canon"}
+    assert _exif_object([]) is None
+    assert _exif_object(["x"]) is None
+
+
+def test_create_file_does_not_reselect_the_new_row():
+    from sqlalchemy import event
+
+    session = make_session()
+    repo = Repository(session)
+    statements = []
+    event.listen(session.get_bind(), "before_cursor_execute",
+                 lambda conn, cursor, stmt, params, ctx, many: statements.append(stmt))
+
+    f = repo.create_file(**_file_record("a.jpg"))
+
+    assert sum(s.lstrip().upper().startswith("INSERT") for s in statements) == 1
+    assert not any(s.lstrip().upper().startswith("SELECT") and "WHERE files.id =" in s for s in statements)
+    assert f.id is not None and f.created_at is not None and f.is_duplicate is False
+
+
+def test_create_file_with_existing_path_returns_that_row():
+    session = make_session()
+    repo = Repository(session)
+    first = repo.create_file(**_file_record("a.jpg", md5_hash="m1"))
+
+    again = repo.create_file(**_file_record("a.jpg", md5_hash="m2"))
+
+    assert again.id == first.id
+    assert again.is_duplicate is True
+    assert session.query(File).count() == 1
+
+
+def test_bulk_create_files_geocodes_the_batch_in_one_lookup(monkeypatch, geocode_enabled):
+    repo_mod = geocode_enabled
+    bulk_calls, single_calls = [], []
+
+    def fake_bulk(gn, positions, search_km):
+        bulk_calls.append(list(positions))
+        return {p: ("Paris", "FR") for p in positions if p[0] > 40}
+
+    def fake_single(gn, lat, lon, search_km):
+        single_calls.append((lat, lon))
+        return ("Remote", "XX")
+
+    monkeypatch.setattr(repo_mod, "_geocode_local_geonames_bulk", fake_bulk)
+    monkeypatch.setattr(repo_mod, "_geocode_local_geonames", fake_single)
+
+    def rec(name, lat, lon):
+        return _file_record(name, raw_exif="[]", parsed_exif={"GPSLatitude": lat, "GPSLongitude": lon})
+
+    repo = Repository(make_session())
+    a, b, c = repo.bulk_create_files([rec("a.jpg", "48.85661", "2.35222"), rec("b.jpg", "48.85661", "2.35222"),
+                                      rec("c.jpg", "10.5", "20.5")])
+
+    assert bulk_calls == [[(48.8566, 2.3522), (10.5, 20.5)]]
+    assert (a.city, b.city, c.city) == ("Paris", "Paris", "Remote")
+    # only the position the batch query could not place went through the per-file path
+    assert single_calls == [(10.5, 20.5)]
+
+
+def test_reverse_geocode_results_persist_across_scans(monkeypatch, geocode_enabled):
+    from dupdetector.models.geocode_cache import GeocodeCache
+
+    repo_mod = geocode_enabled
+    calls = []
+
+    def fake_lookup(gn, lat, lon, search_km):
+        calls.append((lat, lon))
+        return ("Paris", "FR")
+
+    monkeypatch.setattr(repo_mod, "_geocode_local_geonames", fake_lookup)
+
+    session = make_session()
+    repo = Repository(session)
+    exif = {"GPSLatitude": "48.85661", "GPSLongitude": "2.35222"}
+    repo.create_file(**_file_record("a.jpg", raw_exif="[]", parsed_exif=exif))
+    assert calls == [(48.8566, 2.3522)]
+    assert [(r.lat_q, r.lon_q, r.city) for r in session.query(GeocodeCache)] == [(488566, 23522, "Paris")]
+
+    # a new process (empty in-memory cache) finds the stored result
+    repo_mod._geocode_cache.clear()
+    b = Repository(session).create_file(**_file_record("b.jpg", raw_exif="[]", parsed_exif=exif))
+    assert (b.city, b.country) == ("Paris", "FR")
+    assert len(calls) == 1
+
+
+def test_phash_within_sql_compiles_to_bit_count_for_mysql():
+    from sqlalchemy.dialects import mysql
+    from dupdetector.services.repository import _phash_within_sql
+
+    sql = str(_phash_within_sql(-5, 20).compile(dialect=mysql.dialect(), compile_kwargs={"literal_binds": True}))
+    assert sql == "bit_count(files.photo_hash_int ^ -5) <= 20"
+
+
+def test_update_file_from_exif_geocodes_through_the_shared_cache(monkeypatch, geocode_enabled):
+    repo_mod = geocode_enabled
+    lookups = []
+    monkeypatch.setattr(repo_mod, "_geocode_local_geonames",
+                        lambda gn, lat, lon, search_km: lookups.append((lat, lon)) or ("Paris", "FR"))
+
+    session = make_session()
+    repo = Repository(session)
+    updated = []
+    for name in ("a.jpg", "b.jpg"):
+        f = repo.create_file(**_file_record(name))
+        repo.save_exif(f.id, '[{"GPSLatitude": "48.85661", "GPSLongitude": "2.35222"}]')
+        updated.append(repo.update_file_from_exif(f.id))
+
+    assert [(u.city, u.country, u.geocode_provenance) for u in updated] == [("Paris", "FR", 1)] * 2
+    assert lookups == [(48.8566, 2.3522)]
+
+
+def test_update_file_from_exif_links_files_sharing_a_content_identifier():
+    session = make_session()
+    repo = Repository(session)
+    ids = []
+    for name in ("a.heic", "a.mov", "b.jpg"):
+        f = repo.create_file(**_file_record(name))
+        cid = "CID-1" if name.startswith("a.") else "CID-2"
+        repo.save_exif(f.id, f'[{{"ContentIdentifier": "{cid}"}}]')
+        repo.update_file_from_exif(f.id)
+        ids.append(f.id)
+
+    related = dict(session.query(File.id, File.related_id))
+    assert related == {ids[0]: None, ids[1]: ids[0], ids[2]: None}
+
+
+def test_update_file_from_exif_commits_fields_and_links_together(monkeypatch):
+    session = make_session()
+    repo = Repository(session)
+    for name in ("a.heic", "a.mov"):
+        f = repo.create_file(**_file_record(name))
+        repo.save_exif(f.id, '[{"ContentIdentifier": "CID-1", "Make": "Apple"}]')
+        if name == "a.heic":
+            repo.update_file_from_exif(f.id)
+
+    commits = []
+    real_commit = session.commit
+    monkeypatch.setattr(session, "commit", lambda: commits.append(1) or real_commit())
+    updated = repo.update_file_from_exif(f.id)
+
+    assert len(commits) == 1
+    assert updated.manufacturer == "Apple"
+    assert session.query(File.related_id).filter(File.id == f.id).scalar() is not None
+
+
+def test_update_file_from_exif_retries_after_a_geocode_error(monkeypatch, geocode_enabled):
+    def broken_store(self, key):
+        raise OSError("geocode_cache unavailable")
+
+    monkeypatch.setattr(Repository, "_geocode_position", broken_store)
+    session = make_session()
+    repo = Repository(session)
+    f = repo.create_file(**_file_record("a.jpg"))
+    repo.save_exif(f.id, '[{"Make": "Canon", "GPSLatitude": "48.85661", "GPSLongitude": "2.35222"}]')
+
+    updated = repo.update_file_from_exif(f.id)
+    assert updated.manufacturer == "Canon"
+    assert updated.exif_applied_hash is None
+
+
+def test_update_file_from_exif_skips_an_already_applied_dump(monkeypatch):
+    from dupdetector.services import repository as repo_mod
+
+    session = make_session()
+    repo = Repository(session)
+    f = repo.create_file(**_file_record("a.jpg"))
+    repo.save_exif(f.id, '[{"Make": "Canon"}]')
+    assert repo.update_file_from_exif(f.id).manufacturer == "Canon"
+
+    parses = []
+    monkeypatch.setattr(repo_mod, "exif_loads", lambda raw: parses.append(raw) or [{"Make": "Nikon"}])
+    repo.update_file_from_exif(f.id)
+    assert parses == []
+
+    # a new dump is applied again
+    repo.save_exif(f.id, '[{"Make": "Nikon"}]')
+    assert repo.update_file_from_exif(f.id).manufacturer == "Nikon"
+    assert len(parses) == 1
@@ -1,3 +1,4 @@
+import hashlib
 import tempfile
 from pathlib import Path
 
@@ -26,3 +27,222 @@ def test_scan_persists_files(tmp_path: Path):
 
     rows = session.query(File).all()
     assert len(rows) == 2
+
+
+def test_scan_partial_hash_mode_skips_unique_sizes(tmp_path: Path):
+    # two identical files and one with a unique size
+    (tmp_path / "a.txt").write_bytes(b"same content")
+    (tmp_path / "b.txt").write_bytes(b"same content")
+    (tmp_path / "c.txt").write_bytes(b"unique size!!")
+
+    adapter = InMemoryAdapter()
+    session = adapter.session()
+
+    class Args:
+        folder = str(tmp_path)
+        hash_mode = "partial"
+
+    rc = scan(Args(), session=session)
+    assert rc == 0
+
+    from dupdetector.models.file import File
+
+    rows = {Path(r.path).name: r for r in session.query(File).all()}
+    assert len(rows) == 3
+    assert rows["c.txt"].md5_hash is None
+    assert rows["a.txt"].md5_hash is not None
+    assert rows["a.txt"].md5_hash == rows["b.txt"].md5_hash
+
+
+def test_scan_size_only_hash_mode_skips_unique_sizes(tmp_path: Path):
+    (tmp_path / "a.txt").write_bytes(b"same size 1")
+    (tmp_path / "b.txt").write_bytes(b"same size 2")
+    (tmp_path / "c.txt").write_bytes(b"unique size!!")
+
+    adapter = InMemoryAdapter()
+    session = adapter.session()
+
+    class Args:
+        folder = str(tmp_path)
+        hash_mode = "size_only"
+
+    rc = scan(Args(), session=session)
+    assert rc == 0
+
+    from dupdetector.models.file import File
+
+    rows = {Path(r.path).name: r for r in session.query(File).all()}
+    assert len(rows) == 3
+    assert rows["c.txt"].md5_hash is None
+    assert rows["c.txt"].media_type is None
+    # same size, different content: both hashed (no prefix step)
+    assert rows["a.txt"].md5_hash is not None
+    assert rows["a.txt"].md5_hash != rows["b.txt"].md5_hash
+
+
+def test_scan_sort_persists_in_path_order(tmp_path: Path):
+    for name in ("c.txt", "a.txt", "b.txt"):
+        (tmp_path / name).write_bytes(b"identical")
+
+    adapter = InMemoryAdapter()
+    session = adapter.session()
+
+    class Args:
+        folder = str(tmp_path)
+        sort = True
+
+    assert scan(Args(), session=session) == 0
+
+    from dupdetector.models.file import File
+
+    rows = session.query(File).order_by(File.id).all()
+    assert [Path(r.path).name for r in rows] == ["a.txt", "b.txt", "c.txt"]
+    assert not rows[0].is_duplicate
+    assert all(r.duplicate_of_id == rows[0].id for r in rows[1:])
+
+
+def test_scan_aborts_when_persisting_fails(tmp_path: Path, monkeypatch):
+    import pytest
+
+    from dupdetector.services.repository import Repository
+
+    (tmp_path / "a.txt").write_bytes(b"hello")
+
+    def boom(self, records):
+        raise RuntimeError("geocode failed")
+
+    monkeypatch.setattr(Repository, "bulk_create_files", boom)
+
+    class Args:
+        folder = str(tmp_path)
+
+    with pytest.raises(SystemExit) as exc_info:
+        scan(Args(), session=InMemoryAdapter().session())
+    assert exc_info.value.code == 1
+
+
+def test_scan_process_executor(tmp_path: Path):
+    (tmp_path / "a.txt").write_bytes(b"hello")
+    (tmp_path / "b.txt").write_bytes(b"hello")
+
+    adapter = InMemoryAdapter()
+    session = adapter.session()
+
+    class Args:
+        folder = str(tmp_path)
+        executor = "process"
+        workers = 2
+
+    assert scan(Args(), session=session) == 0
+
+    from dupdetector.models.file import File
+
+    rows = session.query(File).all()
+    assert len(rows) == 2
+    assert sum(1 for r in rows if r.is_duplicate) == 1
+
+
+def test_scan_streaming_respects_limit(tmp_path: Path):
+    for i in range(5):
+        (tmp_path / f"f{i}.txt").write_bytes(f"content {i}".encode())
+
+    adapter = InMemoryAdapter()
+    session = adapter.session()
+
+    class Args:
+        folder = str(tmp_path)
+        limit = 2
+        workers = 1
+
+    assert scan(Args(), session=session) == 0
+
+    from dupdetector.models.file import File
+
+    assert session.query(File).count() == 2
+
+
+def test_rescan_skips_unchanged_files(tmp_path: Path, monkeypatch):
+    import os
+
+    from dupdetector import cli
+    from dupdetector.models.file import File
+
+    photos = tmp_path / "photos"
+    (photos / "sub").mkdir(parents=True)
+    a = photos / "a.txt"
+    a.write_bytes(b"hello")
+    (photos / "sub" / "b.txt").write_bytes(b"world")
+    session = InMemoryAdapter().session()
+
+    class Args:
+        folder = str(photos)
+        recursive = True
+
+    assert scan(Args(), session=session) == 0
+    assert all(r.mtime_ns is not None for r in session.query(File))
+
+    hashed = []
+    real_hash_and_probe = cli.hash_and_probe
+    monkeypatch.setattr(cli, "hash_and_probe", lambda path, *a, **kw: hashed.append(path) or real_hash_and_probe(path, *a, **kw))
+    assert scan(Args(), session=session) == 0
+    assert hashed == []
+
+    # the stored (resolved) paths also match when the same tree is walked
+    # through a symlinked root
+    link = tmp_path / "link"
+    try:
+        link.symlink_to(photos, target_is_directory=True)
+    except OSError:
+        link = None
+    if link is not None:
+        class LinkArgs(Args):
+            folder = str(link)
+
+        assert scan(LinkArgs(), session=session) == 0
+        assert hashed == []
+
+    # a modified file is hashed again and its row updated
+    st = a.stat()
+    a.write_bytes(b"hello again")
+    os.utime(a, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert scan(Args(), session=session) == 0
+    assert hashed == [str(a)]
+    assert session.query(File).count() == 2
+    row = session.query(File).filter_by(name="a.txt").one()
+    assert row.md5_hash == hashlib.md5(b"hello again").hexdigest()
+    assert row.size == len(b"hello again")
+    assert row.mtime_ns == a.stat().st_mtime_ns
+    assert not row.is_duplicate
+
+    # ... so the next rescan skips it again
+    hashed.clear()
+    assert scan(Args(), session=session) == 0
+    assert hashed == []
+
+
+def test_partial_rescan_matches_skipped_stored_files(tmp_path: Path):
+    from dupdetector.models.file import File
+
+    photos = tmp_path / "photos"
+    photos.mkdir()
+    (photos / "a.jpg").write_bytes(b"same bytes")
+    session = InMemoryAdapter().session()
+
+    class Args:
+        folder = str(photos)
+
+    assert scan(Args(), session=session) == 0
+
+    # a byte-identical file next to an unchanged, skipped one is still
+    # fully hashed and marked as its duplicate
+    (photos / "b.jpg").write_bytes(b"same bytes")
+
+    class PartialArgs(Args):
+        hash_mode = "partial"
+
+    assert scan(PartialArgs(), session=session) == 0
+    a = session.query(File).filter_by(name="a.jpg").one()
+    b = session.query(File).filter_by(name="b.jpg").one()
+    assert b.md5_hash == a.md5_hash
+    assert b.duplicate_of_id == a.id
+    assert b.is_duplicate
@@ -5,3 +5,42 @@ def test_scan_smoke():
     # smoke test: calling the scan command should return 0
     rc = cli.main(["scan", "."])
     assert rc == 0
+
+
+def test_load_config_picks_up_edits(tmp_path):
+    cfg = tmp_path / "config.json"
+    cfg.write_text('{"workers": 2}', encoding="utf-8")
+    assert cli._load_config(str(cfg), verbose=False) == {"workers": 2}
+
+    # returned dict is a copy: mutating it must not leak into the cache
+    cli._load_config(str(cfg), verbose=False)["workers"] = 99
+    assert cli._load_config(str(cfg), verbose=False) == {"workers": 2}
+
+    cfg.write_text('{"workers": 16}', encoding="utf-8")
+    assert cli._load_config(str(cfg), verbose=False) == {"workers": 16}
+
+
+def test_iter_files_symlinks(tmp_path):
+    real = tmp_path / "a.jpg"
+    real.write_bytes(b"x" * 10)
+    link = tmp_path / "b.jpg"
+    try:
+        link.symlink_to(real)
+    except (OSError, NotImplementedError):
+        import pytest
+
+        pytest.skip("symlinks not supported")
+
+    found = dict(cli._iter_files(tmp_path, False))
+    assert set(found) == {str(real), str(link)}
+    # symlinked files report their target's size
+    assert found[str(link)].st_size == 10
+
+    assert [p for p, _ in cli._iter_files(tmp_path, False, skip_symlinks=True)] == [str(real)]
+
+
+def test_chunk_runs_keeps_order_and_isolates_large_files():
+    big = cli.SMALL_FILE_THRESHOLD
+    items = list(enumerate([("a", 1, 0), ("b", 2, 0), ("c", big, 0), ("d", 3, 0), ("e", 4, 0), ("f", 5, 0)]))
+    runs = list(cli._chunk_runs(items, 2))
+    assert [[idx for idx, _ in run] for run in runs] == [[0, 1], [2], [3, 4], [5]]